@@ -0,0 +1,203 @@
+"""
+UC A-G audit: credit per subject area for plans.
+
+Each course's area comes from its "Yes- Area B" column, parsed to a code at
+catalog load (CourseStore.ag_area). Credit is counted in half-years ("units"):
+a full-year course earns 2, each course of a semester pair 1, so the counters
+stay integers. Completed courses count as full years.
+
+AgCounter keeps one plan's per-area units and is updated slot by slot as a plan
+is filled or edited (fill_core_slots, replanner), so an audit never rescans the
+plan. audit_plans audits a whole cohort at once on the encoded PlanBatch:
+
+    python src/ag_audit.py data/outputs/cohort_plans.jsonl
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog_parser import AG_AREAS, CatalogCache, load_catalog
+from rules_pusd import AG_REQUIRED_YEARS
+from validator import _course_ids, encode_plans
+
+
+UNITS_PER_YEAR = 2
+AG_TARGET: Tuple[int, ...] = tuple(UNITS_PER_YEAR * AG_REQUIRED_YEARS.get(a, 0) for a in AG_AREAS)
+
+_AREAS = CatalogCache("ag_areas")
+
+
+def area_codes(catalog) -> Dict[str, int]:
+    """
+    title -> A-G area index (0 = A .. 6 = G) for the catalog's A-G courses, built once per catalog.
+    """
+    hit = _AREAS.get(catalog)
+    if hit is not None:
+        return hit
+    store = getattr(catalog, "store", None)
+    if store is not None:
+        codes = np.asarray(store.ag_area)
+        areas = {store.titles[i]: int(codes[i]) - 1 for i in np.flatnonzero(codes).tolist()}
+    else:
+        areas = {t: c.ag_area - 1 for t, c in catalog.items() if getattr(c, "ag_area", 0)}
+    _AREAS[catalog] = areas
+    return areas
+
+
+def slot_credits(slot) -> Iterator[Tuple[str, int]]:
+    """
+    (title, units) for each course of a plan slot.
+    """
+    if isinstance(slot, list):
+        units = UNITS_PER_YEAR // len(slot) if slot else 0
+        for t in slot:
+            yield t, units
+    elif slot is not None:
+        yield slot, UNITS_PER_YEAR
+
+
+class AgCounter:
+    """
+    Per-area A-G units of one plan. add / remove / swap cost one lookup per course.
+    """
+
+    __slots__ = ("areas", "units")
+
+    def __init__(self, catalog, units: Optional[Sequence[int]] = None):
+        self.areas = area_codes(catalog)
+        self.units: List[int] = list(units) if units is not None else [0] * len(AG_AREAS)
+
+    def add(self, slot, sign: int = 1) -> None:
+        areas, units = self.areas, self.units
+        for t, n in slot_credits(slot):
+            a = areas.get(t)
+            if a is not None:
+                units[a] += sign * n
+
+    def remove(self, slot) -> None:
+        self.add(slot, -1)
+
+    def swap(self, old, new) -> None:
+        """
+        A slot changed from old to new (either may be None).
+        """
+        self.add(old, -1)
+        self.add(new)
+
+    def add_units(self, units: Sequence[int]) -> None:
+        for a, n in enumerate(units):
+            self.units[a] += n
+
+    def add_completed(self, titles: Iterable) -> None:
+        for t in titles:
+            self.add(str(t))
+
+    def add_plan(self, plan: dict) -> None:
+        for year in plan["plan"]:
+            for slot in year["courses"]:
+                self.add(slot)
+
+    def copy(self) -> "AgCounter":
+        c = AgCounter.__new__(AgCounter)
+        c.areas, c.units = self.areas, list(self.units)
+        return c
+
+    def years(self) -> Dict[str, float]:
+        return {a: n / UNITS_PER_YEAR for a, n in zip(AG_AREAS, self.units)}
+
+    def missing(self) -> Dict[str, float]:
+        """
+        Areas below the UC minimum -> years still missing.
+        """
+        return {a: (t - n) / UNITS_PER_YEAR for a, n, t in zip(AG_AREAS, self.units, AG_TARGET) if n < t}
+
+    @property
+    def shortfall(self) -> int:
+        """
+        Units missing over all areas; 0 when every area meets the minimum.
+        """
+        return sum(t - n for n, t in zip(self.units, AG_TARGET) if n < t)
+
+
+def row_units(catalog, slots: Iterable) -> Tuple[int, ...]:
+    """
+    Per-area units of one grade row.
+    """
+    c = AgCounter(catalog)
+    for slot in slots:
+        c.add(slot)
+    return tuple(c.units)
+
+
+def audit_plan(plan: dict, catalog, completed: Iterable = ()) -> AgCounter:
+    c = AgCounter(catalog)
+    c.add_completed(completed)
+    c.add_plan(plan)
+    return c
+
+
+def audit_plans(plans: Sequence[Dict[str, Any]], catalog,
+                completed: Optional[Sequence[Iterable]] = None) -> np.ndarray:
+    """
+    audit_plan for many plans at once: an int array of units, one row per plan and
+    one column per A-G area. Summed with NumPy over the encoded batch (plans may be
+    a plan_codec.PlanArray of the same catalog).
+    """
+    ids, _ = _course_ids(catalog)
+    area_of = np.full(len(ids), -1, dtype=np.int64)
+    for t, a in area_codes(catalog).items():
+        area_of[ids[t]] = a
+
+    batch = plans.to_batch() if hasattr(plans, "to_batch") else encode_plans(plans, ids)
+    plan_of = batch.row_plan[batch.row].astype(np.int64)
+    course, units = batch.course, batch.units.astype(np.int64)
+    if completed is not None:
+        extra = [(p, ids.get(str(t), -1)) for p, titles in enumerate(completed) for t in titles]
+        if extra:
+            pc = np.array(extra, dtype=np.int64).reshape(-1, 2)
+            plan_of = np.concatenate([plan_of, pc[:, 0]])
+            course = np.concatenate([course, pc[:, 1]])
+            units = np.concatenate([units, np.full(len(pc), UNITS_PER_YEAR, dtype=np.int64)])
+
+    area = np.full(len(course), -1, dtype=np.int64)
+    known = course >= 0
+    area[known] = area_of[course[known]]
+    sel = area >= 0
+    n_areas = len(AG_AREAS)
+    flat = np.bincount(plan_of[sel] * n_areas + area[sel], weights=units[sel], minlength=len(plans) * n_areas)
+    return flat.astype(np.int64).reshape(len(plans), n_areas)
+
+
+def shortfall(units: np.ndarray) -> np.ndarray:
+    """
+    Units missing per plan and area (audit_plans output).
+    """
+    return np.maximum(np.asarray(AG_TARGET, dtype=np.int64) - units, 0)
+
+
+def main(argv=None) -> int:
+    # Imported here: main imports this module for fill_core_slots' counter.
+    from main import CATALOG_PATH
+
+    ap = argparse.ArgumentParser(description="A-G audit of a batch_planner results JSONL")
+    ap.add_argument("results")
+    ap.add_argument("--catalog", default=CATALOG_PATH)
+    args = ap.parse_args(argv)
+
+    with open(args.results, "r", encoding="utf-8") as f:
+        results = [r for r in (json.loads(line) for line in f if line.strip()) if r.get("ok")]
+    units = audit_plans([r["plan"] for r in results], load_catalog(args.catalog),
+                        [r.get("completed_courses", ()) for r in results])
+    short = shortfall(units)
+    print(f"Audited {len(results)} plans: {int((short.sum(axis=1) == 0).sum())} meet every A-G minimum")
+    for a, col in zip(AG_AREAS, short.T):
+        if col.any():
+            print(f"  {a}: {int((col > 0).sum())} plans short, {col.sum() / UNITS_PER_YEAR:g} years in total")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
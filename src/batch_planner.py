@@ -0,0 +1,402 @@
+"""
+Cohort planning: plan every student record in a JSONL or CSV file.
+
+    python src/batch_planner.py cohort.jsonl -o data/outputs/cohort_plans.jsonl --workers 8
+
+Each record has the data/inputs.json shape plus an optional "student_id".
+CSV inputs use one column per field; completed_courses is ';'-separated.
+Results are written as JSONL in input order, one line per student; a student
+whose planning raises is reported with "ok": false and the batch continues.
+
+    python src/batch_planner.py --revalidate data/outputs/cohort_plans.jsonl
+
+rechecks the stored plans of a results file against the current catalog and
+rewrites their validation_errors in place.
+
+--schools data/schools.json plans each record against the catalog of its
+"school_id" (see catalog_registry). Records are grouped by school so each
+catalog is loaded once; results then come out school by school, input order
+within a school.
+
+--metrics PATH turns on instrumentation (see instrumentation.py) in every worker
+and writes the merged per-stage timings and hot-path counters to PATH.
+
+--capacities PATH plans without electives and then fills every student's open
+elective slots at once under the per-course seat limits in PATH (see
+section_allocator), instead of giving everyone the same first-offered electives.
+Results are buffered until the whole cohort is planned.
+
+--columns DIR also appends every result, as it is written, to a columnar cohort
+directory (see cohort_columns) for reports that scan courses by grade.
+
+--demand PATH counts every written plan into per-course, per-grade demand tables
+broken down by goal, starting_math and science_pathway (see course_demand) and
+saves them to PATH when the last plan is out (.npz keeps the counter itself, for
+merging with other shards' counters).
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import sys
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import instrumentation
+from catalog_parser import load_catalog
+from catalog_registry import CatalogRegistry
+from cohort_columns import CohortWriter
+from course_demand import DemandCounter
+from main import CATALOG_PATH, plan_student, read_settings
+from plan_cache import PlanCache
+from section_allocator import allocate_results, load_capacities
+from validator import validate_plans
+
+
+_CATALOG = None  # per-process catalog; inherited through fork or loaded by _init_worker
+_CACHE: Optional[PlanCache] = None  # per-process plan cache (the disk store, if any, is shared)
+_INPUT_ERROR = "input_error"  # key of the placeholder record read_student_records yields for a bad line
+
+
+def read_student_records(path: str) -> Iterator[Dict[str, Any]]:
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                yield _record_from_csv_row(row)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            # A bad line becomes a record _plan_record reports as failed, so it
+            # costs that student only, not the batch.
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield {_INPUT_ERROR: f"line {n}: {type(e).__name__}: {e}", "line": n}
+                continue
+            if not isinstance(record, dict):
+                yield {_INPUT_ERROR: f"line {n}: expected a JSON object, got {type(record).__name__}", "line": n}
+                continue
+            yield record
+
+
+# main.read_settings flags; a CSV cell is a string, and bool("false") is True.
+_BOOL_COLUMNS = ("prefer_spanish", "optimize", "fill_electives")
+
+
+def _csv_bool(value: str) -> bool:
+    return value.strip().lower() in {"1", "true", "yes", "y"}
+
+
+def _record_from_csv_row(row: Dict[str, str]) -> Dict[str, Any]:
+    rec: Dict[str, Any] = {k: v for k, v in row.items() if k and v not in (None, "")}
+    for k in _BOOL_COLUMNS:
+        if k in rec:
+            rec[k] = _csv_bool(rec[k])
+    completed = row.get("completed_courses") or ""
+    rec["completed_courses"] = [c.strip() for c in completed.split(";") if c.strip()]
+    return rec
+
+
+def _make_cache(cache_size: int, cache_dir: Optional[str]) -> Optional[PlanCache]:
+    if cache_size <= 0 and not cache_dir:
+        return None
+    return PlanCache(maxsize=cache_size, path=cache_dir)
+
+
+def _init_worker(catalog_path: str, cache_size: int, cache_dir: Optional[str], metrics: bool = False) -> None:
+    global _CATALOG, _CACHE
+    instrumentation.reset()  # a fork()ed worker must not report the parent's numbers again
+    instrumentation.enable(metrics)
+    if _CATALOG is None:
+        with instrumentation.stage("load_catalog"):
+            _CATALOG = load_catalog(catalog_path)
+    _CACHE = _make_cache(cache_size, cache_dir)
+
+
+def _plan_record(item: Tuple[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    With instrumentation on, the worker's numbers since its last result ride along
+    under "metrics" for plan_cohort to merge.
+    """
+    i, record = item
+    student_id = i
+    hits = _CACHE.hits if _CACHE is not None else 0
+    try:
+        student_id = record.get("student_id", i)
+        if _INPUT_ERROR in record:
+            result = {"student_id": student_id, "ok": False, "error": record[_INPUT_ERROR], "line": record["line"]}
+        else:
+            plan, completed, errors = plan_student(record, _CATALOG, _CACHE)
+            result = {
+                "student_id": student_id,
+                "ok": True,
+                "cached": _CACHE is not None and _CACHE.hits > hits,
+                "completed_courses": sorted(str(c) for c in completed),
+                "starting_math": read_settings(record)["starting_math"],
+                "validation_errors": errors,
+                "plan": plan,
+            }
+    except Exception as e:
+        result = {"student_id": student_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+    if instrumentation.enabled:
+        result["metrics"] = instrumentation.drain()
+    return result
+
+
+def plan_cohort(
+    records: Iterable[Dict[str, Any]],
+    catalog_path: str = CATALOG_PATH,
+    workers: Optional[int] = None,
+    chunk_size: int = 32,
+    catalog=None,
+    cache_size: int = 1024,
+    cache_dir: Optional[str] = None,
+    metrics: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one result per record, in input order, as soon as it is ready.
+    The catalog is loaded once in the parent and shared with fork()ed workers;
+    where fork is unavailable each worker loads it once (from the snapshot if fresh).
+    Each worker keeps its own PlanCache of cache_size plans (0 disables it).
+    With metrics, every worker's instrumentation is merged into this process's.
+    """
+    global _CATALOG, _CACHE
+    instrumentation.enable(metrics)
+    with instrumentation.stage("load_catalog"):
+        _CATALOG = catalog if catalog is not None else load_catalog(catalog_path)
+    _CACHE = _make_cache(cache_size, cache_dir)
+    workers = workers or os.cpu_count() or 1
+    items = enumerate(records)
+
+    if workers <= 1:
+        for item in items:
+            yield _collect(_plan_record(item))
+        return
+
+    method = "fork" if "fork" in mp.get_all_start_methods() else None
+    ctx = mp.get_context(method)
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(catalog_path, cache_size, cache_dir, metrics)) as pool:
+        for result in pool.imap(_plan_record, items, chunksize=max(1, chunk_size)):
+            yield _collect(result)
+
+
+def plan_schools(
+    records: Iterable[Dict[str, Any]],
+    registry: CatalogRegistry,
+    workers: Optional[int] = None,
+    chunk_size: int = 32,
+    cache_size: int = 1024,
+    cache_dir: Optional[str] = None,
+    metrics: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    plan_cohort for a cross-school cohort: records are grouped by "school_id"
+    (default: the registry's default school) and each group is planned against its
+    catalog in turn, so a school is loaded at most once per batch however its
+    students are interleaved. Yields results group by group, tagged with school_id.
+    """
+    groups: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for i, record in enumerate(records):
+        school = record.get("school_id") or registry.default_school
+        groups.setdefault(school, []).append({"student_id": i, **record})
+
+    for school, group in groups.items():
+        try:
+            catalog = registry.get(school)
+        except (KeyError, OSError) as e:
+            for record in group:
+                yield {"student_id": record["student_id"], "school_id": school, "ok": False,
+                       "error": f"{type(e).__name__}: {e}"}
+            continue
+        for result in plan_cohort(group, registry.catalog_path(school), workers, chunk_size, catalog=catalog,
+                                  cache_size=cache_size, cache_dir=cache_dir, metrics=metrics):
+            yield {"school_id": school, **result}
+
+
+def _collect(result: Dict[str, Any]) -> Dict[str, Any]:
+    snap = result.pop("metrics", None)
+    if snap is not None:
+        instrumentation.merge(snap)
+    return result
+
+
+def _tee_settings(records: Iterable[Dict[str, Any]], pending: deque) -> Iterator[Dict[str, Any]]:
+    for r in records:
+        pending.append(read_settings(r))
+        yield r
+
+
+def run_batch(in_path: str, out_path: str, catalog_path: str = CATALOG_PATH,
+              workers: Optional[int] = None, chunk_size: int = 32,
+              cache_size: int = 1024, cache_dir: Optional[str] = None, optimize: bool = False,
+              metrics_path: Optional[str] = None, registry: Optional[CatalogRegistry] = None,
+              capacities_path: Optional[str] = None, default_seats: Optional[int] = None,
+              columns_path: Optional[str] = None, demand_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    With capacities_path, electives are allocated cohort-wide (see section_allocator)
+    and the allocation report is returned under "allocation". With columns_path the
+    results are also exported to that cohort_columns directory. With demand_path the
+    course demand tables (see course_demand) are saved there.
+    """
+    if capacities_path and registry is not None:
+        raise ValueError("capacity-aware allocation plans a single school's cohort; drop --schools")
+    if demand_path and registry is not None:
+        raise ValueError("course demand counts a single school's catalog; drop --schools")
+    summary: Dict[str, Any] = {"students": 0, "planned": 0, "failed": 0, "invalid": 0,
+                               "cache_hits": 0, "cache_misses": 0}
+    use_cache = cache_size > 0 or bool(cache_dir)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    columns = CohortWriter(columns_path) if columns_path else None
+    with open(out_path, "w", encoding="utf-8") as out:
+        records = read_student_records(in_path)
+        if optimize:
+            records = ({"optimize": True, **r} for r in records)
+        if demand_path:
+            # Results come back in input order: each result takes the oldest pending
+            # settings, so only the records in flight are held.
+            pending: deque = deque()
+            records = _tee_settings(records, pending)
+        if capacities_path:
+            # the allocator fills electives cohort-wide, so a record cannot opt back in
+            records = [{**r, "fill_electives": False} for r in records]
+        if registry is not None:
+            results = plan_schools(records, registry, workers, chunk_size, cache_size, cache_dir, bool(metrics_path))
+        else:
+            results = plan_cohort(records, catalog_path, workers, chunk_size,
+                                  cache_size=cache_size, cache_dir=cache_dir, metrics=bool(metrics_path))
+        if capacities_path:
+            results = list(results)
+            summary["allocation"] = allocate_results(results, records, _CATALOG, load_capacities(capacities_path),
+                                                     default_seats)
+            planned = [r for r in results if r["ok"]]
+            for r, errors in zip(planned, validate_plans([r["plan"] for r in planned], _CATALOG,
+                                                         [r["completed_courses"] for r in planned],
+                                                         [r["starting_math"] for r in planned])):
+                r["validation_errors"] = errors
+        demand: Optional[DemandCounter] = None
+        for result in results:
+            if demand_path:
+                # Built at the first result: plan_cohort loads _CATALOG when first iterated.
+                demand = demand or DemandCounter(_CATALOG)
+                settings = pending.popleft()
+                if result["ok"]:
+                    demand.add(result["plan"], settings)
+            summary["students"] += 1
+            if not result["ok"]:
+                summary["failed"] += 1
+                print(f"- student {result['student_id']}: {result['error']}", file=sys.stderr)
+            else:
+                summary["planned"] += 1
+                if result["validation_errors"]:
+                    summary["invalid"] += 1
+                if use_cache:
+                    summary["cache_hits" if result["cached"] else "cache_misses"] += 1
+            out.write(json.dumps(result) + "\n")
+            if columns is not None:
+                columns.add(result)
+    if columns is not None:
+        columns.close()
+    if demand_path:
+        demand = demand or DemandCounter(_CATALOG)
+        (demand.save if demand_path.endswith(".npz") else demand.write_csv)(demand_path)
+    if metrics_path:
+        instrumentation.write_report(metrics_path)
+    return summary
+
+
+def revalidate_results(path: str, catalog_path: str = CATALOG_PATH, out_path: Optional[str] = None,
+                       catalog=None, only=None) -> Dict[str, int]:
+    """
+    Bulk-validates every stored plan of a results JSONL (see validator.validate_plans)
+    and writes the file back with fresh validation_errors.
+    With only (a catalog_reload.CatalogDiff), just the plans referencing a course that
+    reload touched are rechecked; no other plan's validation can have changed.
+    """
+    catalog = catalog if catalog is not None else load_catalog(catalog_path)
+    with open(path, "r", encoding="utf-8") as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    planned = [r for r in results if r.get("ok")]
+    recheck = planned if only is None else [r for r in planned if only.affects(r["plan"])]
+    for r, errors in zip(recheck, validate_plans([r["plan"] for r in recheck], catalog,
+                                                 [r.get("completed_courses", ()) for r in recheck],
+                                                 [r.get("starting_math") for r in recheck])):
+        r["validation_errors"] = errors
+
+    out_path = out_path or path
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = out_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for r in results:
+            out.write(json.dumps(r) + "\n")
+    os.replace(tmp, out_path)
+    return {"students": len(results), "planned": len(planned), "revalidated": len(recheck),
+            "invalid": sum(1 for r in planned if r["validation_errors"])}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Plan a whole cohort of students")
+    ap.add_argument("records", help="JSONL or CSV of student input records (with --revalidate: a results JSONL)")
+    ap.add_argument("-o", "--out", default=None,
+                    help="default: data/outputs/cohort_plans.jsonl (with --revalidate: rewrite the input)")
+    ap.add_argument("--catalog", default=CATALOG_PATH)
+    ap.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    ap.add_argument("--chunk-size", type=int, default=32)
+    ap.add_argument("--cache-size", type=int, default=1024, help="plans kept per worker; 0 disables caching")
+    ap.add_argument("--cache-dir", default=None, help="optional on-disk plan cache shared by all workers")
+    ap.add_argument("--optimize", action="store_true", help="use the plan optimizer for records that don't say")
+    ap.add_argument("--revalidate", action="store_true",
+                    help="recheck the plans of a results JSONL against the catalog instead of planning")
+    ap.add_argument("--schools", default=None,
+                    help="school registry JSON (e.g. data/schools.json); records pick a catalog by school_id")
+    ap.add_argument("--max-catalog-mb", type=int, default=512, help="resident catalogs kept under this estimate")
+    ap.add_argument("--metrics", default=None,
+                    help="write per-stage timings and hot-path counters here (.prom/.txt: Prometheus text, else JSON)")
+    ap.add_argument("--capacities", default=None,
+                    help="per-course seat limits (JSON or CSV); electives are allocated cohort-wide within them")
+    ap.add_argument("--default-seats", type=int, default=None,
+                    help="with --capacities: seats of a course it doesn't list (default: unlimited)")
+    ap.add_argument("--columns", default=None,
+                    help="also export the results to this columnar cohort directory (see cohort_columns)")
+    ap.add_argument("--demand", default=None,
+                    help="save per-course, per-grade demand tables here (.csv, or .npz to merge later)")
+    args = ap.parse_args(argv)
+
+    if args.revalidate:
+        out = args.out or args.records
+        summary = revalidate_results(args.records, args.catalog, out)
+        print("Revalidated {planned}/{students} plans ({invalid} with validation errors)".format(**summary))
+        print("Saved:", out)
+        return 0
+
+    args.out = args.out or os.path.join("data", "outputs", "cohort_plans.jsonl")
+    registry = CatalogRegistry(args.schools, max_bytes=args.max_catalog_mb << 20) if args.schools else None
+    summary = run_batch(args.records, args.out, args.catalog, args.workers, args.chunk_size,
+                        args.cache_size, args.cache_dir, optimize=args.optimize, metrics_path=args.metrics,
+                        registry=registry, capacities_path=args.capacities, default_seats=args.default_seats,
+                        columns_path=args.columns, demand_path=args.demand)
+    print("Planned {planned}/{students} students ({failed} failed, {invalid} with validation errors)".format(**summary))
+    print("Plan cache: {cache_hits} hits, {cache_misses} misses".format(**summary))
+    alloc = summary.get("allocation")
+    if alloc is not None:
+        print("Electives: {allocated} allocated, {fallback} fallback, {unfilled} unfilled "
+              "({seconds:.2f}s)".format(**alloc))
+        for over in alloc["over_capacity"]:
+            print("- grade {grade} core course over capacity: {title} ({assigned}/{seats})".format(**over),
+                  file=sys.stderr)
+    print("Saved:", args.out)
+    if args.columns:
+        print("Columns:", args.columns)
+    if args.demand:
+        print("Demand:", args.demand)
+    if args.metrics:
+        print("Metrics:", args.metrics)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
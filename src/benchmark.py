@@ -0,0 +1,329 @@
+"""
+Planning pipeline benchmarks on seeded synthetic catalogs and cohorts.
+
+    python src/benchmark.py --rows 200,2000,20000 --students 1000
+    python src/benchmark.py --rows 1000000 --students 200 --stages load_catalog,resolve
+    python src/benchmark.py --save-baseline          # record this machine's numbers
+    python src/benchmark.py --baseline data/bench_baseline.json --tolerance 1.5
+
+Synthetic catalogs use the Foothill CSV layout (section header rows, a "Course
+Code" sub-header, grades in the Unnamed: 2-5 columns, "Yes- Area X" A-G column)
+and always contain the titles the pickers look for, so every stage does real
+work. Generated files go to data/cache/bench/ and are reused while unchanged.
+
+Each stage is timed on its own (best of --repeat runs) and then run once more
+under tracemalloc for its peak Python allocation. With --baseline, a stage whose
+throughput falls below baseline / tolerance is reported and the exit code is 1.
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from catalog_parser import load_catalog
+from catalog_snapshot import compile_catalog, snapshot_path
+from course_resolver import _RESOLVERS
+from elective_picker import fill_electives
+from inputs_loader import resolve_completed_courses
+from main import fill_core_slots, plan_student, read_settings
+from math_pathway import MATH_TRACK
+from science_pathway import SCI_TRACK
+from skeleton_builder import build_empty_plan
+from validator import validate_plan_offered_by_grade, validate_plan_prerequisites
+
+
+BENCH_DIR = os.path.join("data", "cache", "bench")
+BASELINE_PATH = os.path.join("data", "bench_baseline.json")
+STAGES = ["load_catalog", "load_snapshot", "resolve", "fill_core_slots", "fill_electives", "validate", "end_to_end"]
+
+HEADER = ["ENGLISH", "", "", "", "", "", "", "", "", "Symbol Key"]
+SUB_HEADER = ["Course Code", "Course Title", "Grade Level (s)", "", "", "", "A-G (College Prep)", "Considerations", "", ""]
+
+# Titles fill_core_slots and the pickers ask for by name or keyword: (section, title, grades, A-G area).
+ANCHOR_COURSES = [
+    ("ENGLISH", "Freshman English (P)", [9], "B"),
+    ("ENGLISH", "Sophomore English (P)", [10], "B"),
+    ("ENGLISH", "Junior English (P)", [11], "B"),
+    ("ENGLISH", "AP English Literature & Comp (HP)", [12], "B"),
+    ("MATHEMATICS", "Algebra I (P)", [9, 10], "C"),
+    ("MATHEMATICS", "Geometry (P)", [9, 10], "C"),
+    ("MATHEMATICS", "Honors Geometry (P)", [9, 10], "C"),
+    ("MATHEMATICS", "Algebra II (P)", [9, 10, 11], "C"),
+    ("MATHEMATICS", "Honors Algebra II (P)", [9, 10, 11], "C"),
+    ("MATHEMATICS", "Pre-Calculus (P)", [10, 11, 12], "C"),
+    ("MATHEMATICS", "AP Calculus AB (HP)", [10, 11, 12], "C"),
+    ("MATHEMATICS", "AP Calculus BC (HP)", [11, 12], "C"),
+    ("MATHEMATICS", "AP Statistics (HP)", [11, 12], "C"),
+    ("MATHEMATICS", "AP Computer Science (HP)", [10, 11, 12], "C"),
+    ("SOCIAL SCIENCE", "Ethnic Studies (P)(sem)", [9], "A"),
+    ("SOCIAL SCIENCE", "World History (P)", [10], "A"),
+    ("SOCIAL SCIENCE", "U.S. History (P)", [11], "A"),
+    ("SOCIAL SCIENCE", "Civics (P) (sem)", [12], "A"),
+    ("SOCIAL SCIENCE", "Economics (P) (sem)", [12], "G"),
+    ("SCIENCE", "Biology (P)", [9, 10, 11, 12], "D"),
+    ("SCIENCE", "Earth & Space (P)", [9, 10, 11, 12], "D"),
+    ("SCIENCE", "Chemistry (P)", [10, 11, 12], "D"),
+    ("SCIENCE", "Physics (P)", [10, 11, 12], "D"),
+    ("SCIENCE", "AP Biology (HP)", [11, 12], "D"),
+    ("SCIENCE", "AP Chemistry (HP)", [11, 12], "D"),
+    ("WORLD LANGUAGE", "Spanish I (P)", [9, 10, 11, 12], "E"),
+    ("WORLD LANGUAGE", "Spanish II (P)", [9, 10, 11, 12], "E"),
+    ("WORLD LANGUAGE", "Spanish III (P)", [9, 10, 11, 12], "E"),
+    ("WORLD LANGUAGE", "Spanish IV (P)", [10, 11, 12], "E"),
+    ("WORLD LANGUAGE", "AP Spanish Language and Culture (HP)", [10, 11, 12], "E"),
+    ("ADDITIONAL COURSES", "Health Education (P)", [9], "G"),
+    ("PHYSICAL EDUCATION", "PE Course 1-Freshmen", [9], None),
+    ("PHYSICAL EDUCATION", "PE Course 2- Team Sports", [10, 11, 12], None),
+    ("CAREER AND TECHNICAL EDUCATION", "Programming Foundations (P)", [9, 10, 11, 12], "G"),
+    ("CAREER AND TECHNICAL EDUCATION", "Robotics Engineering (P)", [9, 10, 11, 12], "G"),
+]
+
+SECTION_STEMS = {
+    "ENGLISH ELECTIVES": ["Literature", "Creative Writing", "Journalism", "Rhetoric", "Poetry"],
+    "MATHEMATICS": ["Algebra", "Geometry", "Statistics", "Discrete Math", "Calculus", "Data Science"],
+    "SCIENCE": ["Biology", "Chemistry", "Physics", "Earth Science", "Marine Biology", "Astronomy"],
+    "SOCIAL SCIENCE": ["History", "Psychology", "Sociology", "Government", "Economics"],
+    "VISUAL ARTS": ["Drawing", "Ceramics", "Photography", "Digital Art", "Sculpture"],
+    "PERFORMING ARTS": ["Drama", "Choir", "Orchestra", "Jazz Band", "Dance"],
+    "WORLD LANGUAGE": ["French", "Mandarin", "Japanese", "German", "Spanish for Native Speakers"],
+    "CAREER AND TECHNICAL EDUCATION": ["Computer Science", "Programming", "Robotics", "Engineering Design",
+                                       "Web Development", "Networking"],
+}
+LEVELS = ["I", "II", "III", "IV"]
+PREFIXES = ["", "", "", "Honors ", "AP ", "Advanced "]
+MARKERS = ["(P)", "(P)", "(HP)", "(P) (sem)", "(xP)", ""]
+
+
+def _row(code: str, title: str, grades: List[int], area: Optional[str]) -> List[str]:
+    cells = [code, title] + [str(g) if g in grades else "" for g in (9, 10, 11, 12)]
+    cells.append(f"Yes- Area {area}" if area else "No")
+    return cells + ["", "", ""]
+
+
+def generate_catalog(path: str, rows: int, seed: int = 0) -> str:
+    """
+    Writes a synthetic catalog with about `rows` course rows. Deterministic per (rows, seed).
+    """
+    rng = random.Random(seed)
+    by_section: Dict[str, List[List[str]]] = {}
+    codes = iter(rng.sample(range(600000, 600000 + max(10 * rows, 100000)), rows + len(ANCHOR_COURSES)))
+    for section, title, grades, area in ANCHOR_COURSES:
+        by_section.setdefault(section, []).append(_row(str(next(codes)), title, grades, area))
+
+    sections = list(SECTION_STEMS)
+    areas = "ABCDEFG"
+    for i in range(max(0, rows - len(ANCHOR_COURSES))):
+        section = rng.choice(sections)
+        stem = rng.choice(SECTION_STEMS[section])
+        title = f"{rng.choice(PREFIXES)}{stem} {rng.choice(LEVELS)} {i} {rng.choice(MARKERS)}".strip()
+        start = rng.randint(9, 12)
+        grades = list(range(start, min(12, start + rng.randint(0, 3)) + 1))
+        area = rng.choice(areas) if rng.random() < 0.85 else None
+        by_section.setdefault(section, []).append(_row(str(next(codes)), title, grades, area))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        w.writerow(SUB_HEADER)
+        for n, (section, course_rows) in enumerate(by_section.items()):
+            if n:
+                w.writerow([section] + [""] * 9)
+            w.writerows(course_rows)
+    os.replace(tmp, path)
+    return path
+
+
+# Transcript strings as students type them: exact titles, numerals, missing markers, typos.
+TRANSCRIPT_STRINGS = [
+    "Spanish 1", "Spanish 2", "Spanish II (P)", "spanish iii", "Algebra 1", "Algebra I (P)", "Geometry",
+    "Honors Geometry (P)", "hon geometry", "Algebra 2", "Biology", "Biology (P)", "Earth & Space",
+    "Chemistry (P)", "PE Course 1", "Health Education", "Freshman English", "Programming Foundations",
+    "AP Computer Science", "Intro to Woodworking", "Spanish 3", "Pre-Calculus",
+]
+
+
+def generate_cohort(n: int, seed: int = 0, catalog=None) -> List[Dict[str, Any]]:
+    """
+    Seeded student records in the data/inputs.json shape.
+    """
+    rng = random.Random(seed)
+    pool = list(TRANSCRIPT_STRINGS)
+    if catalog is not None:
+        titles = list(catalog)
+        pool += rng.sample(titles, min(200, len(titles)))
+    records = []
+    for i in range(n):
+        records.append({
+            "student_id": i,
+            "goal": "cs",
+            "starting_math": rng.choice(list(MATH_TRACK)),
+            "science_pathway": rng.choice(list(SCI_TRACK)),
+            "prefer_spanish": rng.random() < 0.7,
+            "completed_courses": rng.sample(pool, rng.randint(0, 4)),
+        })
+    return records
+
+
+def _measure(fn: Callable[[], int], repeat: int, memory: bool) -> Dict[str, float]:
+    best = float("inf")
+    items = 0
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        start = time.perf_counter()
+        items = fn()
+        best = min(best, time.perf_counter() - start)
+    out = {"seconds": best, "items": items, "per_sec": items / best if best > 0 else float("inf")}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        out["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return out
+
+
+def bench_case(rows: int, students: int, seed: int = 0, repeat: int = 3, memory: bool = True,
+               stages: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    stages = stages or STAGES
+    csv_path = os.path.join(BENCH_DIR, f"catalog_{rows}_{seed}.csv")
+    if not os.path.exists(csv_path):
+        generate_catalog(csv_path, rows, seed)
+    if "load_snapshot" in stages and not os.path.exists(snapshot_path(csv_path)):
+        compile_catalog(csv_path)
+
+    catalog = load_catalog(csv_path, use_snapshot=False)
+    cohort = generate_cohort(students, seed, catalog)
+    settings = [read_settings(r) for r in cohort]
+    completed = [resolve_completed_courses(catalog, s["completed_courses"]) for s in settings]
+
+    def load():
+        return len(load_catalog(csv_path, use_snapshot=False))
+
+    def load_snap():
+        return len(load_catalog(csv_path))
+
+    def resolve():
+        _RESOLVERS.pop(catalog)  # start from a cold resolver every run
+        n = 0
+        for s in settings:
+            resolve_completed_courses(catalog, s["completed_courses"])
+            n += len(s["completed_courses"])
+        return n
+
+    def core():
+        for s, c in zip(settings, completed):
+            fill_core_slots(build_empty_plan(s["goal"]), catalog, s["starting_math"], s["science_pathway"],
+                            c, s["prefer_spanish"])
+        return len(settings)
+
+    def electives():
+        n = 0
+        for s, c in zip(settings, completed):
+            for g in (9, 10, 11, 12):
+                fill_electives(catalog, g, 2, s["goal"], s["prefer_spanish"], set(c))
+                n += 1
+        return n
+
+    plans = [plan_student(r, catalog)[0] for r in cohort] if "validate" in stages else []
+
+    def validate():
+        for p, s, c in zip(plans, settings, completed):
+            validate_plan_offered_by_grade(p, catalog)
+            validate_plan_prerequisites(p, catalog, c, s["starting_math"])
+        return len(plans)
+
+    def end_to_end():
+        fresh = load_catalog(csv_path)
+        for r in cohort:
+            plan_student(r, fresh)
+        return len(cohort)
+
+    runs = {"load_catalog": load, "load_snapshot": load_snap, "resolve": resolve, "fill_core_slots": core,
+            "fill_electives": electives, "validate": validate, "end_to_end": end_to_end}
+    return {name: _measure(runs[name], repeat, memory) for name in STAGES if name in stages}
+
+
+def compare(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Any],
+            tolerance: float) -> List[str]:
+    """
+    Regressions: stages whose throughput dropped below baseline / tolerance. A case
+    or stage the baseline has no entry for counts as one too (it was not checked),
+    as does a run that compared nothing.
+    """
+    out = []
+    compared = 0
+    for case, stages in results.items():
+        for stage, r in stages.items():
+            base = baseline.get(case, {}).get(stage)
+            if not base:
+                out.append(f"{case} {stage}: no baseline entry" if case in baseline
+                           else f"{case} {stage}: no baseline case {case!r}")
+                continue
+            compared += 1
+            if r["per_sec"] * tolerance < base["per_sec"]:
+                out.append(f"{case} {stage}: {r['per_sec']:.1f}/s vs baseline {base['per_sec']:.1f}/s "
+                           f"({base['per_sec'] / r['per_sec']:.2f}x slower)")
+    if not compared:
+        out.append("nothing compared: no case and stage of this run is in the baseline "
+                   f"(baseline cases: {', '.join(baseline) or 'none'})")
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the planning pipeline on synthetic data")
+    ap.add_argument("--rows", default="200,2000,20000", help="comma-separated catalog sizes (course rows)")
+    ap.add_argument("--students", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per stage; the best is kept")
+    ap.add_argument("--stages", default=",".join(STAGES))
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--out", default=None, help="write the results as JSON")
+    ap.add_argument("--baseline", default=None, help=f"compare against this file (e.g. {BASELINE_PATH})")
+    ap.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor vs the baseline")
+    ap.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, default=None, metavar="PATH")
+    args = ap.parse_args(argv)
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        ap.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    print(f"{'case':<30}{'stage':<18}{'seconds':>10}{'items/s':>14}{'peak MB':>10}")
+    for rows in [int(x) for x in args.rows.split(",") if x]:
+        case = f"rows={rows},students={args.students}"
+        results[case] = bench_case(rows, args.students, args.seed, args.repeat, not args.no_memory, stages)
+        for stage, r in results[case].items():
+            peak = f"{r['peak_mb']:.1f}" if "peak_mb" in r else "-"
+            print(f"{case:<30}{stage:<18}{r['seconds']:>10.4f}{r['per_sec']:>14.1f}{peak:>10}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print("Saved baseline:", args.save_baseline)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n=== Regressions ===", file=sys.stderr)
+            for r in regressions:
+                print("-", r, file=sys.stderr)
+            return 1
+        print(f"\nNo stage slower than baseline / {args.tolerance}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
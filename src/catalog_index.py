@@ -0,0 +1,225 @@
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import instrumentation
+
+
+NGRAM = 3
+
+
+def _ngrams(text: str, n: int = NGRAM) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _tokens(text: str) -> Set[str]:
+    return set(text.split())
+
+
+def _intersect(lists: Sequence[List[int]]) -> List[int]:
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    out = set(lists[0])
+    for other in lists[1:]:
+        if not out:
+            break
+        out.intersection_update(other)
+    return sorted(out)
+
+
+def _union(lists: Sequence[List[int]]) -> List[int]:
+    if len(lists) == 1:
+        return lists[0]
+    out: Set[int] = set()
+    for l in lists:
+        out.update(l)
+    return sorted(out)
+
+
+class PostingTable(Mapping):
+    """
+    Read-only key -> postings mapping stored CSR-style (sorted keys, offsets, one flat
+    postings array), e.g. straight out of a memory-mapped catalog snapshot.
+    Posting lists are materialized on first access.
+    """
+
+    def __init__(self, keys: List[str], offsets: np.ndarray, postings: np.ndarray):
+        self._slot = {k: i for i, k in enumerate(keys)}
+        self._keys = keys
+        self._offsets = offsets
+        self._postings = postings
+        self._lists: Dict[str, List[int]] = {}
+
+    def __getitem__(self, key: str) -> List[int]:
+        hit = self._lists.get(key)
+        if hit is None:
+            i = self._slot[key]
+            hit = self._lists[key] = self._postings[self._offsets[i]:self._offsets[i + 1]].tolist()
+        return hit
+
+    def __contains__(self, key) -> bool:
+        return key in self._slot
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def to_csr(table: Mapping) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    keys = sorted(table)
+    lists = [table[k] for k in keys]
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(l) for l in lists], out=offsets[1:])
+    postings = np.fromiter((p for l in lists for p in l), dtype=np.int32, count=int(offsets[-1]))
+    return keys, offsets, postings
+
+
+class FieldIndex:
+    """
+    Token + n-gram postings for one text field (lowercased).
+    Postings are sorted catalog positions, i.e. CSV insertion order.
+    """
+
+    def __init__(self, texts: List[str], tokens: Optional[Mapping] = None, ngrams: Optional[Mapping] = None):
+        self.texts = texts
+        self._distinct: Optional[Dict[str, List[int]]] = None
+        self.tokens = tokens if tokens is not None else self._postings(_tokens)
+        self._ngrams = ngrams
+        self._cache: Dict[str, List[int]] = {}
+
+    @property
+    def distinct(self) -> Dict[str, List[int]]:
+        # Many rows share a text (every course of a section), so tokenize each distinct text once.
+        if self._distinct is None:
+            self._distinct = {}
+            for pos, t in enumerate(self.texts):
+                self._distinct.setdefault(t, []).append(pos)
+        return self._distinct
+
+    def _postings(self, keys_of) -> Dict[str, List[int]]:
+        groups: Dict[str, List[List[int]]] = {}
+        for t, rows in self.distinct.items():
+            for k in keys_of(t):
+                groups.setdefault(k, []).append(rows)
+        return {k: g[0] if len(g) == 1 else sorted(p for rows in g for p in rows) for k, g in groups.items()}
+
+    @property
+    def ngrams(self) -> Dict[str, List[int]]:
+        # Only multi-word keywords need n-grams; build them on first use.
+        if self._ngrams is None:
+            self._ngrams = self._postings(_ngrams)
+        return self._ngrams
+
+    def matches(self, keyword: str) -> List[int]:
+        """
+        Positions whose text contains keyword as a substring (same test as `k in title.lower()`).
+        """
+        hit = self._cache.get(keyword)
+        if hit is not None:
+            return hit
+
+        if not keyword:
+            hit = list(range(len(self.texts)))
+        elif not any(ch.isspace() for ch in keyword):
+            # A keyword without whitespace can only match inside a single token,
+            # so scanning the (much smaller) vocabulary is enough.
+            hit = _union([self.tokens[tok] for tok in self.tokens if keyword in tok] or [[]])
+        elif len(keyword) >= NGRAM:
+            cands = _intersect([self.ngrams.get(g, []) for g in _ngrams(keyword)])
+            hit = [p for p in cands if keyword in self.texts[p]]
+        else:
+            hit = [p for p, t in enumerate(self.texts) if keyword in t]
+
+        self._cache[keyword] = hit
+        return hit
+
+
+class CatalogIndex:
+    """
+    Lookup index built once per loaded catalog.
+
+    Keyword queries return titles in catalog order, so the first hit is exactly
+    what a full `for title, c in catalog.items()` scan would have returned.
+    """
+
+    def __init__(self, titles: List[str], sections: List[str], grade_masks: Sequence[int],
+                 title_field: Optional[FieldIndex] = None, section_field: Optional[FieldIndex] = None):
+        self.titles = titles
+        self.title = title_field or FieldIndex([t.lower() for t in titles])
+        self.section = section_field or FieldIndex([s.lower() for s in sections])
+        masks = np.asarray(grade_masks, dtype=np.uint16)
+        self.by_grade: Dict[int, List[int]] = {
+            g: np.flatnonzero(masks & np.uint16(1 << g)).tolist() for g in range(16)
+        }
+        self._query_cache: Dict[tuple, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def _query(self, mode: str, grade: int, keywords: Sequence[str]) -> List[int]:
+        key = (mode, grade, tuple(keywords))
+        hit = self._query_cache.get(key)
+        if hit is not None:
+            return hit
+
+        if mode == "all":
+            lists = [self.title.matches(k) for k in keywords]
+        else:
+            lists = [_union([self.title.matches(k) for k in keywords] +
+                            [self.section.matches(k) for k in keywords] or [[]])]
+        hit = _intersect(lists + [self.by_grade.get(grade, [])])
+
+        self._query_cache[key] = hit
+        return hit
+
+    def _first(self, positions: List[int], exclude, counter: Optional[str] = None) -> Optional[str]:
+        # A plan_codec.CourseSet over these rows tests positions as course ids, without title lookups.
+        if getattr(exclude, "titles", None) is self.titles:
+            p = exclude.first_free(positions)
+            if counter is not None:
+                instrumentation.count(counter, len(positions) if p is None else bisect_left(positions, p) + 1)
+            return None if p is None else self.titles[p]
+        for i, p in enumerate(positions):
+            t = self.titles[p]
+            if t not in exclude:
+                if counter is not None:
+                    instrumentation.count(counter, i + 1)
+                return t
+        if counter is not None:
+            instrumentation.count(counter, len(positions))
+        return None
+
+    def iter_all(self, grade: int, keywords: Sequence[str]) -> Iterator[str]:
+        """
+        Titles offered in grade whose title contains ALL keywords, in catalog order.
+        """
+        for p in self._query("all", grade, keywords):
+            yield self.titles[p]
+
+    def iter_any(self, grade: int, keywords: Sequence[str]) -> Iterator[str]:
+        """
+        Titles offered in grade whose title OR subject section contains ANY keyword, in catalog order.
+        """
+        for p in self._query("any", grade, keywords):
+            yield self.titles[p]
+
+    def first_all(self, grade: int, keywords: Sequence[str], exclude, counter: Optional[str] = None) -> Optional[str]:
+        """
+        counter: instrumentation counter to add the number of titles examined to.
+        """
+        return self._first(self._query("all", grade, keywords), exclude, counter)
+
+    def first_any(self, grade: int, keywords: Sequence[str], exclude, counter: Optional[str] = None) -> Optional[str]:
+        """
+        First title offered in grade whose title OR subject section contains ANY keyword.
+        """
+        return self._first(self._query("any", grade, keywords), exclude, counter)
+
+    def iter_grade(self, grade: int) -> Iterator[str]:
+        for p in self.by_grade.get(grade, []):
+            yield self.titles[p]
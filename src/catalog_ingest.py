@@ -0,0 +1,231 @@
+"""
+Nightly catalog ingest: compile the catalog of every school in a registry at once.
+
+    python src/catalog_ingest.py data/schools.json --workers 8
+
+Each CSV is cut into byte ranges of about chunk_bytes that end at a row end (a
+newline outside quotes), in one pass that also hashes the file for its version.
+The ranges of all files are parsed on one worker pool with build_store. Rows
+before a range's first section header belong to the section still open at the
+end of the ranges before it; that is resolved when a file's ranges are merged,
+in order, into the same CourseStore load_catalog builds. Each catalog is written
+as its snapshot (see catalog_snapshot), where load_catalog and CatalogRegistry
+pick it up; a file whose snapshot is already current is not parsed again.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import multiprocessing as mp
+import os
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog_parser import (FIRST_COLUMN, NA_VALUES, CourseStore, _column_names, _is_section_header,
+                            build_store, catalog_from_store)
+from catalog_registry import SCHOOLS_PATH, load_school_configs
+from catalog_snapshot import open_snapshot, snapshot_path, write_snapshot
+
+
+DEFAULT_CHUNK_BYTES = 4 << 20
+START_SECTION = "UNKNOWN"  # section of courses above the first header (build_store's default)
+_CARRIED = ""  # start section of a range: never a header, resolved at merge
+
+Range = Tuple[int, int]
+Part = Tuple[CourseStore, Optional[str]]  # parsed range, last section header in it
+
+
+def scan_csv(path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Tuple[str, Dict[str, int], List[Range]]:
+    """
+    One pass over the file: (sha256, column name -> index, byte ranges of the data rows).
+    Every range starts at a row start, so each can be parsed on its own.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        # header: the first non-blank row, as read_catalog_rows sees it
+        head = b""
+        header: List[str] = []
+        while not header:
+            line = f.readline()
+            if not line:
+                break
+            h.update(line)
+            head += line
+            if head.count(b'"') % 2 == 0:
+                header = next((r for r in csv.reader(io.StringIO(head.decode("utf-8-sig"), newline="")) if r), [])
+
+        ranges: List[Range] = []
+        pos = f.tell()
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            h.update(block)
+            n, quotes, at_row_end = len(block), block.count(b'"'), block.endswith(b"\n")
+            # Extend to the end of the row the block stops in. An escaped quote ("")
+            # counts twice, so an odd count means the newline is inside a field.
+            while not at_row_end or quotes % 2:
+                line = f.readline()
+                if not line:
+                    break
+                h.update(line)
+                n, quotes, at_row_end = n + len(line), quotes + line.count(b'"'), line.endswith(b"\n")
+            ranges.append((pos, pos + n))
+            pos += n
+    return h.hexdigest(), _column_names(header) if header else {}, ranges
+
+
+def parse_range(path: str, names: Dict[str, int], start: int, end: int) -> Part:
+    """
+    Parses the rows in [start, end); rows above the range's first header get section 0 (_CARRIED).
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    rows = [r for r in csv.reader(io.StringIO(text, newline="")) if r]
+    last = None
+    i = names.get(FIRST_COLUMN)
+    if i is not None:
+        for r in reversed(rows):
+            x = r[i] if i < len(r) and r[i] not in NA_VALUES else None
+            if _is_section_header(x):
+                last = x.strip()
+                break
+    return build_store(names, rows, start_section=_CARRIED), last
+
+
+def merge_parts(parts: Sequence[Part], start_section: str = START_SECTION) -> CourseStore:
+    """
+    Joins the parsed ranges of one file, in file order, into build_store's result for the whole file.
+    """
+    section_ids: Dict[str, int] = {start_section: 0}
+    codes: List[str] = []
+    titles: List[str] = []
+    ag: List[str] = []
+    notes: List[str] = []
+    sids: List[int] = []
+    areas: List[int] = []
+    masks: List[int] = []
+    pos: Dict[str, int] = {}
+    carried = 0
+    for store, last in parts:
+        local = [carried] + [section_ids.setdefault(s, len(section_ids)) for s in store.sections[1:]]
+        for j, (t, sid, area, mask) in enumerate(zip(store.titles, store.section_ids.tolist(),
+                                                     store.ag_area.tolist(), store.grade_masks.tolist())):
+            p = pos.get(t)
+            if p is None:
+                pos[t] = len(titles)
+                titles.append(t)
+                codes.append(store.codes[j])
+                ag.append(store.ag[j])
+                notes.append(store.notes[j])
+                sids.append(local[sid])
+                areas.append(area)
+                masks.append(mask)
+            else:
+                # seen in an earlier range: keeps its position, takes these values
+                codes[p], ag[p], notes[p] = store.codes[j], store.ag[j], store.notes[j]
+                sids[p], areas[p], masks[p] = local[sid], area, mask
+        if last is not None:
+            carried = section_ids[last]
+    return CourseStore(
+        codes=codes,
+        titles=titles,
+        section_ids=np.asarray(sids, dtype=np.int32),
+        sections=list(section_ids),
+        ag=ag,
+        ag_area=np.asarray(areas, dtype=np.uint8),
+        notes=notes,
+        grade_masks=np.asarray(masks, dtype=np.uint16),
+    )
+
+
+def _out_path(csv_path: str, out_dir: Optional[str]) -> str:
+    return snapshot_path(csv_path) if out_dir is None else os.path.join(out_dir, os.path.basename(csv_path) + ".snap")
+
+
+def _scan(task: Tuple[str, int]) -> Tuple[str, Dict[str, int], List[Range]]:
+    return scan_csv(*task)
+
+
+def _parse(task: Tuple[str, Dict[str, int], Range]) -> Part:
+    path, names, (start, end) = task
+    return parse_range(path, names, start, end)
+
+
+def _compile(task: Tuple[str, str, List[Part], str]) -> str:
+    path, digest, parts, out = task
+    catalog = catalog_from_store(merge_parts(parts))
+    catalog.version = digest
+    return write_snapshot(catalog, out, digest)
+
+
+def ingest_catalogs(paths: Sequence[str], workers: Optional[int] = None, chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+                    out_dir: Optional[str] = None, force: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Compiles every catalog CSV in paths to its snapshot. Returns CSV path -> snapshot
+    path written, or None where the existing snapshot was already current (unless force).
+    """
+    paths = list(dict.fromkeys(paths))
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if workers > 1:
+        method = "fork" if "fork" in mp.get_all_start_methods() else None
+        pool = mp.get_context(method).Pool(workers)
+    pmap = pool.map if pool is not None else (lambda fn, items, chunksize=1: list(map(fn, items)))
+    try:
+        scans = pmap(_scan, [(p, chunk_bytes) for p in paths])
+        todo = [(p, digest, names, ranges) for p, (digest, names, ranges) in zip(paths, scans)
+                if force or open_snapshot(_out_path(p, out_dir), digest) is None]
+        tasks = [(p, names, r) for p, _, names, ranges in todo for r in ranges]
+        parts = iter(pmap(_parse, tasks, chunksize=1))
+        written = pmap(_compile, [(p, digest, [next(parts) for _ in ranges], _out_path(p, out_dir))
+                                  for p, digest, names, ranges in todo])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    out: Dict[str, Optional[str]] = dict.fromkeys(paths)
+    out.update(zip([t[0] for t in todo], written))
+    return out
+
+
+def ingest_schools(schools_path: str = SCHOOLS_PATH, workers: Optional[int] = None,
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES, out_dir: Optional[str] = None,
+                   force: bool = False) -> Dict[str, Optional[str]]:
+    """
+    ingest_catalogs over a school registry: school id -> snapshot written (None = already current).
+    Schools sharing a CSV share its snapshot.
+    """
+    configs = load_school_configs(schools_path)
+    written = ingest_catalogs([c.catalog_path for c in configs.values()], workers, chunk_bytes, out_dir, force)
+    return {sid: written[c.catalog_path] for sid, c in configs.items()}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Compile the catalogs of a school registry (or of CSV files)")
+    ap.add_argument("sources", nargs="*", default=[SCHOOLS_PATH],
+                    help="school registry JSON, or catalog CSVs (default: %(default)s)")
+    ap.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    ap.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / (1 << 20),
+                    help="CSV bytes per parse task")
+    ap.add_argument("--out-dir", default=None, help="default: data/cache next to each CSV")
+    ap.add_argument("--force", action="store_true", help="recompile catalogs whose snapshot is current")
+    args = ap.parse_args(argv)
+
+    chunk_bytes = max(1, int(args.chunk_mb * (1 << 20)))
+    written: Dict[str, Optional[str]] = {}
+    csvs = [s for s in args.sources if s.lower().endswith(".csv")]
+    for registry in (s for s in args.sources if not s.lower().endswith(".csv")):
+        written.update(ingest_schools(registry, args.workers, chunk_bytes, args.out_dir, args.force))
+    if csvs:
+        written.update(ingest_catalogs(csvs, args.workers, chunk_bytes, args.out_dir, args.force))
+    for source, out in written.items():
+        print(f"{source}: {out or 'up to date'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
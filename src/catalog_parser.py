@@ -1,22 +1,209 @@
-import pandas as pd
+import csv
+import operator
 import re
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Set
+from collections.abc import Set as AbstractSet
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from catalog_index import CatalogIndex
+from pathway_tables import PathwayTable, build_pathway_table
+
+
+FIRST_COLUMN = "ENGLISH"
+TITLE_COLUMN = "Unnamed: 1"
+GRADE_COLUMNS = ["Unnamed: 2", "Unnamed: 3", "Unnamed: 4", "Unnamed: 5"]
+AG_COLUMN = "Unnamed: 6"
+NOTES_COLUMN = "Unnamed: 7"
+
+# Cells pandas.read_csv would have turned into NaN (its default na_values).
+NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+DEFAULT_GRADE_MASK = (1 << 9) | (1 << 10) | (1 << 11) | (1 << 12)  # {9,10,11,12}
+AG_AREAS = "ABCDEFG"  # ag_area code 1..7; 0 = no A-G area
+
+_CODE_RE = re.compile(r"\d{5,}")
+_AG_AREA_RE = re.compile(r"area\s+([a-g])\b", re.IGNORECASE)
+
+
+def grades_to_mask(grades) -> int:
+    m = 0
+    for g in grades:
+        m |= 1 << g
+    return m
+
+
+def mask_to_grades(mask: int) -> List[int]:
+    return [g for g in range(16) if (mask >> g) & 1]
+
+
+def grade_bit(mask: int, grade: Any) -> bool:
+    """
+    Whether grade is set in mask; False for anything that isn't a grade number
+    (numpy integers count as grade numbers, floats and strings don't).
+    """
+    try:
+        grade = operator.index(grade)
+    except TypeError:
+        return False
+    return 0 <= grade < 16 and bool((mask >> grade) & 1)
+
+
+class GradeSet(AbstractSet):
+    """
+    Read-only set view over a grade bitmask; `grade in s` is a single bit test.
+    """
+    __slots__ = ("mask",)
+
+    def __init__(self, mask: int):
+        self.mask = int(mask)
+
+    def __contains__(self, grade) -> bool:
+        return grade_bit(self.mask, grade)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(mask_to_grades(self.mask))
+
+    def __len__(self) -> int:
+        return bin(self.mask).count("1")
+
+    def __repr__(self) -> str:
+        return "{" + ", ".join(str(g) for g in self) + "}"
+
+
+class CourseStore:
+    """
+    Columnar course table: row i of every array describes the same course.
+    Rows are unique titles in CSV insertion order (row id == catalog position).
+    """
+
+    def __init__(self, codes: List[str], titles: List[str], section_ids: np.ndarray, sections: List[str],
+                 ag: List[str], ag_area: np.ndarray, notes: List[str], grade_masks: np.ndarray):
+        self.codes = codes
+        self.titles = titles
+        self.section_ids = section_ids      # int32 -> sections
+        self.sections = sections            # distinct subject section names
+        self.ag = ag
+        self.ag_area = ag_area              # uint8, 0 = none, 1..7 = A..G
+        self.notes = notes
+        self.grade_masks = grade_masks      # uint16, bit g set if offered in grade g
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def section_of(self, i: int) -> str:
+        return self.sections[self.section_ids[i]]
 
 
-@dataclass(frozen=True)
 class Course:
-    code: str
-    title: str
-    subject_section: str
-    allowed_grades: Set[int]  # e.g., {9,10,11,12}
-    ag: str
-    notes: str
+    """
+    Lightweight view of one CourseStore row; reads like the old frozen dataclass.
+    """
+    __slots__ = ("_store", "id", "grade_mask")
 
+    def __init__(self, store: CourseStore, i: int):
+        self._store = store
+        self.id = i
+        self.grade_mask = int(store.grade_masks[i])
 
-def _is_course_code(x) -> bool:
-    s = str(x).strip()
-    return bool(re.fullmatch(r"\d{5,}", s))
+    @property
+    def code(self) -> str:
+        return self._store.codes[self.id]
+
+    @property
+    def title(self) -> str:
+        return self._store.titles[self.id]
+
+    @property
+    def subject_section(self) -> str:
+        return self._store.section_of(self.id)
+
+    @property
+    def allowed_grades(self) -> GradeSet:
+        return GradeSet(self.grade_mask)
+
+    @property
+    def ag(self) -> str:
+        return self._store.ag[self.id]
+
+    @property
+    def ag_area(self) -> int:
+        return int(self._store.ag_area[self.id])
+
+    @property
+    def notes(self) -> str:
+        return self._store.notes[self.id]
+
+    def offered_in(self, grade: int) -> bool:
+        # Same as `grade in allowed_grades`: False for anything that isn't a grade number.
+        return grade_bit(self.grade_mask, grade)
+
+    def _key(self):
+        return (self.code, self.title, self.subject_section, self.grade_mask, self.ag, self.notes)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Course) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (f"Course(code={self.code!r}, title={self.title!r}, subject_section={self.subject_section!r}, "
+                f"allowed_grades={self.allowed_grades!r}, ag={self.ag!r}, notes={self.notes!r})")
+
+
+class Catalog(dict):
+    """
+    Title -> Course mapping (CSV insertion order) that also carries its lookup index
+    and pathway table. Built by load_catalog; treat it as read-only afterwards.
+    """
+    index: Optional[CatalogIndex] = None
+    store: Optional[CourseStore] = None
+    pathways: Optional[PathwayTable] = None
+    version: str = ""  # sha256 of the source CSV
+    preferred_titles: Optional[dict] = None  # school rules (catalog_registry); None = rules_pusd defaults
+    reloads: tuple = ()  # CatalogDiff of every hot reload, oldest first (catalog_reload)
+
+
+_DERIVED = "_derived"  # instance attribute of a Catalog holding its CatalogCache entries
+
+
+class CatalogCache:
+    """
+    One structure derived from a loaded catalog (resolver, prerequisite graph, codec, ...)
+    per catalog. Entries live in the catalog's own __dict__, so they are freed with the
+    catalog; drop_catalog_caches (reload, CatalogRegistry eviction) drops them early.
+    A mapping without an instance dict (a plain dict used as a catalog) caches nothing.
+    """
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def get(self, catalog) -> Any:
+        return getattr(catalog, "__dict__", {}).get(_DERIVED, {}).get(self.name)
+
+    def __setitem__(self, catalog, value) -> None:
+        own = getattr(catalog, "__dict__", None)
+        if own is not None:
+            own.setdefault(_DERIVED, {})[self.name] = value
+
+    def pop(self, catalog) -> Any:
+        return getattr(catalog, "__dict__", {}).get(_DERIVED, {}).pop(self.name, None)
+
+
+def catalog_cached(catalog) -> List[Any]:
+    """
+    The entries the per-catalog caches hold for this catalog.
+    """
+    return list(getattr(catalog, "__dict__", {}).get(_DERIVED, {}).values())
+
+
+def drop_catalog_caches(catalog) -> None:
+    getattr(catalog, "__dict__", {}).pop(_DERIVED, None)
 
 
 def _is_section_header(x) -> bool:
@@ -29,54 +216,149 @@ def _is_section_header(x) -> bool:
     return (s.upper() == s) and (not any(c.isdigit() for c in s)) and (len(s) <= 60)
 
 
-def _extract_grades(row) -> Set[int]:
-    out = set()
-    for col in ["Unnamed: 2", "Unnamed: 3", "Unnamed: 4", "Unnamed: 5"]:
-        if col in row and pd.notna(row[col]):
-            try:
-                g = int(float(row[col]))
-                if 6 <= g <= 12:
-                    out.add(g)
-            except Exception:
-                pass
+def _grade_bit(cell: Optional[str]) -> int:
+    if cell is None:
+        return 0
+    try:
+        g = int(float(cell))
+    except Exception:
+        return 0
+    return 1 << g if 6 <= g <= 12 else 0
+
+
+def _column_names(header: List[str]) -> Dict[str, int]:
+    # pandas names blank header cells "Unnamed: <position>"
+    names: Dict[str, int] = {}
+    for i, h in enumerate(header):
+        names.setdefault(h if h != "" else f"Unnamed: {i}", i)
+    return names
+
+
+def _column(rows: List[List[str]], names: Dict[str, int], name: str) -> List[Optional[str]]:
+    i = names.get(name)
+    if i is None:
+        return [None] * len(rows)
+    return [r[i] if i < len(r) and r[i] not in NA_VALUES else None for r in rows]
+
+
+def _clean(col: List[Optional[str]]) -> List[str]:
+    out = []
+    for x in col:
+        s = "" if x is None else x.strip()
+        out.append("" if s.lower() == "nan" else s)
     return out
 
 
-def load_catalog(csv_path: str) -> Dict[str, Course]:
+def read_catalog_rows(csv_path: str):
     """
-    Parses the Foothill CSV into a dict keyed by exact course title.
+    Returns (column name -> index, data rows) the way pandas.read_csv would see them:
+    first non-blank line is the header, blank lines are skipped.
     """
-    df = pd.read_csv(csv_path)
-    subject = "UNKNOWN"
-    catalog: Dict[str, Course] = {}
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        rows = [r for r in csv.reader(f) if r]
+    if not rows:
+        return {}, []
+    return _column_names(rows[0]), rows[1:]
+
+
+def build_store(names: Dict[str, int], rows: List[List[str]], start_section: str = "UNKNOWN") -> CourseStore:
+    """
+    Column-at-a-time parse of catalog rows into a CourseStore.
+    Section membership is carried forward from the last header row at or above each row.
+    """
+    n = len(rows)
+    first = _column(rows, names, FIRST_COLUMN)
+
+    is_header = np.fromiter((_is_section_header(x) for x in first), dtype=bool, count=n)
+    firsts = ["" if x is None else x.strip() for x in first]
+    is_code = np.fromiter((_CODE_RE.fullmatch(s) is not None for s in firsts), dtype=bool, count=n)
+
+    titles_col = _column(rows, names, TITLE_COLUMN)
+    raw_titles = ["" if t is None else t.strip() for t in titles_col]
+    has_title = np.fromiter((bool(t) and t.lower() != "nan" for t in raw_titles), dtype=bool, count=n)
 
-    for _, row in df.iterrows():
-        first = row.get("ENGLISH")
+    # section of a row = last header at or above it (none yet -> start_section)
+    section_ids: Dict[str, int] = {start_section: 0}
+    header_sid = np.array([section_ids.setdefault(firsts[i], len(section_ids)) for i in np.flatnonzero(is_header)]
+                          + [0], dtype=np.int32)
+    last_header = np.cumsum(is_header) - 1
+    row_section = np.where(last_header >= 0, header_sid[last_header], 0)
 
-        if _is_section_header(first):
-            subject = str(first).strip()
-            continue
+    course_rows = np.flatnonzero(is_code & has_title)
 
-        if str(first).strip().lower() == "course code":
-            continue
+    masks = np.zeros(n, dtype=np.uint16)
+    bit_cache: Dict[Optional[str], int] = {}
+    for name in GRADE_COLUMNS:
+        col = _column(rows, names, name)
+        bits = []
+        for x in col:
+            b = bit_cache.get(x)
+            if b is None:
+                b = bit_cache[x] = _grade_bit(x)
+            bits.append(b)
+        masks |= np.asarray(bits, dtype=np.uint16)
+    masks[masks == 0] = DEFAULT_GRADE_MASK  # safe fallback
 
-        if _is_course_code(first):
-            code = str(first).strip()
-            title = str(row.get("Unnamed: 1", "")).strip()
-            if not title or title.lower() == "nan":
-                continue
+    ag_col = _clean(_column(rows, names, AG_COLUMN))
+    notes_col = _clean(_column(rows, names, NOTES_COLUMN))
 
-            grades = _extract_grades(row)
-            ag = str(row.get("Unnamed: 6", "")).strip()
-            notes = str(row.get("Unnamed: 7", "")).strip()
+    # Dict semantics of the old parser: a repeated title keeps its first position
+    # but takes the values of its last row.
+    pos: Dict[str, int] = {}
+    order: List[int] = []
+    for r in course_rows.tolist():
+        t = raw_titles[r]
+        p = pos.get(t)
+        if p is None:
+            pos[t] = len(order)
+            order.append(r)
+        else:
+            order[p] = r
+    sel = np.asarray(order, dtype=np.int64)
+
+    ag = [ag_col[r] for r in order]
+    ag_area = np.fromiter((_ag_area_code(s) for s in ag), dtype=np.uint8, count=len(order))
+    return CourseStore(
+        codes=[firsts[r] for r in order],
+        titles=[raw_titles[r] for r in order],
+        section_ids=row_section[sel].astype(np.int32),
+        sections=list(section_ids),
+        ag=ag,
+        ag_area=ag_area,
+        notes=[notes_col[r] for r in order],
+        grade_masks=masks[sel],
+    )
+
+
+def _ag_area_code(ag: str) -> int:
+    m = _AG_AREA_RE.search(ag)
+    return AG_AREAS.index(m.group(1).upper()) + 1 if m else 0
+
+
+def catalog_from_store(store: CourseStore, index: Optional[CatalogIndex] = None,
+                       pathways: Optional[PathwayTable] = None) -> Catalog:
+    catalog = Catalog((t, Course(store, i)) for i, t in enumerate(store.titles))
+    catalog.store = store
+    catalog.index = index if index is not None else CatalogIndex(
+        store.titles, [store.section_of(i) for i in range(len(store))], store.grade_masks)
+    catalog.pathways = pathways if pathways is not None else build_pathway_table(catalog)
+    return catalog
+
+
+def load_catalog(csv_path: str, use_snapshot: bool = True) -> Catalog:
+    """
+    Parses the Foothill CSV into a dict keyed by exact course title.
+    If a compiled snapshot of this exact CSV exists (see catalog_snapshot), it is loaded instead.
+    """
+    from catalog_snapshot import catalog_from_snapshot, csv_digest, open_snapshot, snapshot_path
 
-            catalog[title] = Course(
-                code=code,
-                title=title,
-                subject_section=subject,
-                allowed_grades=grades if grades else {9, 10, 11, 12},  # safe fallback
-                ag="" if ag.lower() == "nan" else ag,
-                notes="" if notes.lower() == "nan" else notes,
-            )
+    digest = csv_digest(csv_path)
+    if use_snapshot:
+        snap = open_snapshot(snapshot_path(csv_path), digest)
+        if snap is not None:
+            return catalog_from_snapshot(snap)
 
+    names, rows = read_catalog_rows(csv_path)
+    catalog = catalog_from_store(build_store(names, rows))
+    catalog.version = digest
     return catalog
@@ -0,0 +1,273 @@
+"""
+Catalogs for many schools, loaded on first use and kept in a bounded LRU.
+
+data/schools.json maps a school id to its catalog CSV and, optionally, its own
+preferred titles (inline, or the path of a JSON file holding them); keys it
+leaves out fall back to rules_pusd.PREFERRED_TITLES:
+
+    {
+      "foothill": {"catalog": "data/foothill_catalog.csv"},
+      "amistad": {"catalog": "data/amistad_catalog.csv",
+                  "preferred_titles": {"g9_pe": ["PE 9"]}}
+    }
+
+A catalog (with its index, pathway table and rules) is charged its estimated
+resident size; past max_bytes (or max_schools) the least recently used ones are
+dropped, together with everything the per-catalog caches built from them
+(resolver, prerequisite graph, codec, elective table, replanner). A resident
+school is a dict lookup away.
+"""
+import hashlib
+import json
+import sys
+import types
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Union
+
+import numpy as np
+
+from catalog_index import PostingTable
+from catalog_parser import Catalog, catalog_cached, drop_catalog_caches, load_catalog
+from catalog_reload import CatalogDiff, reload_catalog
+from rules_pusd import PREFERRED_TITLES
+
+
+SCHOOLS_PATH = "data/schools.json"
+DEFAULT_SCHOOL = "foothill"
+DEFAULT_MAX_BYTES = 512 << 20
+
+_POSTING_BYTES = 8 + 28  # list slot + int object, per posting entry
+
+
+@dataclass(frozen=True)
+class SchoolConfig:
+    school_id: str
+    catalog_path: str
+    preferred_titles: Union[None, str, Dict[str, list]] = None  # inline, or a JSON file path
+
+
+def load_school_configs(path: str = SCHOOLS_PATH) -> Dict[str, SchoolConfig]:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return {sid: SchoolConfig(sid, entry["catalog"], entry.get("preferred_titles")) for sid, entry in raw.items()}
+
+
+def _load_preferred(spec: Union[None, str, Dict[str, list]]) -> Optional[Dict[str, list]]:
+    if spec is None:
+        return None
+    if isinstance(spec, str):
+        with open(spec, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    return {**PREFERRED_TITLES, **spec}
+
+
+def _rules_version(catalog_version: str, preferred: Optional[Dict[str, list]]) -> str:
+    # Plans depend on the rules as much as on the catalog, so both go into the
+    # version PlanCache keys on.
+    if preferred is None:
+        return catalog_version
+    raw = json.dumps(preferred, sort_keys=True, separators=(",", ":"))
+    return catalog_version + ":" + hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+# --- memory accounting ---------------------------------------------------------------
+
+
+def _strings_nbytes(strings) -> int:
+    return sys.getsizeof(strings) + sum(sys.getsizeof(s) for s in strings)
+
+
+def _postings_nbytes(table: Mapping) -> int:
+    if isinstance(table, PostingTable):
+        lists = table._lists
+        n = (table._offsets.nbytes + table._postings.nbytes + _strings_nbytes(table._keys)
+             + sys.getsizeof(table._slot))
+    else:
+        lists = table
+        n = _strings_nbytes(list(table)) + sys.getsizeof(table)
+    return n + sum(sys.getsizeof(v) + len(v) * 28 for v in lists.values())
+
+
+def _field_nbytes(field) -> int:
+    n = _strings_nbytes(field.texts) + _postings_nbytes(field.tokens)
+    if field._ngrams is not None:
+        n += _postings_nbytes(field._ngrams)
+    if field._distinct is not None:
+        n += _postings_nbytes(field._distinct)
+    return n + sum(len(v) for v in field._cache.values()) * _POSTING_BYTES
+
+
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def _deep_nbytes(roots, skip) -> int:
+    """
+    Size of the objects reachable from roots, not counting those in skip (ids) or
+    anything reachable only through them.
+    """
+    seen = set(skip)
+    stack = list(roots)
+    n = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _OPAQUE):
+            continue
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            n += o.nbytes if o.base is None else 0
+            continue
+        n += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, int, float)):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            d = getattr(o, "__dict__", None)
+            if d is not None:
+                stack.append(d)
+            for cls in type(o).__mro__:
+                for name in cls.__dict__.get("__slots__", ()):
+                    v = getattr(o, name, None)
+                    if v is not None:
+                        stack.append(v)
+    return n
+
+
+def derived_nbytes(catalog: Catalog) -> int:
+    """
+    Estimated size of what the per-catalog caches (catalog_parser.CatalogCache:
+    resolver, prerequisite graph, codec, elective table, replanner, ...) hold for
+    this catalog, beyond the catalog itself.
+    """
+    own = [catalog, catalog.store, catalog.index, catalog.pathways]
+    if catalog.store is not None:
+        own += [catalog.store.codes, catalog.store.titles, catalog.store.sections, catalog.store.ag, catalog.store.notes]
+    return _deep_nbytes(catalog_cached(catalog), {id(o) for o in own if o is not None})
+
+
+def catalog_nbytes(catalog: Catalog) -> int:
+    """
+    Estimated resident size of a loaded catalog: course table, index (including the
+    caches it has grown so far), pathway table and the structures derived from it
+    (derived_nbytes). An estimate, not a measurement.
+    """
+    n = sys.getsizeof(catalog) + sum(sys.getsizeof(c) for c in catalog.values())
+    store = catalog.store
+    if store is not None:
+        n += sum(a.nbytes for a in (store.section_ids, store.ag_area, store.grade_masks) if isinstance(a, np.ndarray))
+        n += sum(_strings_nbytes(col) for col in (store.codes, store.titles, store.sections, store.ag, store.notes))
+    index = catalog.index
+    if index is not None:
+        n += _field_nbytes(index.title) + _field_nbytes(index.section)
+        n += sum(len(v) for v in index.by_grade.values()) * _POSTING_BYTES
+        n += sum(len(v) for v in index._query_cache.values()) * _POSTING_BYTES
+    if catalog.pathways is not None:
+        n += sum(sys.getsizeof(v) for v in catalog.pathways.lists.values())
+    return n + derived_nbytes(catalog)
+
+
+# --- registry ---------------------------------------------------------------------------
+
+
+class CatalogRegistry:
+    """
+    school id -> Catalog, loaded lazily and evicted least-recently-used first once
+    the resident catalogs' estimated size exceeds max_bytes (or their number
+    max_schools). The catalog just asked for is never evicted, however large.
+    """
+
+    def __init__(self, schools: Union[str, Mapping[str, SchoolConfig]] = SCHOOLS_PATH,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_schools: Optional[int] = None,
+                 default_school: Optional[str] = None):
+        self.config_path = schools if isinstance(schools, str) else None
+        self.schools: Dict[str, SchoolConfig] = (load_school_configs(schools) if isinstance(schools, str)
+                                                 else dict(schools))
+        self.max_bytes = max_bytes
+        self.max_schools = max_schools
+        self.default_school = default_school or (DEFAULT_SCHOOL if DEFAULT_SCHOOL in self.schools
+                                                 else next(iter(self.schools), DEFAULT_SCHOOL))
+        self._resident: "OrderedDict[str, Catalog]" = OrderedDict()
+        self._nbytes: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, school_id: str) -> bool:
+        return school_id in self._resident
+
+    def __len__(self) -> int:
+        return len(self._resident)
+
+    def catalog_path(self, school_id: str) -> str:
+        return self._config(school_id).catalog_path
+
+    def _config(self, school_id: str) -> SchoolConfig:
+        cfg = self.schools.get(school_id)
+        if cfg is None:
+            raise KeyError(f"unknown school {school_id!r}")
+        return cfg
+
+    def get(self, school_id: Optional[str] = None) -> Catalog:
+        school_id = school_id or self.default_school
+        catalog = self._resident.get(school_id)
+        if catalog is not None:
+            self.hits += 1
+            self._resident.move_to_end(school_id)
+            return catalog
+
+        self.misses += 1
+        cfg = self._config(school_id)
+        catalog = load_catalog(cfg.catalog_path)
+        catalog.preferred_titles = _load_preferred(cfg.preferred_titles)
+        catalog.version = _rules_version(catalog.version, catalog.preferred_titles)
+        self._resident[school_id] = catalog
+        self._enforce_budget()
+        return catalog
+
+    def reload(self, school_id: str) -> Optional[CatalogDiff]:
+        """
+        Applies the school's corrected CSV to its resident catalog in place (see
+        catalog_reload). None if it is not resident: the next get() reads the new CSV.
+        """
+        catalog = self._resident.get(school_id)
+        if catalog is None:
+            return None
+        diff = reload_catalog(catalog, self.catalog_path(school_id))
+        self._nbytes[school_id] = catalog_nbytes(catalog)
+        return diff
+
+    def evict(self, school_id: str) -> bool:
+        catalog = self._resident.pop(school_id, None)
+        if catalog is None:
+            return False
+        # A caller may still hold the catalog; what the per-catalog caches built from it goes now.
+        drop_catalog_caches(catalog)
+        self._nbytes.pop(school_id, None)
+        self.evictions += 1
+        return True
+
+    def resident_bytes(self) -> int:
+        return sum(self._nbytes.values())
+
+    def _enforce_budget(self) -> None:
+        # Indexes grow query caches while in use, so re-measure everyone on each admission.
+        for sid, catalog in self._resident.items():
+            self._nbytes[sid] = catalog_nbytes(catalog)
+        while len(self._resident) > 1 and (
+                self.resident_bytes() > self.max_bytes
+                or (self.max_schools is not None and len(self._resident) > self.max_schools)):
+            self.evict(next(iter(self._resident)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "resident": list(self._resident),
+            "resident_bytes": self.resident_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
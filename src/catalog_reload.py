@@ -0,0 +1,387 @@
+"""
+Hot reload of a loaded catalog from a corrected CSV.
+
+    diff = reload_catalog(catalog, "data/foothill_catalog.csv")
+
+parses the new CSV, diffs it against the loaded rows by course code, and
+updates the Catalog object in place, so everything holding it sees the new
+courses without a restart:
+
+- the index postings are remapped to the new row positions, and only the
+  inserted or changed rows are re-tokenized;
+- only the pathway candidate lists a touched title can appear in are rebuilt;
+- the per-catalog caches (resolver, prerequisite graph, codec, the replanner
+  and its traces, ...) are dropped, and catalog.version moves to the new CSV
+  digest.
+
+If the surviving rows were reordered, the index is rebuilt from scratch.
+
+Cached plans (see plan_cache) survive a reload when plan_is_current() says so:
+the plan references no touched course, and the reload only took options away
+(removed courses, dropped grade levels). affected_plans() lists the stored plans
+that reference a touched course, which are the only ones whose validation can
+change.
+
+    python src/catalog_reload.py OLD.csv NEW.csv --results data/outputs/cohort_plans.jsonl --revalidate
+"""
+import argparse
+import bisect
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from catalog_index import CatalogIndex, FieldIndex, PostingTable, _ngrams, _tokens, to_csr
+from catalog_parser import (Catalog, Course, CourseStore, build_store, catalog_from_store, drop_catalog_caches,
+                            read_catalog_rows)
+from math_pathway import chain_candidates
+from pathway_tables import PathwayTable, step_chain
+
+
+@dataclass
+class CatalogDiff:
+    """
+    What one reload changed. Titles are catalog keys; a changed course is listed
+    with its old and its new title (the same title unless it was renamed).
+    """
+    old_version: str
+    new_version: str
+    inserted: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[Tuple[str, str]] = field(default_factory=list)
+    adds_candidates: bool = False  # a course became eligible somewhere, or its attributes changed
+    rebuilt: bool = False          # rows were reordered: the index was rebuilt, not patched
+
+    def __bool__(self) -> bool:
+        return bool(self.inserted or self.removed or self.changed)
+
+    def touched(self) -> Set[str]:
+        out = set(self.inserted) | set(self.removed)
+        for old, new in self.changed:
+            out.add(old)
+            out.add(new)
+        return out
+
+    def affects(self, plan: Dict[str, Any]) -> bool:
+        """
+        Whether plan references a course this reload inserted, removed or changed.
+        """
+        touched = self.touched()
+        return any(t in touched for t in plan_titles(plan))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "old_version": self.old_version,
+            "new_version": self.new_version,
+            "inserted": len(self.inserted),
+            "removed": len(self.removed),
+            "changed": len(self.changed),
+            "adds_candidates": self.adds_candidates,
+            "rebuilt": self.rebuilt,
+        }
+
+
+def plan_titles(plan: Dict[str, Any]) -> Iterable[str]:
+    for year in plan.get("plan", []):
+        for slot in year.get("courses", []):
+            if isinstance(slot, list):
+                yield from slot
+            elif slot is not None:
+                yield slot
+
+
+def cache_version(catalog) -> str:
+    """
+    The catalog version plan-cache keys are built on: the version it was first
+    loaded at, so keys stay put across reloads and plan_is_current decides.
+    """
+    reloads = getattr(catalog, "reloads", ())
+    return reloads[0].old_version if reloads else getattr(catalog, "version", "")
+
+
+def plan_is_current(catalog, version: str, plan: Dict[str, Any]) -> bool:
+    """
+    Whether a plan computed against catalog version `version` is still what
+    planning would produce now: every reload since then only took options away,
+    and none of them touched a course of the plan.
+    """
+    if version == getattr(catalog, "version", ""):
+        return True
+    titles = None
+    since = False
+    for diff in getattr(catalog, "reloads", ()):
+        since = since or diff.old_version == version
+        if not since:
+            continue
+        if diff.adds_candidates:
+            return False
+        if titles is None:
+            titles = set(plan_titles(plan))
+        if titles & diff.touched():
+            return False
+    return since
+
+
+def affected_plans(plans: Sequence[Dict[str, Any]], diff: CatalogDiff) -> List[int]:
+    """
+    Indices of the plans that reference a course the reload touched.
+    """
+    touched = diff.touched()
+    return [i for i, p in enumerate(plans) if any(t in touched for t in plan_titles(p))]
+
+
+# --- diffing --------------------------------------------------------------------------
+
+
+def _row_keys(store: CourseStore) -> List[str]:
+    # course code, disambiguated by occurrence for the rare code shared by two titles
+    seen: Dict[str, int] = {}
+    keys = []
+    for code in store.codes:
+        k = seen[code] = seen.get(code, -1) + 1
+        keys.append(code if k == 0 else f"{code}#{k}")
+    return keys
+
+
+def _row(store: CourseStore, i: int) -> Tuple:
+    return (store.titles[i], store.section_of(i), int(store.grade_masks[i]), store.ag[i], store.notes[i])
+
+
+def diff_stores(old: CourseStore, new: CourseStore) -> Tuple[np.ndarray, List[int], List[int], List[int]]:
+    """
+    Returns (old row -> new row, -1 if removed), then the new rows inserted, the new
+    rows changed and the old rows removed.
+    """
+    new_pos = {k: j for j, k in enumerate(_row_keys(new))}
+    old_to_new = np.full(len(old), -1, dtype=np.int64)
+    changed: List[int] = []
+    removed: List[int] = []
+    for i, k in enumerate(_row_keys(old)):
+        j = new_pos.pop(k, None)
+        if j is None:
+            removed.append(i)
+            continue
+        old_to_new[i] = j
+        if _row(old, i) != _row(new, j):
+            changed.append(j)
+    return old_to_new, sorted(new_pos.values()), changed, removed
+
+
+# --- incremental index update ----------------------------------------------------------
+
+
+def _csr(table) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    if isinstance(table, PostingTable):
+        return table._keys, np.asarray(table._offsets), np.asarray(table._postings)
+    return to_csr(table)
+
+
+def _patch_postings(table, remap: np.ndarray, additions: Dict[str, List[int]]) -> PostingTable:
+    """
+    Moves every posting to its new row (dropping those remapped to -1) and merges in
+    additions, all as one vectorized pass over the CSR arrays.
+    """
+    keys, offsets, postings = _csr(table)
+    all_keys = sorted(set(keys).union(additions))
+    slot = {k: i for i, k in enumerate(all_keys)}
+    old_ids = np.asarray([slot[k] for k in keys], dtype=np.int64)
+
+    key_ids = np.repeat(old_ids, np.diff(offsets))
+    pos = remap[postings] if len(postings) else np.zeros(0, dtype=np.int64)
+    keep = pos >= 0
+    add_ids = [slot[k] for k, ps in additions.items() for _ in ps]
+    add_pos = [p for ps in additions.values() for p in ps]
+    key_ids = np.concatenate([key_ids[keep], np.asarray(add_ids, dtype=np.int64)])
+    pos = np.concatenate([pos[keep], np.asarray(add_pos, dtype=np.int64)])
+
+    order = np.lexsort((pos, key_ids))
+    counts = np.bincount(key_ids, minlength=len(all_keys))
+    live = np.flatnonzero(counts)
+    new_offsets = np.zeros(len(live) + 1, dtype=np.int64)
+    np.cumsum(counts[live], out=new_offsets[1:])
+    return PostingTable([all_keys[i] for i in live], new_offsets, pos[order].astype(np.int32))
+
+
+def _patch_lists(table, old_texts: List[str], texts: List[str], dirty: Set[int], keys_of) -> Dict[str, List[int]]:
+    # Rows kept their positions: only the posting lists of the dirty rows' old and new
+    # keys change; they are copied before the edit, the rest are shared.
+    out = dict(table)
+    copied: Set[str] = set()
+
+    def writable(k: str) -> List[int]:
+        if k not in copied:
+            copied.add(k)
+            out[k] = list(out.get(k, ()))
+        return out[k]
+
+    for p in sorted(dirty):
+        for k in keys_of(old_texts[p]):
+            writable(k).remove(p)
+        for k in keys_of(texts[p]):
+            bisect.insort(writable(k), p)
+    for k in copied:
+        if not out[k]:
+            del out[k]
+    return out
+
+
+def _patch_field(fld: FieldIndex, texts: List[str], remap: np.ndarray, dirty: Set[int]) -> FieldIndex:
+    """
+    fld re-pointed at the new rows; the rows in dirty (new positions) are re-tokenized.
+    """
+    in_place = (len(remap) == len(texts) and bool(np.all((remap == np.arange(len(remap))) | (remap < 0)))
+                and set(np.flatnonzero(remap < 0).tolist()) <= dirty)
+
+    def patch(table, keys_of):
+        if in_place and not isinstance(table, PostingTable):
+            return _patch_lists(table, fld.texts, texts, dirty, keys_of)
+        out: Dict[str, List[int]] = {}
+        for p in sorted(dirty):
+            for k in keys_of(texts[p]):
+                out.setdefault(k, []).append(p)
+        return _patch_postings(table, remap, out)
+
+    tokens = patch(fld.tokens, _tokens)
+    ngrams = patch(fld._ngrams, _ngrams) if fld._ngrams is not None else None
+    return FieldIndex(texts, tokens, ngrams)
+
+
+def _field_remap(old_texts: List[str], new_texts: List[str], old_to_new: np.ndarray) -> Tuple[np.ndarray, Set[int]]:
+    remap = old_to_new.copy()
+    dirty = set(range(len(new_texts))) - set(old_to_new[old_to_new >= 0].tolist())  # inserted rows
+    for i in np.flatnonzero(old_to_new >= 0).tolist():
+        j = int(old_to_new[i])
+        if old_texts[i] != new_texts[j]:
+            remap[i] = -1
+            dirty.add(j)
+    return remap, dirty
+
+
+def _patch_index(old: CatalogIndex, store: CourseStore, old_to_new: np.ndarray) -> CatalogIndex:
+    title_texts = [t.lower() for t in store.titles]
+    lowered = [s.lower() for s in store.sections]
+    section_texts = [lowered[i] for i in store.section_ids.tolist()]
+
+    title_remap, title_dirty = _field_remap(old.title.texts, title_texts, old_to_new)
+    section_remap, section_dirty = _field_remap(old.section.texts, section_texts, old_to_new)
+    return CatalogIndex(
+        store.titles, [], store.grade_masks,
+        title_field=_patch_field(old.title, title_texts, title_remap, title_dirty),
+        section_field=_patch_field(old.section, section_texts, section_remap, section_dirty),
+    )
+
+
+def _patch_pathways(table: PathwayTable, catalog: Catalog, touched: Set[str]) -> PathwayTable:
+    touched_lower = [t.lower() for t in touched]
+    lists = dict(table.lists)
+    for (kind, step, grade) in table.lists:
+        chain = step_chain(kind, step)
+        if any(all(k in t for k in keywords) for keywords in chain for t in touched_lower):
+            lists[(kind, step, grade)] = chain_candidates(catalog, grade, chain)
+    return PathwayTable(lists, table.digest)
+
+
+def _only_narrows(old: CourseStore, new: CourseStore, old_to_new: np.ndarray, changed: List[int]) -> bool:
+    # True when every changed row kept its attributes and only lost grade levels.
+    new_to_old = {int(j): i for i, j in enumerate(old_to_new.tolist()) if j >= 0}
+    for j in changed:
+        i = new_to_old[j]
+        before, after = _row(old, i), _row(new, j)
+        if before[:2] != after[:2] or before[3:] != after[3:] or after[2] & ~before[2]:
+            return False
+    return True
+
+
+# --- reload -----------------------------------------------------------------------------
+
+
+def reload_catalog(catalog: Catalog, csv_path: str) -> CatalogDiff:
+    """
+    Brings catalog (in place) up to date with csv_path and returns what changed;
+    the diff is also appended to catalog.reloads.
+    """
+    from catalog_snapshot import csv_digest
+
+    old_version = catalog.version
+    base, sep, rules = old_version.partition(":")  # keep a registry's rules suffix
+    digest = csv_digest(csv_path)
+    new_version = digest + sep + rules
+    if digest == base:
+        return CatalogDiff(old_version, old_version)
+
+    old_store = catalog.store
+    names, rows = read_catalog_rows(csv_path)
+    store = build_store(names, rows)
+    old_to_new, inserted, changed, removed = diff_stores(old_store, store)
+
+    changed_rows = set(changed)
+    survivors = old_to_new[old_to_new >= 0]
+    rebuilt = bool(np.any(np.diff(survivors) < 0))
+    diff = CatalogDiff(
+        old_version, new_version,
+        inserted=[store.titles[j] for j in inserted],
+        removed=[old_store.titles[i] for i in removed],
+        changed=[(old_store.titles[i], store.titles[j])
+                 for i, j in enumerate(old_to_new.tolist()) if j in changed_rows],
+        rebuilt=rebuilt,
+    )
+    diff.adds_candidates = rebuilt or bool(inserted) or not _only_narrows(old_store, store, old_to_new, changed)
+
+    if rebuilt:
+        fresh = catalog_from_store(store)
+        index, pathways = fresh.index, fresh.pathways
+    else:
+        index, pathways = _patch_index(catalog.index, store, old_to_new), None
+
+    catalog.clear()
+    catalog.update((t, Course(store, i)) for i, t in enumerate(store.titles))
+    catalog.store = store
+    catalog.index = index
+    if pathways is None and catalog.pathways is not None:
+        pathways = _patch_pathways(catalog.pathways, catalog, diff.touched())
+    catalog.pathways = pathways
+    catalog.version = new_version
+    catalog.reloads = tuple(getattr(catalog, "reloads", ())) + (diff,)
+    drop_catalog_caches(catalog)  # resolver, graph, codec, ... and the replanner's traces
+    return diff
+
+
+def main(argv=None) -> int:
+    import json
+
+    from batch_planner import revalidate_results
+    from catalog_parser import load_catalog
+
+    ap = argparse.ArgumentParser(description="Diff a corrected catalog CSV against the loaded one")
+    ap.add_argument("old", help="the catalog CSV currently in use")
+    ap.add_argument("new", help="the corrected catalog CSV")
+    ap.add_argument("--results", default=None, help="a batch_planner results JSONL to check")
+    ap.add_argument("--revalidate", action="store_true", help="rewrite validation_errors of the affected plans")
+    args = ap.parse_args(argv)
+
+    catalog = load_catalog(args.old)
+    diff = reload_catalog(catalog, args.new)
+    print("Reload: {inserted} inserted, {removed} removed, {changed} changed".format(**diff.summary()))
+    for label, titles in (("+", diff.inserted), ("-", diff.removed)):
+        for t in titles:
+            print(f"  {label} {t}")
+    for old, new in diff.changed:
+        print(f"  ~ {old}" + (f" -> {new}" if new != old else ""))
+
+    if args.results:
+        with open(args.results, "r", encoding="utf-8") as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        planned = [r for r in results if r.get("ok")]
+        hit = affected_plans([r["plan"] for r in planned], diff)
+        print(f"{len(hit)}/{len(planned)} stored plans reference a changed course")
+        for i in hit:
+            print("  student", planned[i]["student_id"])
+        if args.revalidate:
+            summary = revalidate_results(args.results, catalog=catalog, only=diff)
+            print("Revalidated {revalidated} plans ({invalid} with validation errors)".format(**summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Precompiled binary catalog snapshots.
+
+    python src/catalog_snapshot.py compile [data/foothill_catalog.csv] [-o out.snap]
+
+A snapshot holds the parsed CourseStore columns plus the CatalogIndex postings
+and the PathwayTable. It is keyed by the sha256 of the source CSV, so load_catalog
+only uses it while the CSV is unchanged, and it is memory-mapped on load (no CSV
+parse, no pandas). A pathway table written for other track definitions is ignored
+and rebuilt on load.
+
+Layout: MAGIC | u32 format version | u32 header length | JSON header | blobs.
+The header maps blob names to (offset, nbytes, dtype); "str" blobs are
+NUL-joined UTF-8 strings.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from catalog_index import CatalogIndex, FieldIndex, PostingTable, to_csr
+from catalog_parser import Catalog, CourseStore, catalog_from_store, load_catalog
+from pathway_tables import PathwayTable, tracks_digest
+
+
+MAGIC = b"HSPCATLG"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+_ALIGN = 8
+
+
+def csv_digest(csv_path: str) -> str:
+    h = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def snapshot_path(csv_path: str) -> str:
+    """
+    Default snapshot location: data/cache/<csv name>.snap next to the CSV.
+    """
+    d, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(d, "cache", name + ".snap")
+
+
+def _csr_blobs(name: str, table) -> Dict[str, object]:
+    keys, offsets, postings = to_csr(table)
+    return {f"{name}.keys": keys, f"{name}.offsets": offsets, f"{name}.postings": postings}
+
+
+def _field_blobs(prefix: str, field: FieldIndex) -> Dict[str, object]:
+    out: Dict[str, object] = {}
+    for kind, table in (("tokens", field.tokens), ("ngrams", field.ngrams)):
+        out.update(_csr_blobs(f"{prefix}.{kind}", table))
+    return out
+
+
+def write_snapshot(catalog: Catalog, out_path: str, source_sha256: str) -> str:
+    store, index = catalog.store, catalog.index
+    blobs: Dict[str, object] = {
+        "codes": store.codes,
+        "titles": store.titles,
+        "sections": store.sections,
+        "ag": store.ag,
+        "notes": store.notes,
+        "section_ids": np.asarray(store.section_ids, dtype=np.int32),
+        "ag_area": np.asarray(store.ag_area, dtype=np.uint8),
+        "grade_masks": np.asarray(store.grade_masks, dtype=np.uint16),
+    }
+    blobs.update(_field_blobs("title", index.title))
+    blobs.update(_field_blobs("section", index.section))
+    pathways = catalog.pathways
+    if pathways is not None:
+        blobs.update(_csr_blobs("pathways", pathways.to_postings(store.titles)))
+
+    payload: List[bytes] = []
+    layout: Dict[str, list] = {}
+    offset = 0
+    for name, value in blobs.items():
+        if isinstance(value, np.ndarray):
+            raw, dtype, count = value.tobytes(), value.dtype.str, len(value)
+        else:
+            raw, dtype, count = "\x00".join(value).encode("utf-8"), "str", len(value)
+        layout[name] = [offset, len(raw), dtype, count]
+        pad = -len(raw) % _ALIGN
+        payload.append(raw + b"\x00" * pad)
+        offset += len(raw) + pad
+
+    header = json.dumps({"source_sha256": source_sha256, "rows": len(store), "blobs": layout,
+                         "pathways_digest": pathways.digest if pathways is not None else None}).encode("utf-8")
+    header += b" " * (-(len(header) + _PREFIX.size) % _ALIGN)
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for chunk in payload:
+            f.write(chunk)
+    os.replace(tmp, out_path)  # readers never see a half-written snapshot
+    return out_path
+
+
+class Snapshot:
+    """
+    An opened snapshot file: header metadata plus zero-copy views of its blobs.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"not a catalog snapshot: {path}")
+        self.format_version = version
+        self.header = json.loads(bytes(self._mm[_PREFIX.size:_PREFIX.size + header_len]))
+        self._base = _PREFIX.size + header_len
+
+    @property
+    def source_sha256(self) -> str:
+        return self.header["source_sha256"]
+
+    def has(self, name: str) -> bool:
+        return name in self.header["blobs"]
+
+    def array(self, name: str) -> np.ndarray:
+        offset, nbytes, dtype, count = self.header["blobs"][name]
+        return np.frombuffer(self._mm, dtype=np.dtype(dtype), count=count, offset=self._base + offset)
+
+    def strings(self, name: str) -> List[str]:
+        offset, nbytes, dtype, count = self.header["blobs"][name]
+        if count == 0:
+            return []
+        start = self._base + offset
+        return self._mm[start:start + nbytes].decode("utf-8").split("\x00")
+
+    def postings(self, name: str) -> PostingTable:
+        return PostingTable(self.strings(f"{name}.keys"), self.array(f"{name}.offsets"), self.array(f"{name}.postings"))
+
+
+def open_snapshot(path: str, source_sha256: Optional[str] = None) -> Optional[Snapshot]:
+    """
+    Returns the opened snapshot, or None when it is missing, unreadable, written by
+    another format version, or (if source_sha256 is given) built from a different CSV.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        snap = Snapshot(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if snap.format_version != FORMAT_VERSION:
+        return None
+    if source_sha256 is not None and snap.source_sha256 != source_sha256:
+        return None
+    return snap
+
+
+def catalog_from_snapshot(snap: Snapshot) -> Catalog:
+    store = CourseStore(
+        codes=snap.strings("codes"),
+        titles=snap.strings("titles"),
+        section_ids=snap.array("section_ids"),
+        sections=snap.strings("sections"),
+        ag=snap.strings("ag"),
+        ag_area=snap.array("ag_area"),
+        notes=snap.strings("notes"),
+        grade_masks=snap.array("grade_masks"),
+    )
+    lowered_sections = [s.lower() for s in store.sections]
+    index = CatalogIndex(
+        store.titles, [], store.grade_masks,
+        title_field=FieldIndex([t.lower() for t in store.titles],
+                               snap.postings("title.tokens"), snap.postings("title.ngrams")),
+        section_field=FieldIndex([lowered_sections[i] for i in store.section_ids.tolist()],
+                                 snap.postings("section.tokens"), snap.postings("section.ngrams")),
+    )
+    pathways = None
+    digest = snap.header.get("pathways_digest")
+    if snap.has("pathways.keys") and digest == tracks_digest():
+        pathways = PathwayTable.from_postings(snap.postings("pathways"), store.titles, digest)
+    catalog = catalog_from_store(store, index, pathways)
+    catalog.version = snap.source_sha256
+    return catalog
+
+
+def compile_catalog(csv_path: str, out_path: Optional[str] = None) -> str:
+    catalog = load_catalog(csv_path, use_snapshot=False)
+    return write_snapshot(catalog, out_path or snapshot_path(csv_path), catalog.version)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="catalog", description="Catalog snapshot tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("compile", help="parse a catalog CSV and write its binary snapshot")
+    c.add_argument("csv", nargs="?", default="data/foothill_catalog.csv")
+    c.add_argument("-o", "--out", default=None)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "compile":
+        out = compile_catalog(args.csv, args.out)
+        print("Compiled:", args.csv, "->", out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
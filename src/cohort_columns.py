@@ -0,0 +1,332 @@
+"""
+Columnar cohort plan export, for reports that only scan a few columns.
+
+    python src/batch_planner.py cohort.jsonl --columns data/outputs/cohort_columns
+    python src/cohort_columns.py export data/outputs/cohort_plans.jsonl -o data/outputs/cohort_columns
+    python src/cohort_columns.py taking data/outputs/cohort_columns "AP Calculus BC (HP)" --grade 11
+
+A cohort directory holds one fixed-width little-endian file per column, appended
+chunk by chunk as results come in:
+
+- entries, one per course of every slot (a semester pair gives one per course,
+  an empty slot one with course EMPTY): student, grade, slot, course, flags.
+- students, one per batch_planner result: goal (index into the header's goal
+  names, NO_GOAL for a failed student), errors (validation error count),
+  status (OK / FAILED).
+
+course indexes titles.str and student indexes the student rows, whose ids are in
+student_ids.str (both NUL-terminated UTF-8, appended like the columns).
+header.json holds the row counts, file sizes, dtypes and goal names; it is
+replaced after every chunk, so a reader only sees whole chunks (and an appending
+writer cuts off a chunk that was being written when a run died). CohortColumns
+memory-maps the column files: a query reads the columns it touches and nothing else.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+FORMAT_VERSION = 2
+EMPTY = -1
+NO_GOAL = 0xFF  # goal of a student without a plan; goal names take 0..254
+
+# entry flags
+PAIR = 1      # one course of a semester pair
+INVALID = 2   # the student's plan has validation errors
+
+# student status
+OK = 0
+FAILED = 1
+
+ENTRY_COLUMNS = {"student": "<i4", "grade": "<u1", "slot": "<u1", "course": "<i4", "flags": "<u1"}
+STUDENT_COLUMNS = {"goal": "<u1", "errors": "<u2", "status": "<u1"}
+TABLES = {"entries": ENTRY_COLUMNS, "students": STUDENT_COLUMNS}
+STRINGS = ("titles", "student_ids")
+
+
+def _read_strings(path: str, count: int) -> List[str]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw.decode("utf-8").split("\x00")[:count] if count else []
+
+
+class CohortWriter:
+    """
+    Appends batch_planner results to a cohort directory, chunk_rows entries at a time.
+    A new writer starts the directory over unless append is set.
+    """
+
+    def __init__(self, path: str, chunk_rows: int = 1 << 16, append: bool = False):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        os.makedirs(path, exist_ok=True)
+        header = self._read_header() if append else None
+        names = (*ENTRY_COLUMNS, *STUDENT_COLUMNS, *STRINGS)
+        if header is None:
+            for name in names:
+                open(self._file(name), "wb").close()
+            header = {"format_version": FORMAT_VERSION, "rows": {"entries": 0, "students": 0},
+                      "titles": 0, "goals": [], "columns": TABLES, "sizes": {name: 0 for name in names}}
+            self._publish(header)
+        else:
+            for name in names:
+                with open(self._file(name), "ab") as f:
+                    f.truncate(header["sizes"][name])
+        self.header = header
+        self._titles: Dict[str, int] = {t: i for i, t in
+                                        enumerate(_read_strings(self._file("titles"), header["titles"]))}
+        self._goals: Dict[str, int] = {g: i for i, g in enumerate(header["goals"])}
+        self._entries: Dict[str, List[int]] = {c: [] for c in ENTRY_COLUMNS}
+        self._students: Dict[str, List[int]] = {c: [] for c in STUDENT_COLUMNS}
+        self._new_titles: List[str] = []
+        self._ids: List[str] = []
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.{'str' if name in STRINGS else 'bin'}")
+
+    def _read_header(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.path, "header.json"), "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return header if header.get("format_version") == FORMAT_VERSION else None
+
+    def _title(self, title: str) -> int:
+        code = self._titles.get(title)
+        if code is None:
+            code = self._titles[title] = len(self._titles)
+            self._new_titles.append(title)
+        return code
+
+    def add(self, result: Dict[str, Any]) -> None:
+        student = self.header["rows"]["students"] + len(self._ids)
+        self._ids.append(str(result.get("student_id", student)))
+        s = self._students
+        if not result.get("ok"):
+            s["goal"].append(NO_GOAL)
+            s["errors"].append(0)
+            s["status"].append(FAILED)
+        else:
+            plan = result["plan"]
+            goal = plan.get("goal", "")
+            g = self._goals.get(goal)
+            if g is None:
+                if len(self._goals) >= NO_GOAL:
+                    raise ValueError(f"more than {NO_GOAL} distinct goals")
+                g = self._goals[goal] = len(self._goals)
+                self.header["goals"].append(goal)
+            errors = len(result.get("validation_errors") or ())
+            s["goal"].append(g)
+            s["errors"].append(min(errors, 0xFFFF))
+            s["status"].append(OK)
+
+            e = self._entries
+            invalid = INVALID if errors else 0
+            for year in plan["plan"]:
+                for k, slot in enumerate(year["courses"]):
+                    members = slot if isinstance(slot, list) else [slot]
+                    flags = invalid | (PAIR if isinstance(slot, list) else 0)
+                    for t in members:
+                        e["student"].append(student)
+                        e["grade"].append(year["grade"])
+                        e["slot"].append(k)
+                        e["course"].append(EMPTY if t is None else self._title(str(t)))
+                        e["flags"].append(flags)
+        if len(self._entries["student"]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Appends the buffered rows to the column files, then publishes the new counts.
+        """
+        if not self._ids:
+            return
+        rows, sizes = self.header["rows"], self.header["sizes"]
+        rows["entries"] += len(self._entries["student"])
+        rows["students"] += len(self._ids)
+        for table, buf in (("entries", self._entries), ("students", self._students)):
+            for name, values in buf.items():
+                raw = np.asarray(values, dtype=TABLES[table][name]).tobytes()
+                with open(self._file(name), "ab") as f:
+                    f.write(raw)
+                sizes[name] += len(raw)
+                values.clear()
+        for name, strings in (("titles", self._new_titles), ("student_ids", self._ids)):
+            raw = "".join(s + "\x00" for s in strings).encode("utf-8")
+            with open(self._file(name), "ab") as f:
+                f.write(raw)
+            sizes[name] += len(raw)
+
+        self.header["titles"] = len(self._titles)
+        self._new_titles, self._ids = [], []
+        self._publish(self.header)
+
+    def _publish(self, header: Dict[str, Any]) -> None:
+        tmp = os.path.join(self.path, "header.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(tmp, os.path.join(self.path, "header.json"))
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "CohortWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CohortColumns:
+    """
+    A cohort directory opened for reading: column(name) is a read-only memory map.
+    Entries are stored student by student, so the student column is sorted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "header.json"), "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        if self.header.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported cohort format: {path}")
+        self.rows: Dict[str, int] = self.header["rows"]
+        self.goals: List[str] = self.header["goals"]
+        self._titles: Optional[List[str]] = None
+        self._student_ids: Optional[List[str]] = None
+        self._codes: Optional[Dict[str, int]] = None
+        self._columns: Dict[str, np.ndarray] = {}
+
+    @property
+    def titles(self) -> List[str]:
+        if self._titles is None:
+            self._titles = _read_strings(os.path.join(self.path, "titles.str"), self.header["titles"])
+        return self._titles
+
+    @property
+    def student_ids(self) -> List[str]:
+        if self._student_ids is None:
+            self._student_ids = _read_strings(os.path.join(self.path, "student_ids.str"), self.rows["students"])
+        return self._student_ids
+
+    def __len__(self) -> int:
+        return self.rows["students"]
+
+    def column(self, name: str) -> np.ndarray:
+        hit = self._columns.get(name)
+        if hit is None:
+            table = "entries" if name in ENTRY_COLUMNS else "students"
+            dtype, n = np.dtype(TABLES[table][name]), self.rows[table]
+            if n == 0:
+                hit = np.zeros(0, dtype=dtype)
+            else:
+                hit = np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=dtype, mode="r", shape=(n,))
+            self._columns[name] = hit
+        return hit
+
+    def course_code(self, title: str) -> Optional[int]:
+        if self._codes is None:
+            self._codes = {t: i for i, t in enumerate(self.titles)}
+        return self._codes.get(title)
+
+    def students_taking(self, title: str, grade: Optional[int] = None) -> np.ndarray:
+        """
+        Sorted student rows with title in their plan (in grade, if given).
+        """
+        code = self.course_code(title)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        hit = self.column("course") == code
+        if grade is not None:
+            hit &= self.column("grade") == grade
+        return np.unique(self.column("student")[hit]).astype(np.int64)
+
+    def course_counts(self, grade: Optional[int] = None) -> Dict[str, int]:
+        """
+        title -> number of entries (seats taken), over all grades or one.
+        """
+        course = self.column("course")
+        if grade is not None:
+            course = course[self.column("grade") == grade]
+        counts = np.bincount(course[course >= 0], minlength=len(self.titles))
+        titles = self.titles
+        return {titles[i]: int(counts[i]) for i in np.flatnonzero(counts).tolist()}
+
+    def plan(self, row: int) -> Optional[Dict[str, Any]]:
+        """
+        The plan of one student row in the skeleton JSON shape (None for a failed
+        student); rationale and next_steps are not stored and come back empty.
+        """
+        if self.column("status")[row] != OK:
+            return None
+        student = self.column("student")
+        lo, hi = np.searchsorted(student, [row, row + 1])
+        grades = self.column("grade")[lo:hi].tolist()
+        slots = self.column("slot")[lo:hi].tolist()
+        courses = self.column("course")[lo:hi].tolist()
+        flags = self.column("flags")[lo:hi].tolist()
+        titles = self.titles
+        years: Dict[int, List[Any]] = {}
+        for g, k, c, f in zip(grades, slots, courses, flags):
+            row_slots = years.setdefault(g, [])
+            while len(row_slots) <= k:
+                row_slots.append(None)
+            t = None if c == EMPTY else titles[c]
+            if f & PAIR:
+                row_slots[k] = (row_slots[k] or []) + [t]
+            else:
+                row_slots[k] = t
+        goal = int(self.column("goal")[row])
+        return {"goal": "" if goal == NO_GOAL else self.goals[goal], "assumptions": [],
+                "plan": [{"grade": g, "courses": s} for g, s in years.items()], "rationale": [], "next_steps": []}
+
+
+def export_results(results: Iterable[Dict[str, Any]], path: str, chunk_rows: int = 1 << 16) -> Dict[str, int]:
+    """
+    Writes batch_planner results (e.g. read back from a results JSONL) to a cohort directory.
+    """
+    with CohortWriter(path, chunk_rows) as w:
+        for r in results:
+            w.add(r)
+    return dict(w.header["rows"])
+
+
+def _read_results(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="cohort_columns", description="Columnar cohort plan files")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export", help="convert a batch_planner results JSONL")
+    e.add_argument("results")
+    e.add_argument("-o", "--out", default=os.path.join("data", "outputs", "cohort_columns"))
+    t = sub.add_parser("taking", help="students whose plan has a course")
+    t.add_argument("path")
+    t.add_argument("title")
+    t.add_argument("--grade", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        rows = export_results(_read_results(args.results), args.out)
+        print(f"Exported {rows['students']} students ({rows['entries']} entries) -> {args.out}")
+    elif args.cmd == "taking":
+        cohort = CohortColumns(args.path)
+        rows = cohort.students_taking(args.title, args.grade)
+        ids = cohort.student_ids
+        where = f" in grade {args.grade}" if args.grade is not None else ""
+        print(f"{len(rows)} of {len(cohort)} students take {args.title}{where}")
+        for i in rows.tolist():
+            print(ids[i])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Course demand for master scheduling: how many planned students take each course
+in each grade.
+
+DemandCounter keeps NumPy count arrays indexed by course id (CourseStore row) and
+grade, one for the whole cohort and one per value of each breakdown (goal,
+starting_math, science_pathway). Its size depends on the catalog and on how many
+values the breakdowns take, never on the cohort size. Each course of a semester
+pair counts as a seat of its own.
+
+batch_planner --demand PATH adds every plan as its result is written, so the
+tables are final as soon as the last plan is. Counters of separate runs (cohort
+shards planned on several machines) are saved as .npz and combined with merge:
+
+    python src/batch_planner.py cohort.jsonl --demand data/outputs/course_demand.csv
+    python src/course_demand.py merge shard1.npz shard2.npz -o data/outputs/course_demand.csv
+
+count builds the tables from an existing results JSONL; its breakdowns other than
+goal need the cohort's input records (--records, same order as the results).
+
+The CSV has one row per (breakdown, value, course) with any demand: seats per
+grade and in total. breakdown "all" is the whole cohort.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from plan_codec import GRADES, codec_for
+
+
+BREAKDOWNS = ("goal", "starting_math", "science_pathway")
+
+
+class DemandCounter:
+    """
+    Seats per course and grade over the plans added so far (see module docstring).
+    Titles outside the catalog are counted by title in extra.
+    """
+
+    def __init__(self, catalog=None, breakdowns: Sequence[str] = BREAKDOWNS, titles: Optional[List[str]] = None):
+        self.titles: List[str] = list(titles) if titles is not None else list(codec_for(catalog).titles)
+        self.ids: Dict[str, int] = {t: i for i, t in enumerate(self.titles)}
+        self.breakdowns: Tuple[str, ...] = tuple(breakdowns)
+        self.total = self._zeros()
+        self.by: Dict[str, Dict[str, np.ndarray]] = {b: {} for b in self.breakdowns}
+        self.extra: Dict[str, np.ndarray] = {}
+        self.plans = 0
+
+    def _zeros(self) -> np.ndarray:
+        return np.zeros((len(self.titles), len(GRADES)), dtype=np.int64)
+
+    def entries(self, plan: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, List[Tuple[str, int]]]:
+        """
+        (course ids, grade columns) of a plan's courses, plus (title, grade column)
+        for titles outside the catalog.
+        """
+        course: List[int] = []
+        grade: List[int] = []
+        extra: List[Tuple[str, int]] = []
+        ids = self.ids
+        for year in plan["plan"]:
+            g = year["grade"] - GRADES[0]
+            if not 0 <= g < len(GRADES):
+                continue
+            for slot in year["courses"]:
+                for t in (slot if isinstance(slot, list) else (slot,)):
+                    if t is None:
+                        continue
+                    i = ids.get(t)
+                    if i is None:
+                        extra.append((str(t), g))
+                    else:
+                        course.append(i)
+                        grade.append(g)
+        return np.asarray(course, dtype=np.int64), np.asarray(grade, dtype=np.int64), extra
+
+    def add(self, plan: Dict[str, Any], settings: Dict[str, Any]) -> None:
+        """
+        Counts one plan; settings (main.read_settings) give its breakdown values.
+        """
+        course, grade, extra = self.entries(plan)
+        np.add.at(self.total, (course, grade), 1)
+        for b in self.breakdowns:
+            value = str(settings.get(b, plan.get(b, "")))
+            counts = self.by[b].get(value)
+            if counts is None:
+                counts = self.by[b][value] = self._zeros()
+            np.add.at(counts, (course, grade), 1)
+        for t, g in extra:
+            counts = self.extra.get(t)
+            if counts is None:
+                counts = self.extra[t] = np.zeros(len(GRADES), dtype=np.int64)
+            counts[g] += 1
+        self.plans += 1
+
+    def merge(self, other: "DemandCounter") -> None:
+        """
+        Adds other's counts. Both must count over the same catalog and breakdowns.
+        """
+        if other.titles != self.titles or other.breakdowns != self.breakdowns:
+            raise ValueError("demand counters of different catalogs or breakdowns")
+        self.total += other.total
+        for b in self.breakdowns:
+            for value, counts in other.by[b].items():
+                mine = self.by[b].get(value)
+                if mine is None:
+                    self.by[b][value] = counts.copy()
+                else:
+                    mine += counts
+        for t, counts in other.extra.items():
+            self.extra[t] = self.extra.get(t, 0) + counts
+        self.plans += other.plans
+
+    def demand(self, title: str, grade: Optional[int] = None, breakdown: Optional[str] = None,
+               value: Optional[str] = None) -> int:
+        """
+        Seats of title (in grade, if given), over all plans or those with breakdown == value.
+        """
+        counts = self.total if breakdown is None else self.by[breakdown].get(str(value))
+        i = self.ids.get(title)
+        if counts is None or i is None:
+            row = self.extra.get(title) if breakdown is None else None
+            if row is None:
+                return 0
+        else:
+            row = counts[i]
+        return int(row.sum() if grade is None else row[grade - GRADES[0]])
+
+    def rows(self) -> List[List[Any]]:
+        """
+        [breakdown, value, title, seats per grade..., total] for every course with demand.
+        """
+        out: List[List[Any]] = []
+        tables = [("all", "", self.total)] + [(b, v, c) for b in self.breakdowns for v, c in sorted(self.by[b].items())]
+        for b, v, counts in tables:
+            for i in np.flatnonzero(counts.any(axis=1)).tolist():
+                row = counts[i].tolist()
+                out.append([b, v, self.titles[i], *row, sum(row)])
+        for t, counts in sorted(self.extra.items()):
+            row = counts.tolist()
+            out.append(["all", "", t, *row, sum(row)])
+        return out
+
+    def write_csv(self, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["breakdown", "value", "course", *(f"grade_{g}" for g in GRADES), "total"])
+            w.writerows(self.rows())
+        return path
+
+    # --- partial aggregates ---------------------------------------------------------
+
+    def save(self, path: str) -> str:
+        """
+        Writes the counter as .npz, for merging with counters from other runs.
+        """
+        arrays = {"total": self.total}
+        meta = {"titles": self.titles, "breakdowns": list(self.breakdowns), "plans": self.plans,
+                "by": {b: sorted(self.by[b]) for b in self.breakdowns}, "extra": sorted(self.extra)}
+        for b in self.breakdowns:
+            for k, v in enumerate(meta["by"][b]):
+                arrays[f"by.{b}.{k}"] = self.by[b][v]
+        if self.extra:
+            arrays["extra"] = np.stack([self.extra[t] for t in meta["extra"]])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "DemandCounter":
+        with np.load(path) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            c = cls(breakdowns=meta["breakdowns"], titles=meta["titles"])
+            c.total = z["total"].astype(np.int64)
+            for b in c.breakdowns:
+                c.by[b] = {v: z[f"by.{b}.{k}"].astype(np.int64) for k, v in enumerate(meta["by"][b])}
+            if meta["extra"]:
+                c.extra = dict(zip(meta["extra"], z["extra"].astype(np.int64)))
+            c.plans = meta["plans"]
+        return c
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="course_demand", description="Course demand tables")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("count", help="demand tables of a batch_planner results JSONL")
+    c.add_argument("results")
+    c.add_argument("--records", default=None, help="the cohort's input records (JSONL or CSV)")
+    c.add_argument("--catalog", default=None)
+    c.add_argument("-o", "--out", default=os.path.join("data", "outputs", "course_demand.csv"),
+                   help=".csv table, or .npz to merge later")
+    m = sub.add_parser("merge", help="combine saved demand counters (.npz) into one table")
+    m.add_argument("partials", nargs="+")
+    m.add_argument("-o", "--out", default=os.path.join("data", "outputs", "course_demand.csv"),
+                   help=".csv table, or .npz for another merged counter")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "count":
+        # Imported here: batch_planner imports this module for --demand.
+        from batch_planner import read_student_records
+        from catalog_parser import load_catalog
+        from main import CATALOG_PATH, read_settings
+
+        with open(args.results, "r", encoding="utf-8") as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        if args.records:
+            settings = [read_settings(r) for r in read_student_records(args.records)]
+            if len(settings) != len(results):
+                raise SystemExit(f"{args.records}: {len(settings)} records for {len(results)} results")
+            counter = DemandCounter(load_catalog(args.catalog or CATALOG_PATH))
+        else:
+            settings = [{}] * len(results)
+            counter = DemandCounter(load_catalog(args.catalog or CATALOG_PATH), breakdowns=("goal",))
+        for r, s in zip(results, settings):
+            if r.get("ok"):
+                counter.add(r["plan"], s)
+        (counter.save if args.out.endswith(".npz") else counter.write_csv)(args.out)
+        print(f"Counted {counter.plans} plans -> {args.out}")
+    elif args.cmd == "merge":
+        total = DemandCounter.load(args.partials[0])
+        for path in args.partials[1:]:
+            total.merge(DemandCounter.load(path))
+        (total.save if args.out.endswith(".npz") else total.write_csv)(args.out)
+        print(f"Merged {len(args.partials)} counters ({total.plans} plans) -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Resolve free-text completed-course strings ("Spanish 2", "hon geometry") to exact
+catalog titles.
+
+Both sides go through the same normalization table (numerals, honors/AP spellings,
+(P)/(HP)/(sem) markers, whitespace), so matching is a dict lookup for exact names
+and an n-gram index query otherwise. A resolver is built once per loaded catalog
+and caches every distinct input string, which is what makes cohort-sized batches
+cheap: transcripts repeat the same few hundred strings over and over.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from catalog_index import FieldIndex
+from catalog_parser import CatalogCache
+
+
+# Whole-token rewrites applied after lowercasing.
+TOKEN_TABLE: Dict[str, str] = {
+    "1": "i", "2": "ii", "3": "iii", "4": "iv", "5": "v", "6": "vi",
+    "hon": "honors", "hon.": "honors", "honor": "honors", "hnrs": "honors",
+    "a.p.": "ap",
+    "&": "and",
+}
+
+# Phrases rewritten before tokenizing.
+PHRASE_TABLE = [
+    ("advanced placement", "ap"),
+]
+
+# Parenthesized markers that do not tell two courses apart for a transcript.
+DROPPED_MARKERS = frozenset([
+    "(p)", "(hp)", "(xp)", "(xhp)", "(h)", "(sem)", "(r.o.p)", "(pltw)", "(pltw/r.o.p)",
+])
+
+_TOKEN_RE = re.compile(r"\([^)]*\)|[^\s()]+")
+_HYPHEN_RE = re.compile(r"(?<=[a-z])-(?=[a-z])")
+
+
+def normalize_title(text: Any) -> str:
+    """
+    Canonical form of a course name: "Spanish 2 (P)" and "spanish  II" both give "spanish ii".
+    """
+    s = str(text).lower()
+    for phrase, repl in PHRASE_TABLE:
+        if phrase in s:
+            s = s.replace(phrase, repl)
+    out: List[str] = []
+    for tok in _TOKEN_RE.findall(s):
+        if tok.startswith("("):
+            if tok in DROPPED_MARKERS:
+                continue
+        else:
+            tok = _HYPHEN_RE.sub("", tok.strip("-:,;"))
+            if not tok:
+                continue
+        out.append(TOKEN_TABLE.get(tok, tok))
+    return " ".join(out)
+
+
+class CourseResolver:
+    """
+    Normalized-title lookup tables for one catalog, plus a cache of resolved strings.
+
+    A string that is already a catalog title resolves to itself; otherwise to the first
+    title with the same normalized name; failing that, to the last title (catalog order)
+    containing it as a run of whole words; failing that, to the last title containing
+    it as a substring. Unmatched strings are kept as given.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.titles: List[str] = list(catalog.keys())
+        self.normalized: List[str] = [normalize_title(t) for t in self.titles]
+        self._exact: Dict[str, int] = {}
+        for i, n in enumerate(self.normalized):
+            self._exact.setdefault(n, i)
+        self._field = FieldIndex(self.normalized)
+        self._cache: Dict[str, Optional[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def lookup(self, text: Any) -> Optional[str]:
+        """
+        Catalog title for one string, or None; uncached.
+        """
+        if isinstance(text, str) and text in self.catalog:
+            return text  # "X (H)" must not become an "X (P)" that normalizes the same
+        key = normalize_title(text)
+        if not key:
+            return None
+        i = self._exact.get(key)
+        if i is not None:
+            return self.titles[i]
+        positions = self._field.matches(key)
+        if not positions:
+            return None
+        padded = f" {key} "
+        words = [p for p in positions if padded in f" {self.normalized[p]} "]
+        return self.titles[(words or positions)[-1]]
+
+    def resolve_one(self, item: Any) -> Any:
+        key = str(item)
+        if key in self._cache:
+            self.hits += 1
+            title = self._cache[key]
+        else:
+            self.misses += 1
+            title = self._cache[key] = self.lookup(key)
+        return title if title is not None else item
+
+    def resolve(self, completed_raw: Iterable) -> Set:
+        return {self.resolve_one(item) for item in completed_raw}
+
+    def resolve_many(self, completed_lists: Iterable[Iterable]) -> List[Set]:
+        """
+        Resolve a whole cohort's completed-course lists; each distinct string is looked up once.
+        """
+        return [self.resolve(l) for l in completed_lists]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+
+_RESOLVERS = CatalogCache("resolver")
+
+
+def resolver_for(catalog) -> CourseResolver:
+    """
+    The shared CourseResolver of a loaded catalog (built on first use).
+    """
+    r = _RESOLVERS.get(catalog)
+    if r is None:
+        r = _RESOLVERS[catalog] = CourseResolver(catalog)
+    return r
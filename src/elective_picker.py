@@ -1,8 +1,29 @@
-from typing import Dict, List, Set, Optional
-from catalog_parser import Course
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+import instrumentation
+from catalog_parser import CatalogCache, Course
 from utils import contains_any
 
 
+SPANISH_ELECTIVE_KEYWORDS = [["spanish 3"], ["spanish 4"], ["spanish 5"], ["spanish"]]
+
+# Elective keyword groups per goal, highest priority first.
+GOAL_ELECTIVE_KEYWORDS: Dict[str, List[List[str]]] = {
+    "cs": [
+        ["computer science"],
+        ["programming"],
+        ["ap computer"],
+        ["data structures"],
+        ["robotics"],
+        ["engineering"],
+        ["ct", "cte"],  # sometimes appears in notes/sections
+    ],
+}
+_goals_version = 0  # bumped by register_goal_electives; ElectiveTables built earlier are stale
+
+
 def pick_course_by_keywords(
     catalog: Dict[str, Course],
     grade: int,
@@ -12,13 +33,148 @@ def pick_course_by_keywords(
     """
     Return the first course title matching keywords and grade.
     """
+    counter = None
+    if instrumentation.enabled:
+        instrumentation.count("pick_course_by_keywords.calls")
+        counter = "pick_course_by_keywords.titles_examined"
+    index = getattr(catalog, "index", None)
+    if index is not None:
+        return index.first_any(grade, keywords, exclude, counter)
+
+    if counter is not None:
+        instrumentation.count("pick_course_by_keywords.scans")
+    examined = 0
     for title, c in catalog.items():
+        examined += 1
         if title in exclude:
             continue
-        if grade not in c.allowed_grades:
+        if not c.offered_in(grade):
             continue
         if contains_any(title, keywords) or contains_any(c.subject_section, keywords):
+            if counter is not None:
+                instrumentation.count(counter, examined)
             return title
+    if counter is not None:
+        instrumentation.count(counter, examined)
+    return None
+
+
+def register_goal_electives(goal: str, groups: List[List[str]]) -> None:
+    """
+    Elective keyword groups for a goal, highest priority first: a course's relevance
+    is set by the first group whose keywords its title or subject section contains.
+    A new goal only needs this; fill_electives, rank_electives and the optimizer
+    read the registry.
+    """
+    global _goals_version
+    GOAL_ELECTIVE_KEYWORDS[goal] = [list(kw) for kw in groups]
+    _goals_version += 1  # every catalog's ElectiveTable is rebuilt on next use
+
+
+class ElectiveTable:
+    """
+    Keyword-group matches of every course, computed once per catalog. For a list of
+    groups, first_group gives each course's best (lowest) group, and lists gives per
+    grade the courses matching each group in catalog order, so filling a year walks
+    precomputed lists instead of querying per keyword group.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.goals_version = _goals_version
+        store = getattr(catalog, "store", None)
+        self.titles: List[str] = store.titles if store is not None else list(catalog)
+        if store is not None:
+            self.grade_masks = np.asarray(store.grade_masks, dtype=np.uint16)
+        else:
+            self.grade_masks = np.fromiter(
+                (sum(1 << g for g in range(16) if catalog[t].offered_in(g)) for t in self.titles),
+                dtype=np.uint16, count=len(self.titles))
+        self._matches: Dict[Tuple[str, ...], np.ndarray] = {}
+        self._lists: Dict[Tuple[int, Tuple[str, ...]], List[int]] = {}
+        self._relevance: Dict[str, Dict[str, float]] = {}
+
+    def matches(self, keywords: Sequence[str]) -> np.ndarray:
+        """
+        Bool per course: title or subject section contains any of keywords (offered or not).
+        """
+        key = tuple(keywords)
+        hit = self._matches.get(key)
+        if hit is None:
+            index = getattr(self.catalog, "index", None)
+            if index is not None:
+                hit = np.zeros(len(self.titles), dtype=bool)
+                for k in key:
+                    hit[index.title.matches(k)] = True
+                    hit[index.section.matches(k)] = True
+            else:
+                catalog = self.catalog
+                hit = np.fromiter((contains_any(t, key) or contains_any(catalog[t].subject_section, key)
+                                   for t in self.titles), dtype=bool, count=len(self.titles))
+            self._matches[key] = hit
+        return hit
+
+    def first_group(self, groups: Sequence[Sequence[str]]) -> np.ndarray:
+        """
+        Per course, the index of the first group it matches (len(groups) if none).
+        """
+        first = np.full(len(self.titles), len(groups), dtype=np.int32)
+        for i in range(len(groups) - 1, -1, -1):
+            first[self.matches(groups[i])] = i
+        return first
+
+    def lists(self, grade: int, groups: Sequence[Sequence[str]]) -> List[List[int]]:
+        """
+        Per group, the course ids offered in grade that match it, in catalog order.
+        """
+        out = []
+        for kw in groups:
+            key = (grade, tuple(kw))
+            hit = self._lists.get(key)
+            if hit is None:
+                offered = (self.grade_masks >> grade) & 1 == 1 if 0 <= grade < 16 else \
+                    np.zeros(len(self.titles), dtype=bool)
+                hit = self._lists[key] = np.flatnonzero(self.matches(kw) & offered).tolist()
+            out.append(hit)
+        return out
+
+    def relevance(self, goal: str) -> Dict[str, float]:
+        """
+        title -> relevance to goal, (n - i) / n for a course whose first matching group
+        is i of n; courses matching none are left out (relevance 0).
+        """
+        hit = self._relevance.get(goal)
+        if hit is None:
+            groups = GOAL_ELECTIVE_KEYWORDS.get(goal, [])
+            first = self.first_group(groups)
+            n = len(groups)
+            hit = self._relevance[goal] = {self.titles[i]: (n - int(first[i])) / n
+                                           for i in np.flatnonzero(first < n).tolist()}
+        return hit
+
+
+_TABLES = CatalogCache("elective_table")
+
+
+def elective_table(catalog) -> ElectiveTable:
+    """
+    The shared ElectiveTable of a loaded catalog (built on first use).
+    """
+    t = _TABLES.get(catalog)
+    if t is None or t.goals_version != _goals_version:
+        t = _TABLES[catalog] = ElectiveTable(catalog)
+    return t
+
+
+def _first_free(ids: List[int], titles: List[str], exclude) -> Optional[str]:
+    # A plan_codec.CourseSet over the same rows tests the ids directly.
+    if getattr(exclude, "titles", None) is titles:
+        i = exclude.first_free(ids)
+        return None if i is None else titles[i]
+    for i in ids:
+        t = titles[i]
+        if t not in exclude:
+            return t
     return None
 
 
@@ -30,43 +186,98 @@ def fill_electives(
     prefer_spanish: bool,
     exclude: Set[str],
 ) -> List[str]:
+    """
+    Up to num_slots electives: Spanish first (tier 1), then goal electives (tier 2),
+    then anything offered in grade (tier 3). Each keyword group of tiers 1 and 2
+    adds its first match not yet excluded or chosen (see ElectiveTable).
+    """
     chosen: List[str] = []
+    skip = exclude | set()  # exclude plus chosen; a copy, so the caller's exclude is left alone
+    table = elective_table(catalog)
+    titles = table.titles
 
-    # Priority 1: Spanish sequence if requested
-    if prefer_spanish and num_slots > 0:
-        for kw in [["spanish 3"], ["spanish 4"], ["spanish 5"], ["spanish"]]:
-            if len(chosen) >= num_slots:
-                break
-            t = pick_course_by_keywords(catalog, grade, kw, exclude | set(chosen))
-            if t:
-                chosen.append(t)
-
-    # Priority 2: CS/CTE electives for CS goal
-    if goal == "cs" and len(chosen) < num_slots:
-        cs_keywords = [
-            ["computer science"],
-            ["programming"],
-            ["ap computer"],
-            ["data structures"],
-            ["robotics"],
-            ["engineering"],
-            ["ct", "cte"],  # sometimes appears in notes/sections
-        ]
-        for kw in cs_keywords:
-            if len(chosen) >= num_slots:
-                break
-            t = pick_course_by_keywords(catalog, grade, kw, exclude | set(chosen))
-            if t:
-                chosen.append(t)
+    n_spanish = len(SPANISH_ELECTIVE_KEYWORDS) if prefer_spanish else 0
+    tier1 = 0
+    for i, ids in enumerate(table.lists(grade, elective_priority_groups(goal, prefer_spanish))):
+        if len(chosen) >= num_slots:
+            break
+        t = _first_free(ids, titles, skip)
+        if t:
+            chosen.append(t)
+            skip.add(t)
+            tier1 += i < n_spanish
+    if instrumentation.enabled:
+        instrumentation.count("electives.tier1", tier1)
+        instrumentation.count("electives.tier2", len(chosen) - tier1)
 
     # Fill remaining with anything offered in grade (last resort)
-    for title, c in catalog.items():
+    before = len(chosen)
+    index = getattr(catalog, "index", None)
+    offered = index.iter_grade(grade) if index is not None else \
+        (title for title, c in catalog.items() if c.offered_in(grade))
+    for title in offered:
         if len(chosen) >= num_slots:
             break
-        if title in exclude or title in chosen:
-            continue
-        if grade not in c.allowed_grades:
+        if title in skip:
             continue
         chosen.append(title)
+        skip.add(title)
+    if instrumentation.enabled:
+        instrumentation.count("electives.slots", num_slots)
+        instrumentation.count("electives.tier3", len(chosen) - before)
+        instrumentation.count("electives.miss", num_slots - len(chosen))
 
     return chosen
+
+
+def elective_priority_groups(goal: str, prefer_spanish: bool) -> List[List[str]]:
+    """
+    The keyword groups fill_electives tries, highest priority first.
+    """
+    groups: List[List[str]] = []
+    if prefer_spanish:
+        groups += SPANISH_ELECTIVE_KEYWORDS
+    groups += GOAL_ELECTIVE_KEYWORDS.get(goal, [])
+    return groups
+
+
+def rank_electives(
+    catalog: Dict[str, Course],
+    grade: int,
+    goal: str,
+    prefer_spanish: bool,
+    exclude: Set[str],
+    limit: Optional[int] = None,
+) -> List[str]:
+    """
+    Elective candidates for grade, best first. Round k takes the k-th remaining match
+    of every priority group in turn (round 1 is exactly what fill_electives picks
+    from them); anything else offered in grade comes last.
+    """
+    ranked: List[str] = []
+    taken: Set[str] = set()  # exclude may be a prerequisites.PrereqGate: only test membership
+    table = elective_table(catalog)
+    titles = table.titles
+    groups = [iter(ids) for ids in table.lists(grade, elective_priority_groups(goal, prefer_spanish))]
+    while groups and (limit is None or len(ranked) < limit):
+        alive = []
+        for it in groups:
+            for i in it:
+                t = titles[i]
+                if t not in taken and t not in exclude:
+                    taken.add(t)
+                    ranked.append(t)
+                    alive.append(it)
+                    break
+        groups = alive
+
+    index = getattr(catalog, "index", None)
+    offered = index.iter_grade(grade) if index is not None else \
+        (title for title, c in catalog.items() if c.offered_in(grade))
+    for t in offered:
+        if limit is not None and len(ranked) >= limit:
+            break
+        if t not in taken and t not in exclude:
+            taken.add(t)
+            ranked.append(t)
+    return ranked[:limit] if limit is not None else ranked
@@ -1,5 +1,8 @@
 import json
 import os
+from typing import Iterable, List, Set
+
+from course_resolver import resolver_for
 
 def load_inputs(path="data/inputs.json") -> dict:
     if os.path.exists(path):
@@ -11,27 +14,13 @@ def resolve_completed_courses(catalog, completed_raw):
     """
     Map user-provided completed course strings to exact catalog titles when possible.
     Example: "Spanish 2" -> "Spanish II (P)" (exact name from CSV)
+    Strings with no match are kept as given (see course_resolver).
     """
-    resolved = set()
-
-    for item in completed_raw:
-        s = str(item).strip().lower()
-
-        # normalize common patterns
-        s = s.replace("spanish 1", "spanish i")
-        s = s.replace("spanish 2", "spanish ii")
-        s = s.replace("spanish 3", "spanish iii")
-        s = s.replace("spanish 4", "spanish iv")
+    return resolver_for(catalog).resolve(completed_raw)
 
-        best = None
-        for title in catalog.keys():
-            t = title.lower()
-            if s == t:
-                best = title
-                break
-            if s in t:
-                best = title
 
-        resolved.add(best if best else item)
-
-    return resolved
+def resolve_cohort_completed_courses(catalog, completed_lists: Iterable[Iterable]) -> List[Set]:
+    """
+    resolve_completed_courses for many students at once; repeated strings are resolved once.
+    """
+    return resolver_for(catalog).resolve_many(completed_lists)
@@ -1,4 +1,4 @@
-from math_pathway import find_course_by_keywords
+from math_pathway import find_course_by_chain
 
 def detect_spanish_next_level(completed_courses):
     text = " | ".join([str(c).lower() for c in completed_courses])
@@ -14,24 +14,22 @@ def detect_spanish_next_level(completed_courses):
         return "ii"
     return "i"
 
+# Fallback keyword chains per Spanish level (from detect_spanish_next_level).
+SPANISH_LEVEL_KEYWORDS = {
+    "i": [["spanish", "i"], ["spanish", "1"]],
+    "ii": [["spanish", "ii"], ["spanish", "2"]],
+    "iii": [["spanish", "iii"], ["spanish", "3"]],
+    "iv": [["spanish", "iv"], ["spanish", "4"]],
+    "ap": [["ap", "spanish"]],
+}
+
+
 def pick_spanish_for_grade(catalog, grade, completed_courses, exclude):
     nxt = detect_spanish_next_level(completed_courses)
     if not nxt:
         return None
 
-    if nxt == "iii":
-        return (find_course_by_keywords(catalog, grade, ["spanish", "iii"], exclude) or
-                find_course_by_keywords(catalog, grade, ["spanish", "3"], exclude))
-    if nxt == "iv":
-        return (find_course_by_keywords(catalog, grade, ["spanish", "iv"], exclude) or
-                find_course_by_keywords(catalog, grade, ["spanish", "4"], exclude))
-    if nxt == "ii":
-        return (find_course_by_keywords(catalog, grade, ["spanish", "ii"], exclude) or
-                find_course_by_keywords(catalog, grade, ["spanish", "2"], exclude))
-    if nxt == "i":
-        return (find_course_by_keywords(catalog, grade, ["spanish", "i"], exclude) or
-                find_course_by_keywords(catalog, grade, ["spanish", "1"], exclude))
-    if nxt == "ap":
-        return find_course_by_keywords(catalog, grade, ["ap", "spanish"], exclude)
-
-    return None
+    table = getattr(catalog, "pathways", None)
+    if table is not None:
+        return table.first(catalog, "spanish", nxt, grade, exclude)
+    return find_course_by_chain(catalog, grade, SPANISH_LEVEL_KEYWORDS.get(nxt, []), exclude)
@@ -1,17 +1,24 @@
 import json
 import os
-from typing import Set
 
+import instrumentation
+from instrumentation import stage
 from catalog_parser import load_catalog
 from skeleton_builder import build_empty_plan
 from elective_picker import fill_electives
-from validator import validate_plan_offered_by_grade
-from rules_pusd import PREFERRED_TITLES
+from validator import validate_plan_offered_by_grade, validate_plan_prerequisites
+from rules_pusd import preferred_titles
 
 from inputs_loader import load_inputs, resolve_completed_courses
-from math_pathway import pick_math_for_grade
+from math_pathway import MATH_TRACK, find_course_by_keywords, pick_math_for_grade
+from catalog_reload import cache_version, plan_is_current
+from plan_cache import cached_plan, plan_fingerprint
+from plan_optimizer import optimize_plan
 from science_pathway import pick_science_for_grade
 from language_pathway import pick_spanish_for_grade
+from prerequisites import graph_for
+from ag_audit import AgCounter
+from plan_codec import CourseSet, codec_for
 
 def load_inputs(path="data/inputs.json") -> dict:
     if os.path.exists(path):
@@ -19,156 +26,266 @@ def load_inputs(path="data/inputs.json") -> dict:
             return json.load(f)
     return {}
 
+def _iter_courses_with_keywords(catalog, grade, keywords):
+    index = getattr(catalog, "index", None)
+    if index is not None:
+        return index.iter_all(grade, keywords)
+    return (t for t, c in catalog.items() if c.offered_in(grade) and all(k in t.lower() for k in keywords))
+
+
 def choose_preferred(title_candidates, catalog, grade, exclude):
     for t in title_candidates:
-        if t in catalog and grade in catalog[t].allowed_grades and t not in exclude:
+        if t in catalog and catalog[t].offered_in(grade) and t not in exclude:
             return t
     return None
 
 
 def choose_semester_pair(pair_candidates, catalog, grade, exclude):
     for a, b in pair_candidates:
-        if a in catalog and b in catalog and grade in catalog[a].allowed_grades and grade in catalog[b].allowed_grades:
+        if a in catalog and b in catalog and catalog[a].offered_in(grade) and catalog[b].offered_in(grade):
             if a not in exclude and b not in exclude:
                 return [a, b]
     return None
 
 
-def fill_core_slots(plan, catalog, starting_math, science_pathway, completed_courses, prefer_spanish=False):
+def fill_core_slots(plan, catalog, starting_math, science_pathway, completed_courses, prefer_spanish=False,
+                    with_electives=True, audit=None):
     """
     Fill core slots using preferred Foothill titles when possible.
-    Keeps 6 slots per grade.
+    Keeps 6 slots per grade. With with_electives=False the remaining slots stay None
+    (for section_allocator to fill across a whole cohort).
+    Math, science, Spanish and electives skip courses whose prerequisites (see
+    prerequisites.py) the completed courses, earlier grades and math placement do not
+    meet, or already meet; a math step not offered until a later grade waits for it
+    (math_pathway.math_steps).
+    audit: an optional ag_audit.AgCounter, updated as each slot is filled.
     """
-    used: Set[str] = set()
+    # taken (completed + used) is a bitset over course ids kept up to date, instead of
+    # rebuilding `used | completed_courses` for every pick; the gates built from it
+    # are bitsets too. used (this plan only) is a handful of titles for the core picks.
+    used = set()
+    taken = CourseSet(codec_for(catalog), completed_courses)
+    picked = []  # this grade's courses, added to the coverage before the next grade
+
+    def take(*titles):
+        for t in titles:
+            used.add(t)
+            taken.add(t)
+        picked.extend(titles)
+
+    preferred = preferred_titles(catalog)
+    prereqs = graph_for(catalog)
+    placed = prereqs.placement("math", MATH_TRACK.get(starting_math, MATH_TRACK["honors_geometry"])[0])
+    covered = prereqs.cover(completed_courses, placed)
 
     for year in plan["plan"]:
         g = year["grade"]
         slots = year["courses"]
         idx = 0
 
+        def put(i, course, slots=slots):
+            if audit is not None:
+                audit.swap(slots[i], course)
+            slots[i] = course
+
+        covered = prereqs.cover(picked, covered)  # before this grade
+        picked.clear()
+
         # English (best-effort: pick first course with "English" in title for that grade)
-        english = None
-        for title, c in catalog.items():
-            if g in c.allowed_grades and "english" in title.lower():
-                english = title
-                break
+        english = find_course_by_keywords(catalog, g, ["english"], ())
         if english:
-            slots[idx] = english; used.add(english); idx += 1
+            put(idx, english); take(english); idx += 1
 
         # --- Math (forced by starting_math progression) ---
         year_index = {9: 0, 10: 1, 11: 2, 12: 3}[g]
 
-        m = pick_math_for_grade(catalog, g, starting_math, year_index, used | completed_courses)
+        m = pick_math_for_grade(catalog, g, starting_math, year_index, prereqs.gate(taken, covered))
         if m:
-            slots[idx] = m; used.add(m); idx += 1
+            put(idx, m); take(m); idx += 1
 
-        sci = pick_science_for_grade(catalog, g, science_pathway, year_index, used | completed_courses)
+        sci = pick_science_for_grade(catalog, g, science_pathway, year_index, prereqs.gate(taken, covered))
         if sci and idx < 6:
-            slots[idx] = sci; used.add(sci); idx += 1
+            put(idx, sci); take(sci); idx += 1
 
         if prefer_spanish:
-            sp = pick_spanish_for_grade(catalog, g, completed_courses, used | completed_courses)
-            if sp:
-                for i in range(6):
-                    if slots[i] is None:
-                        slots[i] = sp
-                        used.add(sp)
-                        break
+            sp = pick_spanish_for_grade(catalog, g, completed_courses,
+                                        prereqs.gate(taken, covered))
+            if sp and idx < 6:
+                put(idx, sp); take(sp); idx += 1
 
         # Grade-specific cores
         if g == 9:
             # Ethnic/Health semester pair preferred
-            pair = choose_semester_pair(PREFERRED_TITLES["g9_ethnic_health_pair"], catalog, g, used)
+            pair = choose_semester_pair(preferred["g9_ethnic_health_pair"], catalog, g, used)
             if pair:
-                slots[idx] = pair; used.update(pair); idx += 1
+                put(idx, pair); take(*pair); idx += 1
 
-            pe = choose_preferred(PREFERRED_TITLES["g9_pe"], catalog, g, used)
+            pe = choose_preferred(preferred["g9_pe"], catalog, g, used)
             if pe:
-                slots[idx] = pe; used.add(pe); idx += 1
+                put(idx, pe); take(pe); idx += 1
 
         elif g == 10:
-            wh = choose_preferred(PREFERRED_TITLES["g10_world"], catalog, g, used)
+            wh = choose_preferred(preferred["g10_world"], catalog, g, used)
             if wh:
-                slots[idx] = wh; used.add(wh); idx += 1
+                put(idx, wh); take(wh); idx += 1
 
             # PE Course 2 (best effort: any course with "PE Course 2" prefix)
             pe2 = None
-            for title, c in catalog.items():
-                if g in c.allowed_grades and title.lower().startswith("pe course 2"):
+            for title in _iter_courses_with_keywords(catalog, g, ["pe course 2"]):
+                if title.lower().startswith("pe course 2"):
                     pe2 = title
                     break
             if pe2:
-                slots[idx] = pe2; used.add(pe2); idx += 1
+                put(idx, pe2); take(pe2); idx += 1
 
         elif g == 11:
-            us = choose_preferred(PREFERRED_TITLES["g11_us"], catalog, g, used)
+            us = choose_preferred(preferred["g11_us"], catalog, g, used)
             if us:
-                slots[idx] = us; used.add(us); idx += 1
+                put(idx, us); take(us); idx += 1
 
         elif g == 12:
-            pair = choose_semester_pair(PREFERRED_TITLES["g12_civics_econ_pair"], catalog, g, used)
+            pair = choose_semester_pair(preferred["g12_civics_econ_pair"], catalog, g, used)
             if pair:
-                slots[idx] = pair; used.update(pair); idx += 1
+                put(idx, pair); take(*pair); idx += 1
 
         # Fill remaining slots as electives deterministically
+        if not with_electives:
+            continue
         remaining = sum(1 for s in slots if s is None)
-        electives = fill_electives(
-            catalog=catalog,
-            grade=g,
-            num_slots=remaining,
-            goal=plan["goal"],
-            prefer_spanish=prefer_spanish,
-            exclude=used | completed_courses,   # ✅ IMPORTANT
-        )
+        with stage("electives"):
+            electives = fill_electives(
+                catalog=catalog,
+                grade=g,
+                num_slots=remaining,
+                goal=plan["goal"],
+                prefer_spanish=prefer_spanish,
+                exclude=prereqs.gate(taken, covered),   # ✅ IMPORTANT
+            )
 
         for i in range(6):
             if slots[i] is None and electives:
                 chosen = electives.pop(0)
-                slots[i] = chosen
-                used.add(chosen)
+                put(i, chosen)
+                take(chosen)
 
     return plan
 
+CATALOG_PATH = "data/foothill_catalog.csv"
+
+
+def read_settings(cfg):
+    """
+    Phase 1 inputs with their defaults applied.
+    """
+    return {
+        "goal": cfg.get("goal", "cs"),
+        "starting_math": cfg.get("starting_math", "honors_geometry"),
+        "science_pathway": cfg.get("science_pathway", "standard_stem"),
+        "prefer_spanish": bool(cfg.get("prefer_spanish", True)),
+        "completed_courses": list(cfg.get("completed_courses", [])),
+        "optimize": bool(cfg.get("optimize", False)),
+        "fill_electives": bool(cfg.get("fill_electives", True)),
+    }
+
+
+def plan_student(cfg, catalog, cache=None, audit=None):
+    """
+    Resolve completed courses, build and fill the plan (greedy, or the branch-and-bound
+    optimizer when the inputs set "optimize": true), validate it.
+    Returns (plan, completed_courses, validation_errors).
+    With a PlanCache, students sharing a fingerprint (same normalized inputs and
+    resolved completed courses, same catalog) are planned only once; after a hot
+    reload a cached plan is reused only if catalog_reload.plan_is_current says so.
+    audit: an optional ag_audit.AgCounter to add the completed courses and the plan to.
+    """
+    settings = read_settings(cfg)
+    with stage("resolve"):
+        completed_courses = resolve_completed_courses(catalog, settings["completed_courses"])
+
+    def compute():
+        counter = AgCounter(catalog) if audit is not None else None
+        if settings["optimize"]:
+            with stage("optimize"):
+                plan = optimize_plan(
+                    catalog, settings["goal"], settings["starting_math"], settings["science_pathway"],
+                    completed_courses, settings["prefer_spanish"],
+                ).plan
+        else:
+            with stage("skeleton"):
+                plan = build_empty_plan(settings["goal"])
+            with stage("core_fill"):
+                plan = fill_core_slots(
+                plan, catalog,
+                starting_math=settings["starting_math"],
+                science_pathway=settings["science_pathway"],
+                completed_courses=completed_courses,
+                prefer_spanish=settings["prefer_spanish"],
+                with_electives=settings["fill_electives"],
+                audit=counter,
+                )
+        with stage("validate"):
+            errors = (validate_plan_offered_by_grade(plan, catalog)
+                      + validate_plan_prerequisites(plan, catalog, completed_courses, settings["starting_math"]))
+        result = {"plan": plan, "errors": errors, "catalog": getattr(catalog, "version", "")}
+        if counter is not None:
+            if settings["optimize"]:
+                counter.add_plan(plan)
+            result["ag_units"] = counter.units
+        return result
+
+    def fresh(hit):
+        # keys outlive hot reloads (catalog_reload); a plan from before one may still hold
+        return plan_is_current(catalog, hit.get("catalog", ""), hit["plan"])
+
+    key = plan_fingerprint(settings, completed_courses, cache_version(catalog)) if cache is not None else ""
+    result, _ = cached_plan(cache, key, compute, fresh)
+    if audit is not None:
+        audit.add_completed(completed_courses)
+        if "ag_units" in result:
+            audit.add_units(result["ag_units"])
+        else:  # cached without an audit
+            audit.add_plan(result["plan"])
+    return result["plan"], completed_courses, result["errors"]
+
+
 def main():
+    # Optional per-stage timings and hot-path counters, e.g. PLANNER_METRICS=data/outputs/metrics.json
+    metrics_path = os.environ.get("PLANNER_METRICS")
+    instrumentation.enable(bool(metrics_path))
+
     # --- Inputs (Phase 1) ---
-    cfg = load_inputs()
-    goal = cfg.get("goal", "cs")
-    starting_math = cfg.get("starting_math", "honors_geometry")
-    science_pathway = cfg.get("science_pathway", "standard_stem")
-    prefer_spanish = bool(cfg.get("prefer_spanish", True))
+    with stage("parse"):
+        cfg = load_inputs()
+        settings = read_settings(cfg)
+    goal = settings["goal"]
 
     # Load catalog before using it
-    catalog = load_catalog("data/foothill_catalog.csv")
+    with stage("load_catalog"):
+        catalog = load_catalog(CATALOG_PATH)
 
-    completed_raw = cfg.get("completed_courses", [])
-    completed_courses = resolve_completed_courses(catalog, completed_raw)
+    audit = AgCounter(catalog)
+    plan, completed_courses, errors = plan_student(cfg, catalog, audit=audit)
 
     print("Inputs:")
     print("  goal =", goal)
-    print("  starting_math =", starting_math)
-    print("  science_pathway =", science_pathway)
-    print("  prefer_spanish =", prefer_spanish)
+    print("  starting_math =", settings["starting_math"])
+    print("  science_pathway =", settings["science_pathway"])
+    print("  prefer_spanish =", settings["prefer_spanish"])
     print("Resolved completed courses:")
     for c in sorted(completed_courses):
         print(" -", c)
 
-    plan = build_empty_plan(goal)
-    plan = fill_core_slots(
-    plan, catalog,
-    starting_math=starting_math,
-    science_pathway=science_pathway,
-    completed_courses=completed_courses,
-    prefer_spanish=prefer_spanish
-    )
-
     # Validate offered-by-grade + existence
-    errors = validate_plan_offered_by_grade(plan, catalog)
     if errors:
         print("\n=== Validation errors ===")
         for e in errors:
             print("-", e)
     else:
-        print("\n✅ Plan passes Phase 1 validation (exists + offered-by-grade).")
+        print("\n✅ Plan passes Phase 1 validation (exists + offered-by-grade + prerequisites).")
+
+    missing = audit.missing()
+    print("A-G years:", " ".join(f"{a} {n:g}" for a, n in audit.years().items()))
+    print("A-G missing:", ", ".join(f"{a} {n:g}" for a, n in missing.items()) if missing else "none")
 
     # Save output
     os.makedirs("data/outputs", exist_ok=True)
@@ -178,6 +295,9 @@ def main():
 
     print("Saved:", out_path)
 
+    if metrics_path:
+        print("Metrics:", instrumentation.write_report(metrics_path))
+
 
 if __name__ == "__main__":
     main()
@@ -1,18 +1,36 @@
 # src/math_pathway.py
+import instrumentation
+
 
 def find_course_by_keywords(catalog, grade, keywords, exclude):
     """
     Find first course title offered in 'grade' whose title contains ALL keywords.
     catalog: dict[title] -> Course
     """
+    counter = None
+    if instrumentation.enabled:
+        instrumentation.count("find_course_by_keywords.calls")
+        counter = "find_course_by_keywords.titles_examined"
+    index = getattr(catalog, "index", None)
+    if index is not None:
+        return index.first_all(grade, keywords, exclude, counter)
+
+    if counter is not None:
+        instrumentation.count("find_course_by_keywords.scans")
+    examined = 0
     for title, c in catalog.items():
+        examined += 1
         if title in exclude:
             continue
-        if grade not in c.allowed_grades:
+        if not c.offered_in(grade):
             continue
         t = title.lower()
         if all(k in t for k in keywords):
+            if counter is not None:
+                instrumentation.count(counter, examined)
             return title
+    if counter is not None:
+        instrumentation.count(counter, examined)
     return None
 
 
@@ -26,54 +44,98 @@ MATH_TRACK = {
 }
 
 
+# Fallback keyword chains per track step: the first chain entry that matches wins.
+# Matchers for typical Foothill naming patterns.
+MATH_STEP_KEYWORDS = {
+    "geometry": [["geometry"], ["honors", "geometry"]],
+    # Some catalogs use "Algebra II", some "Algebra 2", sometimes "Honors Algebra II"
+    "algebra2": [["algebra", "ii"], ["algebra", "2"], ["honors", "algebra", "ii"], ["honors", "algebra", "2"]],
+    # "Pre-Calculus", "Precalculus"
+    "precalc": [["pre", "cal"], ["precal"], ["honors", "pre"]],
+    "calc_ab": [["calculus", "ab"], ["ap", "calculus", "ab"]],
+    "calc_bc": [["calculus", "bc"], ["ap", "calculus", "bc"]],
+    # "AP Statistics" or "Statistics"
+    "ap_stats": [["ap", "statistics"], ["statistics"], ["stats"]],
+}
+
+
+def find_course_by_chain(catalog, grade, chain, exclude):
+    """
+    First match of the first keyword list in chain that matches anything.
+    """
+    for i, keywords in enumerate(chain):
+        t = find_course_by_keywords(catalog, grade, keywords, exclude)
+        if t:
+            if instrumentation.enabled:
+                instrumentation.count("find_course_by_chain.calls")
+                instrumentation.count(f"find_course_by_chain.tier{i + 1}")
+            return t
+    if instrumentation.enabled:
+        instrumentation.count("find_course_by_chain.calls")
+        instrumentation.count("find_course_by_chain.miss")
+    return None
+
+
+def chain_candidates(catalog, grade, chain):
+    """
+    Every title a chain can return for this grade, in the order it would return them:
+    find_course_by_chain(..., exclude) == first title here not in exclude.
+    """
+    index = getattr(catalog, "index", None)
+    out = []
+    seen = set()
+    for keywords in chain:
+        titles = index.iter_all(grade, keywords) if index is not None else (
+            t for t, c in catalog.items() if c.offered_in(grade) and all(k in t.lower() for k in keywords))
+        for t in titles:
+            if t not in seen:
+                seen.add(t)
+                out.append(t)
+    return out
+
+
+GRADES = [9, 10, 11, 12]
+
+
+def _step_offered(catalog, step, grade):
+    table = getattr(catalog, "pathways", None)
+    if table is not None:
+        return bool(table.candidates(catalog, "math", step, grade))
+    return find_course_by_chain(catalog, grade, MATH_STEP_KEYWORDS.get(step, []), ()) is not None
+
+
+def math_steps(catalog, starting_math):
+    """
+    The track step of each grade 9-12, or None for a grade that waits: a step no
+    course offers in this grade but one in a later grade does moves to that grade,
+    and the steps after it move with it (Pre-Calculus first offered in grade 10
+    puts honors_precalc's Calculus AB in grade 11).
+    """
+    track = MATH_TRACK.get(starting_math, MATH_TRACK["honors_geometry"])
+    steps = []
+    pos = 0
+    for i, g in enumerate(GRADES):
+        if pos == len(track):
+            steps.append(None)
+            continue
+        step = track[pos]
+        if not _step_offered(catalog, step, g) and any(_step_offered(catalog, step, h) for h in GRADES[i + 1:]):
+            steps.append(None)
+            continue
+        steps.append(step)
+        pos += 1
+    return steps
+
+
 def pick_math_for_grade(catalog, grade, starting_math, year_index, exclude):
     """
     Returns an exact Foothill course title from catalog matching the desired step.
     year_index: 0 for grade 9, 1 for grade 10, 2 for grade 11, 3 for grade 12
     """
-    track = MATH_TRACK.get(starting_math, MATH_TRACK["honors_geometry"])
-    desired = track[year_index]
-
-    # --- Matchers for typical Foothill naming patterns ---
-    if desired == "geometry":
-        return find_course_by_keywords(catalog, grade, ["geometry"], exclude) or \
-               find_course_by_keywords(catalog, grade, ["honors", "geometry"], exclude)
-
-    if desired == "algebra2":
-        # Some catalogs use "Algebra II", some "Algebra 2", sometimes "Honors Algebra II"
-        return (
-            find_course_by_keywords(catalog, grade, ["algebra", "ii"], exclude) or
-            find_course_by_keywords(catalog, grade, ["algebra", "2"], exclude) or
-            find_course_by_keywords(catalog, grade, ["honors", "algebra", "ii"], exclude) or
-            find_course_by_keywords(catalog, grade, ["honors", "algebra", "2"], exclude)
-        )
-
-    if desired == "precalc":
-        # "Pre-Calculus", "Precalculus"
-        return (
-            find_course_by_keywords(catalog, grade, ["pre", "cal"], exclude) or
-            find_course_by_keywords(catalog, grade, ["precal"], exclude) or
-            find_course_by_keywords(catalog, grade, ["honors", "pre"], exclude)
-        )
-
-    if desired == "calc_ab":
-        return (
-            find_course_by_keywords(catalog, grade, ["calculus", "ab"], exclude) or
-            find_course_by_keywords(catalog, grade, ["ap", "calculus", "ab"], exclude)
-        )
-
-    if desired == "calc_bc":
-        return (
-            find_course_by_keywords(catalog, grade, ["calculus", "bc"], exclude) or
-            find_course_by_keywords(catalog, grade, ["ap", "calculus", "bc"], exclude)
-        )
-
-    if desired == "ap_stats":
-        # "AP Statistics" or "Statistics"
-        return (
-            find_course_by_keywords(catalog, grade, ["ap", "statistics"], exclude) or
-            find_course_by_keywords(catalog, grade, ["statistics"], exclude) or
-            find_course_by_keywords(catalog, grade, ["stats"], exclude)
-        )
-
-    return None
+    desired = math_steps(catalog, starting_math)[year_index]
+    if desired is None:
+        return None
+    table = getattr(catalog, "pathways", None)
+    if table is not None:
+        return table.first(catalog, "math", desired, grade, exclude)
+    return find_course_by_chain(catalog, grade, MATH_STEP_KEYWORDS.get(desired, []), exclude)
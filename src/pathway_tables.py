@@ -0,0 +1,124 @@
+"""
+Per-catalog pathway resolution tables.
+
+Every math track step, science track step and Spanish level resolves, for a given
+grade, to the same ordered list of candidate titles (chain_candidates over its
+fallback keyword chain). PathwayTable holds those lists for every step and grade
+9-12, so a picker only returns the first candidate not in exclude.
+
+The table is built once per loaded catalog (or read from its snapshot) and tagged
+with tracks_digest(), so a snapshot written before the track definitions changed
+is ignored and the table rebuilt.
+"""
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import instrumentation
+from language_pathway import SPANISH_LEVEL_KEYWORDS
+from math_pathway import MATH_STEP_KEYWORDS, MATH_TRACK, chain_candidates
+from science_pathway import SCI_STEP_KEYWORDS, SCI_TRACK, _AP_SCIENCE
+
+GRADES = [9, 10, 11, 12]
+KINDS = ("math", "science", "spanish")
+
+_Key = Tuple[str, str, int]
+
+
+# kind -> (step keyword chains, chain for an unknown step, track definitions)
+_DEFINITIONS = {
+    "math": (MATH_STEP_KEYWORDS, [], MATH_TRACK),
+    "science": (SCI_STEP_KEYWORDS, _AP_SCIENCE, SCI_TRACK),
+    "spanish": (SPANISH_LEVEL_KEYWORDS, [], None),
+}
+
+
+def step_chain(kind: str, step: str) -> List[List[str]]:
+    """
+    The fallback keyword chain the picker of this kind uses for step.
+    """
+    keywords, default, _ = _DEFINITIONS[kind]
+    return keywords.get(step, default)
+
+
+def tracks_digest() -> str:
+    """
+    Fingerprint of the track and keyword definitions the table is derived from.
+    """
+    raw = json.dumps({kind: [kw, default, track] for kind, (kw, default, track) in _DEFINITIONS.items()},
+                     sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _steps(kind: str) -> List[str]:
+    keywords, _, track = _DEFINITIONS[kind]
+    steps = list(keywords)
+    for seq in (track or {}).values():
+        steps.extend(s for s in seq if s not in steps and s != "none")
+    return steps
+
+
+class PathwayTable:
+    """
+    (kind, step, grade) -> ordered candidate titles, for one catalog.
+    """
+
+    def __init__(self, lists: Dict[_Key, List[str]], digest: str):
+        self.lists = lists
+        self.digest = digest
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def candidates(self, catalog, kind: str, step: str, grade: int) -> List[str]:
+        key = (kind, step, grade)
+        hit = self.lists.get(key)
+        if hit is None:  # a grade outside 9-12: resolve it once and keep it
+            hit = self.lists[key] = chain_candidates(catalog, grade, step_chain(kind, step))
+        return hit
+
+    def first(self, catalog, kind: str, step: str, grade: int, exclude) -> Optional[str]:
+        for i, t in enumerate(self.candidates(catalog, kind, step, grade)):
+            if t not in exclude:
+                if instrumentation.enabled:
+                    instrumentation.count("pathway_table.titles_examined", i + 1)
+                    instrumentation.record_pick(f"pick_{kind}", t, step_chain(kind, step))
+                return t
+        if instrumentation.enabled:
+            instrumentation.record_pick(f"pick_{kind}", None, step_chain(kind, step))
+        return None
+
+    # --- snapshot encoding -------------------------------------------------------
+
+    def to_postings(self, titles: Iterable[str]) -> Dict[str, List[int]]:
+        pos = {t: i for i, t in enumerate(titles)}
+        return {f"{kind}/{step}/{grade}": [pos[t] for t in lst] for (kind, step, grade), lst in self.lists.items()}
+
+    @classmethod
+    def from_postings(cls, postings, titles: List[str], digest: str) -> "PathwayTable":
+        lists: Dict[_Key, List[str]] = {}
+        for key in postings:
+            kind, rest = key.split("/", 1)
+            step, grade = rest.rsplit("/", 1)
+            lists[(kind, step, int(grade))] = [titles[p] for p in postings[key]]
+        return cls(lists, digest)
+
+
+def build_pathway_table(catalog) -> PathwayTable:
+    lists: Dict[_Key, List[str]] = {}
+    for kind in KINDS:
+        for step in _steps(kind):
+            chain = step_chain(kind, step)
+            for g in GRADES:
+                lists[(kind, step, g)] = chain_candidates(catalog, g, chain)
+    return PathwayTable(lists, tracks_digest())
+
+
+def step_candidates(catalog, kind: str, step: str, grade: int) -> List[str]:
+    """
+    Ordered candidate titles for step in grade (the catalog's table, if it has one).
+    """
+    table = getattr(catalog, "pathways", None)
+    if table is not None:
+        return table.candidates(catalog, kind, step, grade)
+    return chain_candidates(catalog, grade, step_chain(kind, step))
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from elective_picker import GOAL_ELECTIVE_KEYWORDS
+from pathway_tables import tracks_digest
+from rules_pusd import CORE_SLOTS, PREFERRED_FOR_SLOT, PREFERRED_TITLES
+
+
+# Bump whenever a change to the planning code changes the plans it makes: the
+# on-disk store outlives processes and must not serve plans of older code.
+PLANNER_VERSION = 3
+
+_STATIC_RULES: Optional[str] = None
+
+
+def rules_digest() -> str:
+    """
+    Fingerprint of the planning logic besides the catalog: PLANNER_VERSION, the
+    track definitions (pathway_tables.tracks_digest), the default rules_pusd slots
+    and titles, and the elective goal keywords (which register_goal_electives can
+    change at runtime, so they are read on every call).
+    """
+    global _STATIC_RULES
+    if _STATIC_RULES is None:
+        _STATIC_RULES = json.dumps([
+            PLANNER_VERSION,
+            tracks_digest(),
+            {g: [[r.slot_name, r.keywords, r.required] for r in rules] for g, rules in CORE_SLOTS.items()},
+            PREFERRED_TITLES,
+            sorted([g, slot, t] for (g, slot), t in PREFERRED_FOR_SLOT.items()),
+        ], sort_keys=True, separators=(",", ":"))
+    raw = _STATIC_RULES + json.dumps(GOAL_ELECTIVE_KEYWORDS, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def plan_fingerprint(settings: Dict[str, Any], completed_courses: Iterable, catalog_version: str) -> str:
+    """
+    Canonical key of everything fill_core_slots depends on: the normalized inputs,
+    the *resolved* completed courses, the catalog version and the planning rules
+    (rules_digest).
+    """
+    canonical = {
+        "goal": settings["goal"],
+        "starting_math": settings["starting_math"],
+        "science_pathway": settings["science_pathway"],
+        "prefer_spanish": bool(settings["prefer_spanish"]),
+        "optimize": bool(settings.get("optimize", False)),
+        "completed_courses": sorted(str(c) for c in completed_courses),
+        "catalog": catalog_version,
+        "rules": rules_digest(),
+    }
+    if not settings.get("fill_electives", True):
+        canonical["fill_electives"] = False  # only when set, so existing keys stay valid
+    raw = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PlanCache:
+    """
+    LRU of finished plans keyed by plan_fingerprint, with an optional on-disk store
+    (one small JSON file per key) shared by every process pointed at the same directory.
+
+    Entries are kept JSON-encoded, so every hit hands out a fresh copy.
+    """
+
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def _remember(self, key: str, raw: str) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = raw
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, fresh: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """
+        fresh: called on a found value; returning False drops the entry and counts a miss.
+        """
+        raw = self._entries.get(key)
+        if raw is not None:
+            self._entries.move_to_end(key)
+        elif self.path:
+            # another worker may remove or replace the file at any time; a vanished file is a miss
+            try:
+                with open(self._file(key), "r", encoding="utf-8") as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                raw = None
+            else:
+                self._remember(key, raw)
+
+        if raw is None:
+            self.misses += 1
+            return None
+        value = json.loads(raw)
+        if fresh is not None and not fresh(value):
+            self.invalidate(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, separators=(",", ":"))
+        self._remember(key, raw)
+        if self.path:
+            out = self._file(key)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            tmp = f"{out}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(raw)
+            os.replace(tmp, out)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self.path:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def cached_plan(cache: Optional[PlanCache], key: str, compute,
+                fresh: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+    """
+    Returns (value, was_cached); compute() runs only on a miss (or a stale hit, see PlanCache.get).
+    """
+    if cache is not None:
+        hit = cache.get(key, fresh)
+        if hit is not None:
+            return hit, True
+    value = compute()
+    if cache is not None:
+        cache.put(key, value)
+    return value, False
@@ -0,0 +1,369 @@
+"""
+Compact plan encoding over a catalog's course ids (CourseStore rows).
+
+- CourseSet: a used / exclude set held as a bitset (bit i = course id i), so
+  `used | completed` in fill_core_slots is a word-level OR instead of a set
+  rebuild. Titles outside the catalog (unresolved completed courses) sit in a
+  small side set. Pickers only need `in`, `|`, `add` and iteration. A
+  prerequisite gate over a CourseSet is a CourseSet too, carrying the courses the
+  coverage rules out as words built once per coverage, so a candidate costs one
+  word test instead of a set lookup plus a check against its component's masks.
+  CatalogIndex and the elective lists test their candidate rows against one
+  directly (first_free), with the blocked courses filtered out of each list once.
+- PlanArray: many plans as an (n, 4, 6) int32 array of slot codes. A code >= 0
+  is a course id, EMPTY (validator.EMPTY_SLOT) an empty slot, and codes below
+  EMPTY index a small table of the other slot values (semester pairs, titles
+  outside the catalog), which a cohort shares. 96 bytes per plan, so 50,000
+  plans take under 5 MB.
+
+JSON plans (skeleton_builder's shape) are converted at the edges: from_plans
+when plans are read, plan / to_plans when they are written.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog_parser import CatalogCache
+from validator import EMPTY_SLOT, PlanBatch, UNKNOWN_COURSE
+
+
+GRADES = (9, 10, 11, 12)
+SLOTS_PER_YEAR = 6
+EMPTY = EMPTY_SLOT
+MAX_BLOCKED = 4096     # cached coverages per codec
+MAX_UNBLOCKED = 65536  # cached (candidate list, coverage) filters per codec
+_NO_WORDS: Dict[int, int] = {}
+
+
+class CourseCodec:
+    """
+    title <-> course id for one catalog.
+    """
+
+    def __init__(self, catalog):
+        store = getattr(catalog, "store", None)
+        # the store's own list, so CatalogIndex (same rows) can test its positions as ids
+        self.titles: List[str] = store.titles if store is not None else list(catalog)
+        self.ids: Dict[str, int] = {t: i for i, t in enumerate(self.titles)}
+        self.catalog = catalog
+        self._blocked: Dict[tuple, Dict[int, int]] = {}           # coverage signature -> words
+        self._parts: Dict[Tuple[int, int], Dict[int, int]] = {}   # (component, mask) -> words
+        self._unblocked: Dict[Tuple[int, int], tuple] = {}         # see unblocked
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def blocked(self, graph, covered) -> Dict[int, int]:
+        """
+        Words of the courses graph.allows rejects for covered. Few coverages occur in
+        a cohort, so each is built once, from per-component parts also built once.
+        """
+        key = graph.signature(covered)
+        hit = self._blocked.get(key)
+        if hit is None:
+            if len(self._blocked) >= MAX_BLOCKED:
+                self._blocked.clear()
+                self._parts.clear()
+            hit = self._blocked[key] = {}
+            for c in range(len(graph.members)):
+                for k, v in self._part(graph, c, covered.get(c, 0)).items():
+                    hit[k] = hit.get(k, 0) | v
+        return hit
+
+    def _part(self, graph, comp: int, have: int) -> Dict[int, int]:
+        key = (comp, have)
+        hit = self._parts.get(key)
+        if hit is None:
+            hit = self._parts[key] = {}
+            covered, ids = {comp: have}, self.ids
+            for n in graph.members[comp]:
+                t = graph.titles[n]
+                i = ids.get(t)
+                if i is not None and not graph.allows(t, covered):
+                    hit[i >> 6] = hit.get(i >> 6, 0) | 1 << (i & 63)
+        return hit
+
+    def unblocked(self, ids: List[int], blocked: Dict[int, int]) -> List[int]:
+        """
+        ids without the courses set in blocked (words from blocked()). Both are
+        long-lived (an index or elective-table list, a cached coverage), so each pair
+        is filtered once and a pick only skips the student's own courses.
+        """
+        key = (id(ids), id(blocked))
+        hit = self._unblocked.get(key)
+        if hit is None or hit[0] is not ids or hit[1] is not blocked:
+            if len(self._unblocked) >= MAX_UNBLOCKED:
+                self._unblocked.clear()
+            out = [i for i in ids if not blocked.get(i >> 6, 0) >> (i & 63) & 1]
+            hit = self._unblocked[key] = (ids, blocked, out)
+        return hit[2]
+
+
+_CODECS = CatalogCache("codec")
+
+
+def codec_for(catalog) -> CourseCodec:
+    """
+    The shared CourseCodec of a loaded catalog (built on first use).
+    """
+    c = _CODECS.get(catalog)
+    if c is None:
+        c = _CODECS[catalog] = CourseCodec(catalog)
+    return c
+
+
+class CourseSet:
+    """
+    Set of titles as a bitset over a codec's course ids, stored sparsely as
+    {word index: 64-bit word}: a membership test is one word lookup whatever the
+    catalog size, and a union ORs the few non-zero words of each side.
+    fixed holds words shared with other sets and never modified (a gate's
+    prerequisite-blocked courses), so making a gate does not merge them.
+    """
+
+    __slots__ = ("codec", "ids", "titles", "words", "fixed", "other")
+
+    def __init__(self, codec: CourseCodec, titles: Iterable = ()):
+        self.codec = codec
+        self.ids = codec.ids
+        self.titles = codec.titles
+        self.words: Dict[int, int] = {}
+        self.fixed: Dict[int, int] = _NO_WORDS
+        self.other: frozenset = frozenset()
+        if titles:
+            self.update(titles)
+
+    def __contains__(self, title) -> bool:
+        i = self.ids.get(title)
+        if i is None:
+            return title in self.other
+        k = i >> 6
+        return (self.words.get(k, 0) | self.fixed.get(k, 0)) >> (i & 63) & 1 == 1
+
+    def add(self, title) -> None:
+        i = self.ids.get(title)
+        if i is None:
+            self.other = self.other | {title}
+        else:
+            w = self.words
+            w[i >> 6] = w.get(i >> 6, 0) | 1 << (i & 63)
+
+    def update(self, titles: Iterable) -> None:
+        w = self.words
+        if isinstance(titles, CourseSet):
+            for k, v in titles.words.items():
+                w[k] = w.get(k, 0) | v
+            if titles.fixed is not self.fixed:
+                for k, v in titles.fixed.items():
+                    w[k] = w.get(k, 0) | v
+            self.other = self.other | titles.other
+            return
+        ids = self.ids
+        extra = []
+        for t in titles:
+            i = ids.get(t)
+            if i is None:
+                extra.append(t)
+            else:
+                w[i >> 6] = w.get(i >> 6, 0) | 1 << (i & 63)
+        if extra:
+            self.other = self.other | frozenset(extra)
+
+    def copy(self) -> "CourseSet":
+        out = CourseSet.__new__(CourseSet)
+        out.codec, out.ids, out.titles = self.codec, self.ids, self.titles
+        out.words, out.fixed, out.other = dict(self.words), self.fixed, self.other
+        return out
+
+    def gated(self, graph, covered) -> "CourseSet":
+        """
+        This set plus every course graph rules out for covered (PrereqGraph.gate).
+        """
+        out = self.copy()
+        if self.fixed:
+            out.words = self._all_words()  # a gate of a gate keeps the outer blocked courses
+        out.fixed = self.codec.blocked(graph, covered)
+        return out
+
+    def __or__(self, other) -> "CourseSet":
+        if isinstance(other, CourseSet) and len(other.words) > len(self.words):
+            out = other.copy()
+            out.update(self)
+        else:
+            out = self.copy()
+            out.update(other)
+        return out
+
+    __ror__ = __or__
+
+    def first_free(self, ids: List[int]) -> Optional[int]:
+        """
+        The first course id of ids not in the set, or None. ids should be a long-lived
+        list (see CourseCodec.unblocked).
+        """
+        if self.fixed:
+            ids = self.codec.unblocked(ids, self.fixed)
+        w = self.words
+        for i in ids:
+            if not w.get(i >> 6, 0) >> (i & 63) & 1:
+                return i
+        return None
+
+    def _all_words(self) -> Dict[int, int]:
+        if not self.fixed:
+            return self.words
+        w = dict(self.fixed)
+        for k, v in self.words.items():
+            w[k] = w.get(k, 0) | v
+        return w
+
+    def __iter__(self) -> Iterator[str]:
+        titles = self.titles
+        for k, bits in self._all_words().items():
+            while bits:
+                low = bits & -bits
+                yield titles[(k << 6) + low.bit_length() - 1]
+                bits ^= low
+        yield from self.other
+
+    def __len__(self) -> int:
+        return sum(v.bit_count() for v in self._all_words().values()) + len(self.other)
+
+    def __repr__(self) -> str:
+        return f"CourseSet({sorted(self)!r})"
+
+
+class PlanArray:
+    """
+    Fixed-shape integer plans (see module docstring). goal and assumptions are
+    kept per plan; a plan's other JSON keys are rebuilt empty.
+    """
+
+    def __init__(self, codec: CourseCodec, capacity: int = 0):
+        self.codec = codec
+        self.codes = np.full((capacity, len(GRADES), SLOTS_PER_YEAR), EMPTY, dtype=np.int32)
+        self.goal = np.zeros(capacity, dtype=np.int16)
+        self.goals: List[str] = []
+        self.assumptions: Dict[int, List[str]] = {}  # only plans that have any
+        self.table: List[Any] = []                   # code EMPTY - 1 - k -> slot value k
+        self._table_code: Dict[Any, int] = {}
+        self._goal_code: Dict[str, int] = {}
+        self.n = 0
+
+    @classmethod
+    def from_plans(cls, plans: Sequence[Dict[str, Any]], catalog) -> "PlanArray":
+        out = cls(codec_for(catalog), len(plans))
+        for p in plans:
+            out.append(p)
+        return out
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes[:self.n].nbytes + self.goal[:self.n].nbytes
+
+    # --- encoding --------------------------------------------------------------------------
+
+    def _slot_code(self, slot) -> int:
+        if slot is None:
+            return EMPTY
+        if type(slot) is str:
+            i = self.codec.ids.get(slot)
+            if i is not None:
+                return i
+            key = slot
+        else:
+            key = tuple(slot)
+        code = self._table_code.get(key)
+        if code is None:
+            code = self._table_code[key] = EMPTY - 1 - len(self.table)
+            self.table.append(key)
+        return code
+
+    def _slot_value(self, code: int):
+        if code >= 0:
+            return self.codec.titles[code]
+        if code == EMPTY:
+            return None
+        value = self.table[EMPTY - 1 - code]
+        return list(value) if isinstance(value, tuple) else value
+
+    def append(self, plan: Dict[str, Any]) -> int:
+        """
+        Encodes a JSON plan; ValueError unless it has exactly grades 9-12 with 6 slots each.
+        """
+        years = plan.get("plan", [])
+        if [y["grade"] for y in years] != list(GRADES) or any(len(y["courses"]) != SLOTS_PER_YEAR for y in years):
+            raise ValueError("a compact plan needs grades 9-12 with 6 slots each")
+        if self.n == len(self.codes):
+            grow = max(16, self.n)
+            self.codes = np.concatenate([self.codes, np.full((grow, len(GRADES), SLOTS_PER_YEAR), EMPTY,
+                                                             dtype=np.int32)])
+            self.goal = np.concatenate([self.goal, np.zeros(grow, dtype=np.int16)])
+        i = self.n
+        self.codes[i] = [[self._slot_code(s) for s in y["courses"]] for y in years]
+        goal = plan.get("goal", "")
+        g = self._goal_code.get(goal)
+        if g is None:
+            g = self._goal_code[goal] = len(self.goals)
+            self.goals.append(goal)
+        self.goal[i] = g
+        if plan.get("assumptions"):
+            self.assumptions[i] = list(plan["assumptions"])
+        self.n += 1
+        return i
+
+    # --- decoding --------------------------------------------------------------------------
+
+    def plan(self, i: int) -> Dict[str, Any]:
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        value = self._slot_value
+        return {
+            "goal": self.goals[self.goal[i]],
+            "assumptions": list(self.assumptions.get(i, [])),
+            "plan": [{"grade": g, "courses": [value(c) for c in row]}
+                     for g, row in zip(GRADES, self.codes[i].tolist())],
+            "rationale": [],
+            "next_steps": [],
+        }
+
+    __getitem__ = plan
+
+    def to_plans(self) -> List[Dict[str, Any]]:
+        return [self.plan(i) for i in range(self.n)]
+
+    def to_batch(self, rows: Optional[Sequence[int]] = None) -> PlanBatch:
+        """
+        The validator's PlanBatch straight from the codes: no per-title lookups, the
+        pair table is expanded once. rows: plan indices to include (default all).
+        """
+        codes = self.codes[:self.n] if rows is None else self.codes[np.asarray(rows, dtype=np.int64)]
+        n = len(codes)
+        flat = codes.reshape(-1)
+        row = np.repeat(np.arange(n * len(GRADES), dtype=np.int32), SLOTS_PER_YEAR)
+
+        course = flat.copy()
+        units = np.full(len(flat), 2, dtype=np.int8)
+        special = np.flatnonzero(flat < EMPTY)
+        if len(special):
+            # a pair -> one entry per course; a title outside the catalog -> UNKNOWN_COURSE
+            members = [[self.codec.ids.get(t, UNKNOWN_COURSE) for t in v] if isinstance(v, tuple)
+                       else [UNKNOWN_COURSE] for v in self.table]
+            entries = [members[EMPTY - 1 - c] for c in flat[special].tolist()]
+            sizes = np.fromiter(map(len, entries), dtype=np.int64, count=len(entries))
+            keep = flat >= EMPTY
+            course = np.concatenate([course[keep], np.array([t for e in entries for t in e], dtype=np.int32)])
+            row = np.concatenate([row[keep], np.repeat(row[special], sizes)])
+            units = np.concatenate([units[keep], np.repeat((2 // np.maximum(sizes, 1)).astype(np.int8), sizes)])
+        return PlanBatch(
+            n,
+            course,
+            row,
+            np.repeat(np.arange(n, dtype=np.int32), len(GRADES)),
+            np.tile(np.asarray(GRADES, dtype=np.int64), n),
+            np.full(n * len(GRADES), SLOTS_PER_YEAR, dtype=np.int32),
+            units,
+        )
@@ -0,0 +1,931 @@
+"""
+Branch-and-bound optimizer for the four-year plan grid.
+
+The greedy fill_core_slots commits to the first match year by year. Here each
+year's core slots (CORE_SLOTS rules, the MATH_TRACK / SCI_TRACK steps and the
+Spanish level) are decision points whose options come from the same pickers'
+candidate lists; the rest of each year is filled with the best electives for
+the current state. Hard constraints: every option is offered in its grade,
+satisfies its slot rule, follows the tracks, and no course is repeated (or
+already completed); math, science, Spanish and electives also meet their
+prerequisites, as in fill_core_slots. The search maximizes an Objective, prunes with an
+optimistic bound (slots no plan can leave to electives, such as the math track
+chain or the Spanish level, count at their own value), memoizes (year, courses used) subproblems and stops at a
+wall-clock budget, returning the best plan found so far. A year's core
+assignments are generated lazily best-first, each slot keeps at most
+MAX_SLOT_OPTIONS options, and the candidate tables and course values are
+built once per catalog and goal (prepare_catalog), so large catalogs stay
+within the budget.
+
+iter_plans walks the same search space best-first and yields distinct plans in
+descending score order, for showing counselors several alternatives; it pulls
+core assignments as it goes, so the first plan comes about as fast as
+optimize_plan's.
+"""
+import heapq
+import itertools
+import time
+from dataclasses import astuple, dataclass, field
+from typing import Dict, FrozenSet, Iterator, List, Optional, Sequence, Set, Tuple
+
+from ag_audit import AG_TARGET, area_codes
+from catalog_parser import AG_AREAS, CatalogCache
+from elective_picker import elective_table
+from language_pathway import SPANISH_LEVEL_KEYWORDS, detect_spanish_next_level
+from math_pathway import MATH_TRACK, chain_candidates, math_steps
+from pathway_tables import step_candidates
+from prerequisites import Coverage, graph_for
+from rules_pusd import CORE_SLOTS, PREFERRED_FOR_SLOT, preferred_titles
+from science_pathway import science_step
+from skeleton_builder import build_empty_plan
+from utils import contains_any
+
+
+GRADES = [9, 10, 11, 12]
+SLOTS_PER_YEAR = 6
+MAX_SLOT_OPTIONS = 12  # options kept per core slot: the first candidate plus the best-valued others
+GATED_SLOTS = ("Math", "Science")  # core slots whose options must meet their prerequisites, as in fill_core_slots
+
+
+@dataclass
+class Objective:
+    """
+    Plan score weights. Every course adds relevance (0..1, from the goal's elective
+    keyword groups) and rigor (1 for honors/AP); every A-G year credited up to the
+    UC minimum adds ag_coverage.
+    """
+    relevance: float = 1.0
+    ag_coverage: float = 2.0
+    rigor: float = 0.5
+
+
+@dataclass
+class OptimizeResult:
+    plan: dict
+    score: float
+    optimal: bool           # False when the time budget ran out first
+    nodes: int              # year assignments evaluated
+    elapsed_ms: float
+    notes: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RankedPlan:
+    plan: dict
+    score: float
+    rank: int               # 1 = best
+
+
+class _Timeout(Exception):
+    pass
+
+
+# An option fills one slot: (titles, value, ((ag area index, units), ...)).
+_Option = Tuple[Tuple[str, ...], float, Tuple[Tuple[int, int], ...]]
+_SKIP: _Option = ((), 0.0, ())  # stands in for a slot with no option left; never part of an assignment
+
+
+def course_rigor(title: str) -> float:
+    t = title.lower()
+    return 1.0 if t.startswith("ap ") or "honors" in t or "(hp)" in t or "(xhp)" in t else 0.0
+
+
+class _Scores:
+    """
+    What one (goal, Objective) makes of a catalog: course values, each year's offered
+    titles per A-G area (and "none" at index len(AG_AREAS)) best-first, and slot
+    options before the completed courses are dropped.
+    """
+
+    def __init__(self, tables: "_CatalogTables", relevance: Dict[str, float], objective: Objective):
+        self.relevance = relevance  # elective_table's; a new one (register_goal_electives) retires these scores
+        self.objective = objective
+        self.value: Dict[str, float] = {}
+        self.options: Dict[tuple, List[_Option]] = {}
+        areas = area_codes(tables.catalog)
+        self.pools: List[List[List[str]]] = []
+        for titles in tables.offered:
+            buckets: List[List[str]] = [[] for _ in range(len(AG_AREAS) + 1)]
+            for t in sorted(titles, key=lambda t: -self.value_of(t)):  # stable: ties keep catalog order
+                buckets[areas.get(t, -1)].append(t)
+            self.pools.append(buckets)
+
+    def value_of(self, title: str) -> float:
+        v = self.value.get(title)
+        if v is None:
+            v = self.value[title] = (self.objective.relevance * self.relevance.get(title, 0.0)
+                                     + self.objective.rigor * course_rigor(title))
+        return v
+
+
+class _CatalogTables:
+    """
+    The parts of a _Problem no student input changes, built once per catalog so
+    that the time budget goes to the search: offered titles per grade, the titles
+    still offered from each year on, and a _Scores per (goal, Objective).
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        index = getattr(catalog, "index", None)
+        self.offered: List[List[str]] = [
+            list(index.iter_grade(g)) if index is not None else [t for t, c in catalog.items() if c.offered_in(g)]
+            for g in GRADES]
+        # Titles still offered from year yi on; only these matter to the rest of the search.
+        self.future_titles: List[FrozenSet[str]] = []
+        later: Set[str] = set()
+        for titles in reversed(self.offered):
+            later |= set(titles)
+            self.future_titles.append(frozenset(later))
+        self.future_titles.reverse()
+        # Titles offered per grade that move the Spanish level, with the level they lead to.
+        self.spanish_titles: List[Dict[str, Optional[str]]] = [
+            {t: detect_spanish_next_level([t]) for t in titles if "spanish" in t.lower()} for titles in self.offered]
+        self._scores: Dict[tuple, _Scores] = {}
+        self._gated: Optional[Tuple[object, List[List[int]]]] = None
+
+    def gated_offered(self, graph) -> List[List[int]]:
+        """
+        The prerequisite graph nodes offered per grade, Spanish titles left out.
+        """
+        if self._gated is None or self._gated[0] is not graph:
+            self._gated = (graph, [[graph.node[t] for t in titles if t in graph.node and t not in spanish]
+                                   for titles, spanish in zip(self.offered, self.spanish_titles)])
+        return self._gated[1]
+
+    def scores(self, goal: str, objective: Objective) -> _Scores:
+        relevance = elective_table(self.catalog).relevance(goal)
+        key = (goal, astuple(objective))
+        hit = self._scores.get(key)
+        if hit is None or hit.relevance is not relevance:
+            hit = self._scores[key] = _Scores(self, relevance, Objective(*key[1]))
+        return hit
+
+
+_TABLES = CatalogCache("optimizer_tables")
+
+
+def catalog_tables(catalog) -> _CatalogTables:
+    """
+    The shared _CatalogTables of a loaded catalog (built on first use).
+    """
+    t = _TABLES.get(catalog)
+    if t is None:
+        t = _TABLES[catalog] = _CatalogTables(catalog)
+    return t
+
+
+class _Problem:
+    def __init__(self, catalog, goal, starting_math, science_pathway, completed_courses, prefer_spanish,
+                 objective: Objective, preferred=None, max_options: int = MAX_SLOT_OPTIONS):
+        self.catalog = catalog
+        self.max_options = max_options
+        self.goal = goal
+        self.objective = objective
+        self.preferred = preferred if preferred is not None else preferred_titles(catalog)
+        self.prefer_spanish = prefer_spanish
+        self.completed = frozenset(str(c) for c in completed_courses)
+        self.notes: List[str] = []
+        self.tables = catalog_tables(catalog)
+        self.scores = self.tables.scores(goal, objective)
+        self._value = self.scores.value
+        self._areas = area_codes(catalog)
+        self._spanish: Dict[Tuple[int, str], List[_Option]] = {}
+
+        math_track = MATH_TRACK.get(starting_math, MATH_TRACK["honors_geometry"])
+        math_by_year = math_steps(catalog, starting_math)
+        self.prereqs = graph_for(catalog)
+        self.placed = self.prereqs.placement("math", math_track[0])
+        self.core: List[List[Tuple[str, List[_Option]]]] = []
+        for yi, g in enumerate(GRADES):
+            slots: List[Tuple[str, List[_Option]]] = []
+            rules = {r.slot_name: r for r in CORE_SLOTS.get(g, [])}
+
+            english = rules.get("English")
+            slots.append(("English", self._options(("English", g), english,
+                                                   chain_candidates, catalog, g, [["english"]])))
+            if math_by_year[yi] is not None:
+                m = math_by_year[yi]
+                slots.append(("Math", self._options(("Math", g, m), rules.get("Math"),
+                                                    step_candidates, catalog, "math", m, g)))
+            step = science_step(science_pathway, yi)
+            if step != "none":
+                sci = self._options(("Science", g, step), rules.get("Science"),
+                                    step_candidates, catalog, "science", step, g)
+                slots.append(("Science", sci if step != "optional" else sci + [((), 0.0, ())]))
+
+            for name, rule in rules.items():
+                if name in ("English", "Math", "Science"):
+                    continue
+                slots.append((name, self._rule_options(g, rule)))
+
+            for name, opts in slots:
+                if not opts:
+                    self.notes.append(f"Grade {g}: no offered course satisfies the {name} slot; left to electives")
+            self.core.append([(n, o) for n, o in slots if o])
+
+        self._drop_symmetric_options()
+        self.core = [[(n, self._cap(o)) for n, o in year] for year in self.core]
+        # Shared by every student with these scores: completed courses are skipped as used ones are.
+        self.pools = self.scores.pools
+        self._build_bounds()
+
+    # --- options -------------------------------------------------------------
+
+    def value(self, title: str) -> float:
+        v = self._value.get(title)
+        return v if v is not None else self.scores.value_of(title)
+
+    def _area(self, title: str) -> int:
+        return self._areas.get(title, -1)  # -1 = no A-G area
+
+    def _option(self, titles: Sequence[str]) -> _Option:
+        units = 1 if len(titles) > 1 else 2
+        areas = tuple((self._area(t), units) for t in titles if self._area(t) >= 0)
+        return tuple(titles), sum(self.value(t) for t in titles) / len(titles), areas
+
+    def _not_completed(self, opts: List[_Option]) -> List[_Option]:
+        completed = self.completed
+        if not completed:
+            return list(opts)
+        return [o for o in opts if not any(t in completed for t in o[0])]
+
+    def _options(self, key, rule, candidates, *args) -> List[_Option]:
+        # candidates(*args): the ordered titles, asked for on the first use of key for these scores
+        opts = self.scores.options.get(key)
+        if opts is None:
+            opts = self.scores.options[key] = [self._option([t]) for t in candidates(*args)
+                                               if rule is None or contains_any(t, rule.keywords)]
+        return self._not_completed(opts)
+
+    def _rule_options(self, grade, rule) -> List[_Option]:
+        key = PREFERRED_FOR_SLOT.get((grade, rule.slot_name))
+        preferred = self.preferred.get(key, []) if key else []
+        if "semester pair" in rule.slot_name:
+            preferred = tuple(tuple(p) for p in preferred)
+        else:
+            preferred = tuple(preferred)
+        cache_key = ("rule", grade, rule.slot_name, preferred)
+        opts = self.scores.options.get(cache_key)
+        if opts is None:
+            opts = self.scores.options[cache_key] = self._make_rule_options(grade, rule, preferred)
+        return self._not_completed(opts)
+
+    def _make_rule_options(self, grade, rule, preferred) -> List[_Option]:
+        if "semester pair" in rule.slot_name:
+            pairs = [p for p in preferred if all(self._offered(t, grade) for t in p)]
+            return [self._option(p) for p in pairs if all(contains_any(t, rule.keywords) for t in p)]
+
+        titles = [t for t in preferred if self._offered(t, grade)]
+        if rule.slot_name.startswith("PE Course"):
+            prefix = rule.slot_name.lower()
+            extra = [t for t in chain_candidates(self.catalog, grade, [[prefix]]) if t.lower().startswith(prefix)]
+        else:
+            extra = [t for t in self._offered_titles(grade) if contains_any(t, rule.keywords)]
+        seen: Set[str] = set()
+        ordered = [t for t in titles + extra if not (t in seen or seen.add(t))]
+        return [self._option([t]) for t in ordered]
+
+    def _offered(self, title, grade) -> bool:
+        c = self.catalog.get(title)
+        return c is not None and c.offered_in(grade)
+
+    def _offered_titles(self, grade) -> List[str]:
+        return self.tables.offered[GRADES.index(grade)]
+
+    def cover(self, used: FrozenSet[str]) -> Coverage:
+        """
+        Prerequisite coverage at the start of a year with these courses used.
+        """
+        return self.prereqs.cover(used, self.placed)
+
+    def state(self, yi: int, used: FrozenSet[str]) -> tuple:
+        # What the rest of the search depends on besides the A-G units: courses still offered,
+        # the Spanish level and the prerequisites met.
+        return (yi, used & self.future_titles[yi],
+                detect_spanish_next_level(sorted(used)) if self.prefer_spanish else None,
+                self.prereqs.signature(self.cover(used)))
+
+    def spanish_options(self, yi: int, taken: FrozenSet[str], covered: Coverage) -> List[_Option]:
+        if not self.prefer_spanish:
+            return []
+        level = detect_spanish_next_level(sorted(taken))
+        if not level:
+            return []
+        return [o for o in self._spanish_level(yi, level)
+                if o[0][0] not in taken and self.prereqs.allows(o[0][0], covered)]
+
+    def _spanish_level(self, yi: int, level: str) -> List[_Option]:
+        key = (yi, level)
+        opts = self._spanish.get(key)
+        if opts is None:
+            g = GRADES[yi]
+            opts = self._spanish[key] = self._cap(self._options(
+                ("Spanish", g, level), None, step_candidates, self.catalog, "spanish", level, g))
+        return opts
+
+    def _cap(self, opts: List[_Option]) -> List[_Option]:
+        # On a large catalog a slot can have dozens of near-equal options; keep the first
+        # candidate (the greedy planner's pick) and the best-valued others, in candidate order.
+        if len(opts) <= self.max_options:
+            return opts
+        keep = set(sorted(range(1, len(opts)), key=lambda i: -opts[i][1])[:self.max_options - 1])
+        return [o for i, o in enumerate(opts) if i == 0 or i in keep]
+
+    def _drop_symmetric_options(self):
+        # Two options of the same slot that are single courses with identical value, A-G area and
+        # grade offering, and that appear in no other core slot, are interchangeable: keep the first.
+        appears: Dict[str, int] = {}
+        for year in self.core:
+            for _, opts in year:
+                for titles, _, _ in opts:
+                    for t in titles:
+                        appears[t] = appears.get(t, 0) + 1
+        for year in self.core:
+            for i, (name, opts) in enumerate(year):
+                seen = set()
+                kept = []
+                for o in opts:
+                    titles = o[0]
+                    if len(titles) == 1 and appears[titles[0]] == 1:
+                        sig = (o[1], o[2], self.catalog[titles[0]].grade_mask)
+                        if sig in seen:
+                            continue
+                        seen.add(sig)
+                    kept.append(o)
+                year[i] = (name, kept)
+
+    # --- electives and bounds --------------------------------------------------
+
+    def _heads(self, bucket: List[str]) -> List[str]:
+        # the first SLOTS_PER_YEAR titles of a pool bucket that are not completed
+        return list(itertools.islice((t for t in bucket if t not in self.completed), SLOTS_PER_YEAR))
+
+    def _forced_slots(self) -> Tuple[List[Set[int]], List[float]]:
+        """
+        Per year, the slots (core ones, then Spanish at index len(core)) that always
+        take one of their options, whatever the plan does before them, and the best
+        Spanish option of a level the student can be at whose prerequisites can be met.
+
+        A core slot does when it has no empty option and one option is a course no
+        earlier grade offers and no other slot (Spanish included) can take; in a gated
+        slot the course may be offered earlier if its prerequisites cannot be met by
+        then, and they must be met for sure: by the completed courses and placement, or
+        by any option of the same slot forced the year before (the math track chain).
+        The Spanish slot does when every level the student can be at has such a course,
+        its prerequisites met by whatever reached that level. Nothing taken earlier may
+        satisfy the course already either.
+        """
+        elsewhere: Dict[str, int] = {}
+        for year in self.core:
+            for _, opts in year:
+                for t in {t for o in opts for t in o[0]}:
+                    elsewhere[t] = elsewhere.get(t, 0) + 1
+        in_core = set(elsewhere)
+        if self.prefer_spanish:
+            for level in SPANISH_LEVEL_KEYWORDS:
+                for g in GRADES:
+                    for t in step_candidates(self.catalog, "spanish", level, g):
+                        elsewhere[t] = elsewhere.get(t, 0) + 2
+
+        graph = self.prereqs
+        base = graph.cover(self.completed, self.placed)
+        levels = list(SPANISH_LEVEL_KEYWORDS) + [None]
+        start = levels.index(detect_spanish_next_level(sorted(self.completed)))
+        out: List[Set[int]] = []
+        spanish_best: List[float] = []
+        # What a plan can have taken or covered by the start of the year: titles offered
+        # earlier once their prerequisites can be met; Spanish ones with their level.
+        reach = base
+        beside: Coverage = {}  # covered by those titles besides themselves, Spanish ones left out
+        spanish: Dict[str, int] = {}  # Spanish title -> rank of the level it leads to
+        spanish_cover: Dict[str, Coverage] = {}
+        sure: Dict[str, List[Coverage]] = {}  # forced gated slot last year -> coverage of each option
+        for yi, year in enumerate(self.core):
+            earlier = 0
+            for g in GRADES[:yi]:
+                earlier |= 1 << g
+
+            def free(t: str, name: str, earlier=earlier, reach=reach, sure=sure) -> bool:
+                if elsewhere.get(t, 0) != 1:
+                    return False
+                if name not in GATED_SLOTS or t not in graph:
+                    return not self.catalog[t].grade_mask & earlier
+                n = graph.node[t]
+                c = graph.comp[n]
+                if reach.get(c, 0) & graph.bit[n]:
+                    return False  # taken or satisfied by something earlier, maybe
+                options = sure.get(name, [])
+                return all(base.get(c, 0) & m or options and all(cov.get(c, 0) & m for cov in options)
+                           for m in graph.requires[n])
+
+            forced = {i for i, (name, opts) in enumerate(year)
+                      if all(o[0] for o in opts) and any(all(free(t, name) for t in o[0]) for o in opts)}
+            ranks = {start} | {r for r in spanish.values() if r > start}
+            spanish_best.append(max((o[1] for r in ranks if levels[r] for o in self._spanish_level(yi, levels[r])
+                                     if graph.eligible(o[0][0], reach)), default=0.0) if self.prefer_spanish else 0.0)
+            if self.prefer_spanish and levels.index(None) not in ranks:
+
+                def spanish_free(t: str, rank: int, beside=beside) -> bool:
+                    # A title taken earlier, or one that covers t, moves the level past rank.
+                    if t in in_core or spanish.get(t, len(levels)) <= rank:
+                        return False
+                    if t not in graph:
+                        return True
+                    n = graph.node[t]
+                    c = graph.comp[n]
+                    covered = base.get(c, 0) | beside.get(c, 0)
+                    for x, r in spanish.items():
+                        if r <= rank:
+                            covered |= spanish_cover[x].get(c, 0)
+                    if covered & graph.bit[n]:
+                        return False
+                    reached = [spanish_cover[x].get(c, 0) for x, r in spanish.items() if r == rank]
+                    return all(base.get(c, 0) & m or rank != start and reached and all(x & m for x in reached)
+                               for m in graph.requires[n])
+
+                if all(any(spanish_free(o[0][0], r) for o in self._spanish_level(yi, levels[r])) for r in ranks):
+                    forced.add(len(year))
+            out.append(forced)
+            sure = {name: [graph.cover(o[0]) for o in opts]
+                    for i, (name, opts) in enumerate(year) if i in forced and name in GATED_SLOTS}
+            grown = dict(reach)
+            for n in self.tables.gated_offered(graph)[yi]:
+                c = graph.comp[n]
+                have = reach.get(c, 0)
+                if all(have & m for m in graph.requires[n]):
+                    beside[c] = beside.get(c, 0) | (graph.closure[n] & ~graph.bit[n])
+                    grown[c] = grown.get(c, 0) | graph.closure[n]
+            for t, level in self.tables.spanish_titles[yi].items():
+                if graph.eligible(t, reach):
+                    spanish[t] = levels.index(level)
+                    spanish_cover[t] = graph.cover([t])
+                    if t in graph:
+                        grown = graph.cover([t], grown)
+            reach = grown
+        return out, spanish_best
+
+    def _build_bounds(self):
+        heads = [[self._heads(b) for b in self.pools[yi]] for yi in range(len(GRADES))]
+
+        # A year holds at most SLOTS_PER_YEAR courses, each either an option of a core slot
+        # (worth at most that slot's best option) or an elective: the top values of both bound it.
+        # A slot that is never left to electives takes one of those courses whatever it is worth.
+        per_year = []
+        forced_slots, spanish_best = self._forced_slots()
+        for yi in range(len(GRADES)):
+            best = [max(o[1] for o in opts) for _, opts in self.core[yi]] + [spanish_best[yi]]
+            forced = forced_slots[yi]
+            items = [v for i, v in enumerate(best) if i not in forced]
+            items += [self.value(t) for b in heads[yi] for t in b]
+            fixed = sorted((best[i] for i in forced), reverse=True)[:SLOTS_PER_YEAR]
+            per_year.append(sum(fixed) + sum(sorted(items, reverse=True)[:SLOTS_PER_YEAR - len(fixed)]))
+        self.static_bound = [sum(per_year[yi:]) for yi in range(len(GRADES))] + [0.0]
+
+        # elective_top[yi][k]: value of the k best electives of year yi, ignoring conflicts
+        self.elective_top = []
+        for yi in range(len(GRADES)):
+            top = sorted((self.value(t) for b in heads[yi] for t in b), reverse=True)
+            prefix = [0.0]
+            for v in top[:SLOTS_PER_YEAR]:
+                prefix.append(prefix[-1] + v)
+            prefix += [prefix[-1]] * (SLOTS_PER_YEAR + 1 - len(prefix))
+            self.elective_top.append(prefix)
+
+        self.future_titles = self.tables.future_titles
+
+    def ag_score(self, units: Tuple[int, ...]) -> float:
+        total = 0
+        for u, t in zip(units, AG_TARGET):
+            total += u if u < t else t
+        return self.objective.ag_coverage * total / 2
+
+    def bound(self, yi: int, units: Tuple[int, ...], extra_room: int = 0) -> float:
+        """
+        Optimistic value of years yi.. given the A-G units so far; extra_room adds
+        A-G units that can still be earned before year yi.
+        """
+        missing = 0
+        for u, t in zip(units, AG_TARGET):
+            if u < t:
+                missing += t - u
+        room = 2 * SLOTS_PER_YEAR * (len(GRADES) - yi) + extra_room
+        return self.static_bound[yi] + self.objective.ag_coverage * min(missing, room) / 2
+
+    def fill_electives(self, yi: int, k: int, used: Set[str], units: List[int],
+                       covered: Coverage) -> Tuple[List[str], float]:
+        """
+        Greedy by marginal gain, which is optimal for one year: the objective is
+        additive per course plus a capped (concave) count per A-G area.
+        covered: prerequisite coverage at the start of the year.
+        """
+        allows = self.prereqs.allows
+        chosen: List[str] = []
+        gain_total = 0.0
+        pools = self.pools[yi]
+        heads = [0] * len(pools)
+        w = self.objective.ag_coverage
+        values = self._value
+        n_areas = len(AG_AREAS)
+        for _ in range(k):
+            best_gain, best_t, best_a = None, None, -1
+            for a, bucket in enumerate(pools):
+                i = heads[a]
+                n = len(bucket)
+                while i < n and (bucket[i] in used or not allows(bucket[i], covered)):
+                    i += 1
+                heads[a] = i
+                if i == n:
+                    continue
+                t = bucket[i]
+                gain = values[t]
+                if a < n_areas:
+                    short = AG_TARGET[a] - units[a]
+                    if short > 0:
+                        gain += w * (2 if short > 2 else short) / 2
+                if best_gain is None or gain > best_gain:
+                    best_gain, best_t, best_a = gain, t, a
+            if best_t is None:
+                break
+            chosen.append(best_t)
+            used.add(best_t)
+            gain_total += best_gain
+            if best_a < n_areas:
+                units[best_a] += 2
+        return chosen, gain_total
+
+
+class _Search:
+    def __init__(self, problem: _Problem, deadline: float):
+        self.p = problem
+        self.deadline = deadline
+        self.nodes = 0
+        self.exact: Dict[tuple, Tuple[float, tuple]] = {}
+        self.fails: Dict[tuple, float] = {}
+        self.best: Optional[Tuple[float, tuple]] = None
+
+    def assignments(self, yi: int, used: FrozenSet[str], units: Tuple[int, ...]) -> Iterator[tuple]:
+        """
+        The ways to fill year yi's core slots, generated lazily best-first:
+        (key, bound, picks, taken, units after core, elective slots left). bound is
+        an optimistic value of years yi.. (electives counted at their best, ignoring
+        conflicts); key is an additive bound at least as high, never increasing along
+        the sequence, so a caller can stop at the first key below its threshold.
+
+        A slot takes one of its options not already used; when every option
+        conflicts with the slots before it, the slot goes to electives.
+        """
+        p = self.p
+        covered = p.cover(used)
+        allows = p.prereqs.allows
+        slots = [[o for o in opts if not any(t in used for t in o[0])
+                  and (name not in GATED_SLOTS or all(allows(t, covered) for t in o[0]))]
+                 for name, opts in p.core[yi]]
+        spanish = p.spanish_options(yi, used, covered)
+        if spanish:
+            slots.append(spanish)
+        slots = [s if s else [_SKIP] for s in slots]  # nothing left: the slot goes to electives
+
+        base_ag = p.ag_score(units)
+        w = p.objective.ag_coverage
+
+        def gain(opt) -> float:
+            g = opt[1]
+            for a, n in opt[2]:
+                short = AG_TARGET[a] - units[a]
+                if short > 0:
+                    g += w * min(n, short) / 2
+            return g
+
+        # The elective slots left depend on how many slots end up empty: an empty
+        # option, no option left, or every option taken by another slot.
+        slot_titles = [{t for o in s for t in o[0]} for s in slots]
+        may_empty = sum(1 for i, s in enumerate(slots)
+                        if any(not o[0] for o in s)
+                        or all(any(t in slot_titles[j] for t in o[0] for j in range(len(slots)) if j != i) for o in s))
+        k_min = max(0, SLOTS_PER_YEAR - len(slots))
+        k_max = min(SLOTS_PER_YEAR, k_min + may_empty)
+        rest = max(p.elective_top[yi][k] + p.bound(yi + 1, units, extra_room=2 * k) for k in range(k_min, k_max + 1))
+
+        # per slot: options best-first on their additive key; the frontier walks the
+        # product of these lists in descending key order
+        order = [sorted(range(len(s)), key=lambda j, s=s: -gain(s[j])) for s in slots]
+        keys = [[gain(s[j]) for j in o] for s, o in zip(slots, order)]
+        def finish(picked, taken, key):
+            u = list(units)
+            for _, _, areas in picked:
+                for a, m in areas:
+                    u[a] += m
+            ut = tuple(u)
+            k = SLOTS_PER_YEAR - sum(1 for o in picked if o[0])
+            bound = (sum(o[1] for o in picked) + p.ag_score(ut) - base_ag + p.elective_top[yi][k]
+                     + p.bound(yi + 1, ut, extra_room=2 * k))
+            return key, bound, tuple(picked), taken, ut, k
+
+        n = len(slots)
+        top = sum(k[0] for k in keys) + rest
+        frontier = [(-top, (0,) * n, 0)]
+        pops = 0
+        while frontier:
+            pops += 1
+            if pops % 256 == 0 and time.perf_counter() > self.deadline:
+                if self.best is not None:
+                    raise _Timeout()
+                # Out of time before the first plan: the first dive takes each slot's best
+                # free option in turn, as fill_core_slots would, instead of walking the product.
+                yield finish(*self._first_fit(slots, order, used), top)
+                raise _Timeout()  # reached once the dive below has its plan
+            neg_key, pos, last = heapq.heappop(frontier)
+            for i in range(last, n):
+                if pos[i] + 1 < len(order[i]):
+                    child = pos[:i] + (pos[i] + 1,) + pos[i + 1:]
+                    heapq.heappush(frontier, (-(sum(k[j] for k, j in zip(keys, child)) + rest), child, i))
+
+            picked = []
+            taken = set(used)
+            for i, j in enumerate(pos):
+                opt = slots[i][order[i][j]]
+                if any(t in taken for t in opt[0]):
+                    if j != 0 or any(not any(t in taken for t in o[0]) for o in slots[i]):
+                        break  # another option fits this slot; skipping it is reached from j == 0 only
+                    continue
+                if opt is not _SKIP:
+                    picked.append(opt)
+                    taken.update(opt[0])
+            else:
+                yield finish(picked, taken, -neg_key)
+
+    @staticmethod
+    def _first_fit(slots, order, used) -> Tuple[list, Set[str]]:
+        picked = []
+        taken = set(used)
+        for s, o in zip(slots, order):
+            opt = next((s[j] for j in o if not any(t in taken for t in s[j][0])), _SKIP)
+            if opt[0]:
+                picked.append(opt)
+                taken.update(opt[0])
+        return picked, taken
+
+    def expired(self) -> bool:
+        # The budget only cuts the search once a complete plan is in hand. Until then
+        # the search is one dive (the first assignment of each year), and assignments
+        # caps the cost of finding that assignment at the deadline.
+        return self.best is not None and time.perf_counter() > self.deadline
+
+    def solve(self, yi: int, used: FrozenSet[str], units: Tuple[int, ...], prefix: float,
+              prefix_years: tuple, need: float) -> Optional[Tuple[float, tuple]]:
+        """
+        Best (future value, future years) from this state if it beats need, else None.
+        """
+        p = self.p
+        if yi == len(GRADES):
+            if self.best is None or prefix > self.best[0]:
+                self.best = (prefix, prefix_years)
+            return (0.0, ()) if 0.0 > need else None
+
+        key = (p.state(yi, used), units)
+        hit = self.exact.get(key)
+        if hit is not None:
+            if hit[0] > need:
+                total = prefix + hit[0]
+                if self.best is None or total > self.best[0]:
+                    self.best = (total, prefix_years + hit[1])
+                return hit
+            return None
+        failed = self.fails.get(key)
+        if failed is not None and need >= failed:
+            return None
+        if p.bound(yi, units) <= need:
+            return None
+
+        best = None
+        threshold = need
+        base_ag = p.ag_score(units)
+        covered = p.cover(used)
+        for key, bound, core, taken, core_units, k in self.assignments(yi, used, units):
+            if key <= threshold:
+                break  # keys never increase: nothing later can beat the threshold either
+            if bound <= threshold:
+                continue
+            self.nodes += 1
+            if self.expired():
+                raise _Timeout()
+
+            new_used = set(taken)
+            u = list(core_units)
+            electives, _ = p.fill_electives(yi, k, new_used, u, covered)
+            new_units = tuple(u)
+            value = (sum(o[1] for o in core) + sum(p.value(t) for t in electives)
+                     + p.ag_score(new_units) - base_ag)
+            if value + p.bound(yi + 1, new_units) <= threshold:
+                continue
+
+            year = (core, tuple(electives))
+            sub = self.solve(yi + 1, frozenset(new_used), new_units, prefix + value, prefix_years + (year,),
+                             threshold - value)
+            if sub is not None and value + sub[0] > threshold:
+                best = (value + sub[0], (year,) + sub[1])
+                threshold = best[0]
+
+        if best is None:
+            self.fails[key] = min(need, self.fails.get(key, need))
+        else:
+            self.exact[key] = best
+        return best
+
+
+def prepare_catalog(catalog, goal: str = "cs", objective: Optional[Objective] = None) -> None:
+    """
+    Builds what every optimizer call for this catalog and goal shares: the prerequisite
+    graph, the A-G areas and the candidate tables and course values. A service can
+    call it at catalog load so that even the first request stays within its budget.
+    """
+    graph_for(catalog)
+    area_codes(catalog)
+    catalog_tables(catalog).scores(goal, objective or Objective())
+
+
+def _to_plan(goal: str, years: tuple, notes: List[str]) -> dict:
+    plan = build_empty_plan(goal)
+    for year, (core, electives) in zip(plan["plan"], years):
+        slots = year["courses"]
+        entries = [list(o[0]) if len(o[0]) > 1 else o[0][0] for o in core if o[0]] + list(electives)
+        for i, e in enumerate(entries[:SLOTS_PER_YEAR]):
+            slots[i] = e
+    plan["assumptions"].extend(notes)
+    return plan
+
+
+def _initial_units(problem: _Problem) -> Tuple[int, ...]:
+    units = [0] * len(AG_AREAS)
+    for t in problem.completed:
+        if t in problem.catalog and problem._area(t) >= 0:
+            units[problem._area(t)] += 2
+    return tuple(units)
+
+
+def optimize_plan(
+    catalog,
+    goal: str,
+    starting_math: str,
+    science_pathway: str,
+    completed_courses,
+    prefer_spanish: bool = False,
+    objective: Optional[Objective] = None,
+    time_budget_ms: float = 50.0,
+    preferred=None,
+    max_options: int = MAX_SLOT_OPTIONS,
+) -> OptimizeResult:
+    """
+    Search for the highest-scoring valid plan; returns the best one found within the
+    budget (the search runs past it only until it has a first complete plan).
+    Each core slot considers at most max_options options.
+    The budget covers the per-student work. The per-catalog tables (prepare_catalog)
+    are built before the clock starts on the first call for a catalog and goal.
+    """
+    prepare_catalog(catalog, goal, objective)
+    start = time.perf_counter()
+    problem = _Problem(catalog, goal, starting_math, science_pathway, completed_courses, prefer_spanish,
+                       objective or Objective(), preferred, max_options)
+    search = _Search(problem, start + time_budget_ms / 1000.0)
+    units0 = _initial_units(problem)
+
+    optimal = True
+    try:
+        search.solve(0, problem.completed, units0, 0.0, (), float("-inf"))
+    except _Timeout:
+        optimal = False
+
+    score, years = search.best if search.best is not None else (0.0, ())
+    return OptimizeResult(
+        plan=_to_plan(goal, years, problem.notes),
+        score=score + problem.ag_score(units0),
+        optimal=optimal,
+        nodes=search.nodes,
+        elapsed_ms=(time.perf_counter() - start) * 1000.0,
+        notes=problem.notes,
+    )
+
+
+_CORE, _NEXT = "core", "next"  # iter_plans heap steps besides a year start (None)
+
+
+class _LazyAssignments:
+    """
+    One state's core assignments (_Search.assignments), pulled only as iter_plans
+    reaches them and kept for every partial plan that shares the state.
+    """
+
+    def __init__(self, gen: Iterator[tuple]):
+        self.gen: Optional[Iterator[tuple]] = gen
+        self.items: List[tuple] = []  # (key, bound, picks, units after core, elective slots left)
+
+    def get(self, i: int) -> Optional[tuple]:
+        while len(self.items) <= i and self.gen is not None:
+            nxt = next(self.gen, None)
+            if nxt is None:
+                self.gen = None
+                break
+            key, bound, picks, _, core_units, k = nxt
+            self.items.append((key, bound, picks, core_units, k))
+        return self.items[i] if i < len(self.items) else None
+
+
+def iter_plans(
+    catalog,
+    goal: str,
+    starting_math: str,
+    science_pathway: str,
+    completed_courses,
+    prefer_spanish: bool = False,
+    objective: Optional[Objective] = None,
+    preferred=None,
+    max_options: int = MAX_SLOT_OPTIONS,
+) -> Iterator[RankedPlan]:
+    """
+    Yields distinct valid plans, best score first, computing only as far as the
+    caller consumes (take K with itertools.islice or top_plans).
+
+    Best-first search over partial plans: a heap entry is "year yi starts with
+    these courses used", "year yi's next core assignment is due" or "year yi's
+    core slots are chosen, electives not yet filled", keyed by its optimistic
+    bound, so a finished plan is only popped once nothing left in the heap can
+    beat it. A year's core assignments come one at a time from the optimizer's
+    lazy best-first generator, so the first plan costs about one optimizer dive.
+    Alternatives share their earlier years, and core assignments / elective fills
+    are memoized on the same (year, still-offered courses used, prerequisites met,
+    A-G units) state the optimizer uses. Alternatives differ in their core
+    choices; each year's electives are the optimizer's marginal-gain fill for that
+    state (_Problem.fill_electives), not elective_picker.fill_electives.
+    """
+    p = _Problem(catalog, goal, starting_math, science_pathway, completed_courses, prefer_spanish,
+                 objective or Objective(), preferred, max_options)
+    search = _Search(p, float("inf"))
+    units0 = _initial_units(p)
+    base_score = p.ag_score(units0)
+
+    assignments: Dict[tuple, _LazyAssignments] = {}
+    fills: Dict[tuple, List[str]] = {}
+
+    def core_options(yi, used, units) -> "_LazyAssignments":
+        key = (p.state(yi, used), units)
+        hit = assignments.get(key)
+        if hit is None:
+            hit = assignments[key] = _LazyAssignments(search.assignments(yi, used, units))
+        return hit
+
+    def electives(yi, start, used, core_units, k):
+        key = (p.state(yi, start), used & p.future_titles[yi], core_units, k)
+        hit = fills.get(key)
+        if hit is None:
+            hit = fills[key] = p.fill_electives(yi, k, set(used), list(core_units), p.cover(start))[0]
+        return hit
+
+    tie = itertools.count(0, -1)  # among equal keys the newest (deepest) entry first, not a breadth-first sweep
+    heap = [(-p.bound(0, units0), next(tie), 0, p.completed, units0, 0.0, (), None)]
+    seen: Set[tuple] = set()
+    rank = 0
+    while heap:
+        neg, _, yi, used, units, value, years, step = heapq.heappop(heap)
+
+        if step is None and yi == len(GRADES):
+            signature = tuple(frozenset(t for o in c for t in o[0]) | frozenset(e) for c, e in years)
+            if signature in seen:
+                continue
+            seen.add(signature)
+            rank += 1
+            yield RankedPlan(plan=_to_plan(goal, years, p.notes), score=value + base_score, rank=rank)
+            continue
+
+        if step is None or step[0] == _NEXT:
+            # Year yi starts, or its next core assignment is due: pull one assignment and
+            # queue the one after it under this one's key, which bounds all later ones.
+            lazy, i = (core_options(yi, used, units), 0) if step is None else step[1:]
+            item = lazy.get(i)
+            if item is not None:
+                key, bound, picks, core_units, k = item
+                heapq.heappush(heap, (-(value + bound), next(tie), yi, used, units, value, years,
+                                      (_CORE, picks, core_units, k)))
+                heapq.heappush(heap, (-(value + key), next(tie), yi, used, units, value, years, (_NEXT, lazy, i + 1)))
+            continue
+
+        # Core slots chosen for year yi: fill its electives and move on to the next year.
+        _, picks, core_units, k = step
+        taken = used | {t for o in picks for t in o[0]}
+        chosen = electives(yi, used, taken, core_units, k)
+        u = list(core_units)
+        for t in chosen:
+            if p._area(t) >= 0:
+                u[p._area(t)] += 2
+        new_units = tuple(u)
+        gain = (sum(o[1] for o in picks) + sum(p.value(t) for t in chosen)
+                + p.ag_score(new_units) - p.ag_score(units))
+        heapq.heappush(heap, (-(value + gain + p.bound(yi + 1, new_units)), next(tie), yi + 1,
+                              taken | frozenset(chosen), new_units, value + gain,
+                              years + ((picks, tuple(chosen)),), None))
+
+
+def top_plans(catalog, goal: str, starting_math: str, science_pathway: str, completed_courses,
+              k: int = 5, **kwargs) -> List[RankedPlan]:
+    return list(itertools.islice(
+        iter_plans(catalog, goal, starting_math, science_pathway, completed_courses, **kwargs), k))
@@ -0,0 +1,481 @@
+"""
+Long-running planning service: loads the catalog once and answers plan and
+validate requests over local HTTP, on a TCP port or a Unix socket.
+
+    python src/plan_service.py --port 8765 --workers 4
+    python src/plan_service.py --unix /tmp/planner.sock
+
+    POST /plan      body in the data/inputs.json shape (optional "student_id")
+                    -> the batch_planner result record for that student
+    POST /validate  {"plan": plan} or {"plans": [plan, ...]}
+                    -> {"validation_errors": [...]} (one list per plan for "plans")
+    POST /reload    re-reads the catalog CSV and applies the differences in place
+                    (see catalog_reload) -> the diff summary
+    GET  /health    -> counters and limits
+
+Identical in-flight plan requests (same normalized inputs) share one computation.
+Planning and validation run on a bounded process pool forked from the loaded
+catalog, so the event loop only parses requests and writes responses. Beyond
+max_pending distinct jobs, or max_connections open connections, requests are
+refused with 503 and a Retry-After header; bodies over max_body_bytes get 413.
+A reload holds new jobs until the running ones finish, then forks a fresh pool
+from the updated catalog.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import batch_planner
+from catalog_parser import load_catalog
+from catalog_reload import reload_catalog
+from main import CATALOG_PATH, read_settings
+from validator import validate_plans
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _check_titles(value: Any, what: str) -> None:
+    if not isinstance(value, list) or not all(isinstance(c, str) for c in value):
+        raise HttpError(400, f"{what}: expected a list of strings")
+
+
+def _check_plan(plan: Any, what: str = "plan") -> None:
+    if not isinstance(plan, dict) or not isinstance(plan.get("plan"), list):
+        raise HttpError(400, f'{what}: expected {{"plan": [year, ...]}}')
+    for year in plan["plan"]:
+        if not isinstance(year, dict) or "grade" not in year or not isinstance(year.get("courses"), list):
+            raise HttpError(400, f'{what}: each year needs a "grade" and a "courses" list')
+        for slot in year["courses"]:
+            titles = slot if isinstance(slot, list) else [slot]
+            if not all(t is None or isinstance(t, str) for t in titles):
+                raise HttpError(400, f"{what}: a slot is a title, null or a list of titles")
+
+
+def check_plan_inputs(inputs: Dict[str, Any]) -> None:
+    """
+    HttpError 400 unless the /plan fields read_settings uses have the types it expects.
+    """
+    for key in ("goal", "starting_math", "science_pathway"):
+        if key in inputs and not isinstance(inputs[key], str):
+            raise HttpError(400, f"{key}: expected a string")
+    if "completed_courses" in inputs:
+        _check_titles(inputs["completed_courses"], "completed_courses")
+
+
+def check_validate_body(body: Dict[str, Any]) -> None:
+    """
+    HttpError 400 unless body is {"plan": plan} or {"plans": [plan, ...]} with
+    well-formed plans, completed course lists and starting_math values.
+    """
+    if "plans" in body:
+        plans = body["plans"]
+        if not isinstance(plans, list):
+            raise HttpError(400, 'plans: expected a list of plans')
+        for i, plan in enumerate(plans):
+            _check_plan(plan, f"plans[{i}]")
+        completed = body.get("completed_courses")
+        if completed is not None:
+            if not isinstance(completed, list) or len(completed) != len(plans):
+                raise HttpError(400, "completed_courses: expected one list per plan")
+            for i, c in enumerate(completed):
+                _check_titles(c, f"completed_courses[{i}]")
+        starting_math = body.get("starting_math")
+        if starting_math is not None and (not isinstance(starting_math, list) or len(starting_math) != len(plans)
+                                          or not all(m is None or isinstance(m, str) for m in starting_math)):
+            raise HttpError(400, "starting_math: expected one string or null per plan")
+        return
+    if "plan" not in body:
+        raise HttpError(400, 'expected {"plan": ...} or {"plans": [...]}')
+    _check_plan(body["plan"])
+    if "completed_courses" in body:
+        _check_titles(body["completed_courses"], "completed_courses")
+    if body.get("starting_math") is not None and not isinstance(body["starting_math"], str):
+        raise HttpError(400, "starting_math: expected a string")
+
+
+def _validate_record(body: Dict[str, Any]) -> Dict[str, Any]:
+    # Runs in a pool worker, against the worker's catalog.
+    if "plans" in body:
+        return {"validation_errors": validate_plans(body["plans"], batch_planner._CATALOG,
+                                                    body.get("completed_courses"), body.get("starting_math"))}
+    return {"validation_errors": validate_plans([body["plan"]], batch_planner._CATALOG,
+                                                [body.get("completed_courses", ())],
+                                                [body.get("starting_math")])[0]}
+
+
+def request_key(inputs: Dict[str, Any]) -> str:
+    """
+    Coalescing key: the inputs as plan_student reads them, completed courses as a sorted set.
+    """
+    settings = read_settings(inputs)
+    settings["completed_courses"] = sorted({str(c) for c in settings["completed_courses"]})
+    return json.dumps(settings, sort_keys=True, separators=(",", ":"))
+
+
+async def read_message(reader: asyncio.StreamReader, max_body: int) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+    """
+    One HTTP/1.1 message: (start line, lowercased headers, body), or None at EOF.
+    """
+    start = await reader.readline()
+    if not start:
+        return None
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if length > max_body:
+        raise HttpError(413, f"body over {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return start.decode("latin-1").strip(), headers, body
+
+
+def _encode(start: str, payload: Any, headers: Dict[str, str]) -> bytes:
+    body = json.dumps(payload).encode("utf-8")
+    lines = [start, "Content-Type: application/json", f"Content-Length: {len(body)}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+class PlanService:
+    """
+    Holds the loaded catalog, the worker pool, the in-flight table and the limits.
+    """
+
+    def __init__(self, catalog=None, catalog_path: str = CATALOG_PATH, workers: Optional[int] = None,
+                 max_pending: int = 256, max_connections: int = 1024, max_body_bytes: int = 1 << 20,
+                 cache_size: int = 4096, use_threads: bool = False):
+        self.catalog_path = catalog_path
+        self.catalog = catalog if catalog is not None else load_catalog(catalog_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.max_connections = max_connections
+        self.max_body_bytes = max_body_bytes
+        self.cache_size = cache_size
+        self.use_threads = use_threads
+        self._executor: Optional[Executor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending = 0
+        self._running = 0
+        self._connections = 0
+        self._open = asyncio.Event()     # cleared while a reload waits for running jobs
+        self._open.set()
+        self._drained = asyncio.Event()  # set whenever no job is running
+        self._drained.set()
+        self.counters = {"requests": 0, "planned": 0, "validated": 0, "coalesced": 0, "rejected": 0, "errors": 0,
+                         "reloads": 0}
+
+    # --- pool -------------------------------------------------------------------
+
+    def start(self) -> None:
+        # Workers inherit the parent's catalog through fork; see batch_planner.plan_cohort.
+        batch_planner._CATALOG = self.catalog
+        batch_planner._CACHE = batch_planner._make_cache(self.cache_size, None)
+        if self.use_threads:
+            self._executor = ThreadPoolExecutor(self.workers)
+            return
+        method = "fork" if "fork" in mp.get_all_start_methods() else None
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=mp.get_context(method), initializer=batch_planner._init_worker,
+            initargs=(self.catalog_path, self.cache_size, None))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, arg):
+        if self._pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise HttpError(503, f"{self._pending} jobs pending; retry later")
+        self._pending += 1
+        try:
+            await self._open.wait()
+            self._running += 1
+            self._drained.clear()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, arg)
+            finally:
+                self._running -= 1
+                if not self._running:
+                    self._drained.set()
+        finally:
+            self._pending -= 1
+
+    async def reload(self) -> Dict[str, Any]:
+        """
+        Applies the current contents of the catalog CSV to the loaded catalog. New jobs
+        wait until the running ones are done; process workers are then re-forked,
+        since each holds its own copy of the old catalog.
+        """
+        self._open.clear()
+        try:
+            await self._drained.wait()
+            # hashing, parsing and diffing the CSV would stall every connection on the loop
+            diff = await asyncio.get_running_loop().run_in_executor(
+                None, reload_catalog, self.catalog, self.catalog_path)
+            if diff and not self.use_threads and self._executor is not None:
+                self.close()
+                self.start()
+        finally:
+            self._open.set()
+        self.counters["reloads"] += 1
+        return diff.summary()
+
+    # --- requests ---------------------------------------------------------------
+
+    async def plan(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        check_plan_inputs(inputs)
+        key = request_key(inputs)
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.counters["coalesced"] += 1
+            result = await asyncio.shield(fut)
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._inflight[key] = fut
+            try:
+                result = await self._run(batch_planner._plan_record, (0, inputs))
+                fut.set_result(result)
+            except asyncio.CancelledError:
+                fut.cancel()
+                raise
+            except Exception as e:
+                fut.set_exception(e)
+                fut.exception()  # retrieved: waiters re-raise it, nobody else needs to
+                raise
+            finally:
+                del self._inflight[key]
+            self.counters["planned"] += 1
+
+        result = dict(result)
+        if "student_id" in inputs:
+            result["student_id"] = inputs["student_id"]
+        else:
+            result.pop("student_id", None)
+        return result
+
+    async def validate(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        check_validate_body(body)
+        result = await self._run(_validate_record, body)
+        self.counters["validated"] += 1
+        return result
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "catalog": self.catalog_path,
+            "catalog_version": getattr(self.catalog, "version", ""),
+            "courses": len(self.catalog),
+            "workers": self.workers,
+            "pending": self._pending,
+            "inflight": len(self._inflight),
+            "connections": self._connections,
+            "limits": {"max_pending": self.max_pending, "max_connections": self.max_connections,
+                       "max_body_bytes": self.max_body_bytes},
+            **self.counters,
+        }
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Any:
+        routes = {"/plan": "POST", "/validate": "POST", "/reload": "POST", "/health": "GET"}
+        if path not in routes:
+            raise HttpError(404, f"no route {path}")
+        if method != routes[path]:
+            raise HttpError(405, f"{path} expects {routes[path]}")
+        if path == "/health":
+            return self.health()
+        if path == "/reload":
+            return await self.reload()
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HttpError(400, f"invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "expected a JSON object")
+        return await (self.plan(payload) if path == "/plan" else self.validate(payload))
+
+    # --- connections ------------------------------------------------------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections += 1
+        try:
+            if self._connections > self.max_connections:
+                self.counters["rejected"] += 1
+                raise HttpError(503, "too many connections")
+            while True:
+                msg = await read_message(reader, self.max_body_bytes)
+                if msg is None:
+                    break
+                start, headers, body = msg
+                self.counters["requests"] += 1
+                parts = start.split()
+                if len(parts) != 3:
+                    raise HttpError(400, f"bad request line: {start!r}")
+                method, path = parts[0].upper(), parts[1].split("?", 1)[0]
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, payload = 200, await self.dispatch(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                self._respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            self._respond(writer, e.status, {"error": e.message}, False)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # client went away, or the server is shutting down
+        finally:
+            self._connections -= 1
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    @staticmethod
+    def _respond(writer, status: int, payload: Any, keep_alive: bool) -> None:
+        headers = {"Connection": "keep-alive" if keep_alive else "close"}
+        if status == 503:
+            headers["Retry-After"] = "1"
+        writer.write(_encode(f"HTTP/1.1 {status} {_REASONS.get(status, '')}", payload, headers))
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        """
+        Starts the pool and the listener; returns the asyncio Server (caller awaits serve_forever).
+        """
+        if self._executor is None:
+            self.start()
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            return await asyncio.start_unix_server(self.handle, path=unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+class PlanServiceClient:
+    """
+    Minimal asyncio client for PlanService over one keep-alive connection (TCP or Unix socket).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def __aenter__(self) -> "PlanServiceClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def _connect(self) -> None:
+        if self.unix_path:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._reader = self._writer = None
+
+    async def request(self, method: str, path: str, payload: Any = None) -> Tuple[int, Any]:
+        if self._writer is None:
+            await self._connect()
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = f"{method} {path} HTTP/1.1\r\nHost: planner\r\nContent-Type: application/json\r\n" \
+               f"Content-Length: {len(body)}\r\n\r\n"
+        self._writer.write(head.encode("latin-1") + body)
+        await self._writer.drain()
+        msg = await read_message(self._reader, sys.maxsize)
+        if msg is None:
+            await self.close()
+            raise ConnectionError("service closed the connection")
+        start, headers, raw = msg
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return int(start.split()[1]), json.loads(raw or b"null")
+
+    async def plan(self, inputs: Dict[str, Any]) -> Tuple[int, Any]:
+        return await self.request("POST", "/plan", inputs)
+
+    async def validate(self, plan: Dict[str, Any]) -> Tuple[int, Any]:
+        return await self.request("POST", "/validate", {"plan": plan})
+
+    async def reload(self) -> Tuple[int, Any]:
+        return await self.request("POST", "/reload")
+
+    async def health(self) -> Tuple[int, Any]:
+        return await self.request("GET", "/health")
+
+
+async def _serve_forever(service: PlanService, host: str, port: int, unix_path: Optional[str]) -> None:
+    server = await service.serve(host, port, unix_path)
+    where = unix_path or f"http://{host}:{port}"
+    print(f"Planning service on {where} ({service.workers} workers, {len(service.catalog)} courses)")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Long-running planning service")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    ap.add_argument("--catalog", default=CATALOG_PATH)
+    ap.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    ap.add_argument("--threads", action="store_true", help="use a thread pool instead of processes")
+    ap.add_argument("--max-pending", type=int, default=256, help="queued or running jobs before 503")
+    ap.add_argument("--max-connections", type=int, default=1024)
+    ap.add_argument("--max-body", type=int, default=1 << 20, help="largest request body in bytes")
+    ap.add_argument("--cache-size", type=int, default=4096, help="plans kept per worker; 0 disables caching")
+    args = ap.parse_args(argv)
+
+    service = PlanService(catalog_path=args.catalog, workers=args.workers, max_pending=args.max_pending,
+                          max_connections=args.max_connections, max_body_bytes=args.max_body,
+                          cache_size=args.cache_size, use_threads=args.threads)
+    try:
+        asyncio.run(_serve_forever(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
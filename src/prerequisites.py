@@ -0,0 +1,431 @@
+"""
+Course prerequisite graph for one catalog.
+
+Edges come from three places:
+
+- the planner's own tracks. Consecutive steps of MATH_TRACK (geometry -> algebra2
+  -> precalc -> ...) and the Spanish levels, in SPANISH_LEVEL_KEYWORDS order, become
+  edges. A step's courses are the titles its keyword chain matches within the
+  subject, and a course takes the most advanced step that matches it. A step
+  repeated within a track (the ap_stats filler) orders nothing.
+- numbered sequences: "Korean III" requires a "Korean II", compared on the
+  normalized title without honors and parenthesized markers. Courses a track
+  already classifies keep only their track edges.
+- the catalog's Considerations notes: "Prerequisite: Chemistry or Honors
+  Chemistry", "Requires completion of Algebra II". Each name resolves to the
+  title with the same normalized name, after dropping leading words ("a grade
+  of C or better in Algebra II"). Names that do not resolve are ignored.
+
+Science tracks are alternative orders (finish_fast starts with earth science,
+standard_stem with biology), not prerequisites, so they add no edges.
+
+A prerequisite is a group of alternatives: Spanish III needs any level-II Spanish
+course, and a course with several groups needs one of each. Nodes are numbered per
+connected component, so each group is a small bitmask local to its component, and
+coverage (what a student has satisfied) is a {component: mask} dict. An
+eligibility check is then one AND per group. closure[n] is everything taking n
+satisfies: n, each of its groups in full, and theirs in turn.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from catalog_parser import CatalogCache
+from course_resolver import normalize_title, resolver_for
+from language_pathway import SPANISH_LEVEL_KEYWORDS
+from math_pathway import MATH_STEP_KEYWORDS, MATH_TRACK
+
+
+Coverage = Dict[int, int]  # component -> mask of satisfied nodes
+
+# kind -> (step keyword chains, tracks, subject section keyword)
+TRACKS = {
+    "math": (MATH_STEP_KEYWORDS, MATH_TRACK, "math"),
+    "spanish": (SPANISH_LEVEL_KEYWORDS, {"levels": list(SPANISH_LEVEL_KEYWORDS)}, "language"),
+}
+
+_LEVELS = ("i", "ii", "iii", "iv", "v", "vi")
+_UNRANKED = frozenset(["honors"])
+
+_NOTE_RE = re.compile(
+    r"\b(?:pre-?requisites?|pre-?reqs?|requires|required|after|completion of|"
+    r"must have (?:completed|taken|passed))\b[\s:]*(?:(?:successful )?completion of\s+)?(.+)", re.IGNORECASE)
+_CLAUSE_RE = re.compile(r"[.;\n]")
+_OR_RE = re.compile(r"\s+or\s+|/", re.IGNORECASE)
+_AND_RE = re.compile(r",|\s+and\s+|&", re.IGNORECASE)
+
+
+def _track_edges(tracks: Dict[str, List[str]]) -> Tuple[Dict[str, Set[str]], List[str]]:
+    # step -> steps right before it in some track; and the ordered steps, most advanced first
+    before: Dict[str, Set[str]] = {}
+    filler = {s for seq in tracks.values() for s in seq if seq.count(s) > 1}
+    for seq in tracks.values():
+        steps = [s for s in seq if s not in filler and s != "none"]
+        for a, b in zip(steps, steps[1:]):
+            before.setdefault(b, set()).add(a)
+            before.setdefault(a, set())
+    depth: Dict[str, int] = {}
+
+    def rank(s: str, seen=()) -> int:
+        if s not in depth:
+            depth[s] = 1 + max((rank(p, seen + (s,)) for p in before[s] if p not in seen), default=-1)
+        return depth[s]
+
+    return before, sorted(before, key=lambda s: -rank(s))
+
+
+def _sequence_key(normalized: str) -> Optional[Tuple[str, int]]:
+    # "honors korean iv (xp)" -> ("korean", 3); None unless the title ends in its only level numeral
+    words = [w for w in normalized.split() if not w.startswith("(") and w not in _UNRANKED]
+    levels = [i for i, w in enumerate(words) if w in _LEVELS]
+    if len(levels) != 1 or levels[0] != len(words) - 1 or levels[0] == 0:
+        return None
+    return " ".join(words[:-1]), _LEVELS.index(words[-1])
+
+
+def _note_names(notes: str) -> List[List[str]]:
+    # "Prerequisite: Chemistry or Honors Chemistry, Algebra II" -> [["Chemistry", "Honors Chemistry"], ["Algebra II"]]
+    groups: List[List[str]] = []
+    for clause in _CLAUSE_RE.split(notes):
+        m = _NOTE_RE.search(clause)
+        if m:
+            for part in _AND_RE.split(m.group(1)):
+                names = [n.strip() for n in _OR_RE.split(part) if n.strip()]
+                if names:
+                    groups.append(names)
+    return groups
+
+
+def _resolve_name(name: str, exact: Dict[str, int], titles: List[str]) -> Optional[str]:
+    words = normalize_title(name).split()
+    for i in range(len(words)):
+        hit = exact.get(" ".join(words[i:]))
+        if hit is not None:
+            return titles[hit]
+    return None
+
+
+class PrereqGraph:
+    """
+    Prerequisite groups and transitive closures of one catalog's courses, as
+    per-component bitmasks. Titles outside the graph have no prerequisites.
+    """
+
+    def __init__(self, requires: Dict[str, List[Set[str]]], steps: Dict[Tuple[str, str], List[str]]):
+        # components: union-find over every title that appears in an edge
+        parent: Dict[str, str] = {}
+
+        def find(t: str) -> str:
+            while parent.setdefault(t, t) != t:
+                parent[t] = parent[parent[t]]
+                t = parent[t]
+            return t
+
+        # A track step hands the same group object to all its courses: handle each group once.
+        seen: Set[int] = set()
+        for t, groups in requires.items():
+            for group in groups:
+                if group:
+                    parent[find(next(iter(group)))] = find(t)
+                if id(group) not in seen:
+                    seen.add(id(group))
+                    first = find(next(iter(group))) if group else None
+                    for p in group:
+                        parent[find(p)] = first
+
+        self.titles: List[str] = []
+        self.node: Dict[str, int] = {}
+        self.comp: List[int] = []
+        self.bit: List[int] = []
+        self.members: List[List[int]] = []  # component -> nodes, by local bit
+        roots: Dict[str, int] = {}
+        for t in parent:
+            c = roots.setdefault(find(t), len(roots))
+            if c == len(self.members):
+                self.members.append([])
+            n = len(self.titles)
+            self.titles.append(t)
+            self.node[t] = n
+            self.comp.append(c)
+            self.bit.append(1 << len(self.members[c]))
+            self.members[c].append(n)
+
+        masks_of: Dict[int, int] = {}
+
+        def mask(titles: Set[str]) -> int:
+            m = masks_of.get(id(titles))
+            if m is None:
+                m = 0
+                for t in titles:
+                    m |= self.bit[self.node[t]]
+                masks_of[id(titles)] = m
+            return m
+
+        self.requires: List[Tuple[int, ...]] = [()] * len(self.titles)
+        group_nodes: Dict[Tuple[int, int], List[int]] = {}  # (component, mask) -> nodes
+        for t, groups in requires.items():
+            n = self.node[t]
+            masks = set()
+            for g in groups:
+                m = mask(g)
+                if m and (self.comp[n], m) not in group_nodes:
+                    group_nodes[(self.comp[n], m)] = [self.node[p] for p in g]
+                masks.add(m)
+            self.requires[n] = tuple(sorted(masks))
+
+        # Each node absorbs the closures of its groups. A whole track step shares one
+        # group, so a group's closure is computed once per pass; visiting nodes in
+        # dependency order makes one pass enough, and the loop only repeats for cyclic notes.
+        order = self._dependency_order([[p for m in self.requires[n] for p in group_nodes[(self.comp[n], m)]]
+                                        for n in range(len(self.titles))])
+        self.closure: List[int] = [0] * len(self.titles)
+        changed = True
+        while changed:
+            changed = False
+            done: Dict[Tuple[int, int], int] = {}
+            for n in order:
+                c = self.bit[n]
+                for m in self.requires[n]:
+                    key = (self.comp[n], m)
+                    g = done.get(key)
+                    if g is None:
+                        g = m
+                        for p in group_nodes[key]:
+                            g |= self.closure[p]
+                        done[key] = g
+                    c |= g
+                if c != self.closure[n]:
+                    self.closure[n] = c
+                    changed = True
+
+        self.steps = {key: [self.node[t] for t in titles if t in self.node] for key, titles in steps.items()}
+        self.step_of = {n: key for key, nodes in self.steps.items() for n in nodes}  # node -> (kind, step)
+
+    @staticmethod
+    def _dependency_order(below: List[List[int]]) -> List[int]:
+        order: List[int] = []
+        state = [0] * len(below)  # 0 new, 1 open, 2 done
+        for root in range(len(below)):
+            if state[root]:
+                continue
+            stack = [(root, iter(below[root]))]
+            state[root] = 1
+            while stack:
+                n, it = stack[-1]
+                for p in it:
+                    if not state[p]:
+                        state[p] = 1
+                        stack.append((p, iter(below[p])))
+                        break
+                else:
+                    stack.pop()
+                    state[n] = 2
+                    order.append(n)
+        return order
+
+    def __contains__(self, title) -> bool:
+        return title in self.node
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def edges(self) -> int:
+        return sum(bin(m).count("1") for ms in self.requires for m in ms)
+
+    # --- coverage ---------------------------------------------------------------------
+
+    def cover(self, titles: Iterable, base: Optional[Coverage] = None) -> Coverage:
+        """
+        Coverage after taking titles (on top of base, which is not modified).
+        """
+        covered = dict(base) if base else {}
+        node, comp, closure = self.node, self.comp, self.closure
+        for t in titles:
+            n = node.get(t)
+            if n is not None:
+                c = comp[n]
+                covered[c] = covered.get(c, 0) | closure[n]
+        return covered
+
+    def placement(self, kind: str, step: str) -> Coverage:
+        """
+        Coverage of a student placed into a track step: whatever its courses require,
+        but not the courses themselves.
+        """
+        covered: Coverage = {}
+        for n in self.steps.get((kind, step), ()):
+            c = self.comp[n]
+            covered[c] = covered.get(c, 0) | (self.closure[n] & ~self.bit[n])
+        return covered
+
+    # --- checks -----------------------------------------------------------------------
+
+    def eligible(self, title, covered: Coverage) -> bool:
+        """
+        Every prerequisite group of title has a satisfied member.
+        """
+        n = self.node.get(title)
+        if n is None:
+            return True
+        have = covered.get(self.comp[n], 0)
+        for m in self.requires[n]:
+            if not have & m:
+                return False
+        return True
+
+    def redundant(self, title, covered: Coverage) -> bool:
+        """
+        title is already satisfied: taken, or implied by a course taken after it.
+        """
+        n = self.node.get(title)
+        return n is not None and bool(covered.get(self.comp[n], 0) & self.bit[n])
+
+    def allows(self, title, covered: Coverage) -> bool:
+        n = self.node.get(title)
+        if n is None:
+            return True
+        have = covered.get(self.comp[n], 0)
+        if have & self.bit[n]:
+            return False
+        for m in self.requires[n]:
+            if not have & m:
+                return False
+        return True
+
+    def gate(self, exclude, covered: Coverage):
+        """
+        exclude plus what covered rules out. An exclude with a gated method (a
+        plan_codec.CourseSet) merges it in itself; anything else is wrapped in a PrereqGate.
+        """
+        gated = getattr(exclude, "gated", None)
+        if gated is not None:
+            return gated(self, covered)
+        return PrereqGate(exclude, self, covered)
+
+    def missing(self, title, covered: Coverage) -> List[List[str]]:
+        """
+        The unmet prerequisite groups of title, as title lists.
+        """
+        n = self.node.get(title)
+        if n is None:
+            return []
+        have = covered.get(self.comp[n], 0)
+        return [self._titles(self.comp[n], m) for m in self.requires[n] if not have & m]
+
+    def _titles(self, comp: int, mask: int) -> List[str]:
+        return [self.titles[n] for i, n in enumerate(self.members[comp]) if mask >> i & 1]
+
+    def signature(self, covered: Coverage) -> Tuple[Tuple[int, int], ...]:
+        """
+        Hashable form of a coverage, for memo keys.
+        """
+        return tuple(sorted((c, m) for c, m in covered.items() if m))
+
+
+class PrereqGate:
+    """
+    An exclude set that also excludes every course the prerequisites rule out for
+    the given coverage (not yet eligible, or already satisfied). Pickers use it where
+    they take a plain set: `title in gate`, `gate | more`.
+    """
+
+    __slots__ = ("exclude", "graph", "covered")
+
+    def __init__(self, exclude, graph: PrereqGraph, covered: Coverage):
+        self.exclude = exclude
+        self.graph = graph
+        self.covered = covered
+
+    def __contains__(self, title) -> bool:
+        return title in self.exclude or not self.graph.allows(title, self.covered)
+
+    def __or__(self, other) -> "PrereqGate":
+        return PrereqGate(self.exclude | set(other), self.graph, self.covered)
+
+    def add(self, title) -> None:
+        # only on a gate made by |, which owns its exclude set
+        self.exclude.add(title)
+
+
+# --- extraction ---------------------------------------------------------------------------
+
+
+def _preceding(s: str, before: Dict[str, Set[str]], members: Dict[str, Set[str]]) -> Set[str]:
+    # courses of the steps right before s; a step this catalog has no course for is
+    # skipped (no Spanish IV: AP follows III)
+    out: Set[str] = set()
+    for p in before[s]:
+        out |= members[p] or _preceding(p, before, members)
+    return out
+
+
+def _classify(catalog, titles: List[str]) -> Tuple[Dict[str, Tuple[str, str]], Dict[str, List[Set[str]]]]:
+    # title -> (kind, step), and the track prerequisite groups of every classified title
+    step_of: Dict[str, Tuple[str, str]] = {}
+    requires: Dict[str, List[Set[str]]] = {}
+    for kind, (keywords, tracks, section) in TRACKS.items():
+        before, steps = _track_edges(tracks)
+        members: Dict[str, Set[str]] = {s: set() for s in steps}
+        for t in titles:
+            if t in step_of or section not in catalog[t].subject_section.lower():
+                continue
+            low = t.lower()
+            for s in steps:
+                if any(all(k in low for k in kw) for kw in keywords.get(s, [])):
+                    step_of[t] = (kind, s)
+                    members[s].add(t)
+                    break
+        for s in steps:
+            group = _preceding(s, before, members)
+            if group:
+                for t in members[s]:
+                    requires[t] = [group]
+    return step_of, requires
+
+
+def build_prereq_graph(catalog) -> PrereqGraph:
+    titles = list(catalog.keys())
+    step_of, requires = _classify(catalog, titles)
+
+    resolver = resolver_for(catalog)
+    by_level: Dict[Tuple[str, int], Set[str]] = {}
+    keyed: List[Tuple[str, Tuple[str, int]]] = []
+    for t, norm in zip(resolver.titles, resolver.normalized):
+        key = _sequence_key(norm)
+        if key is not None:
+            by_level.setdefault(key, set()).add(t)
+            keyed.append((t, key))
+    for t, (stem, level) in keyed:
+        prev = by_level.get((stem, level - 1))
+        if prev and t not in step_of:
+            requires.setdefault(t, []).append(prev)
+
+    for t in titles:
+        notes = catalog[t].notes
+        if not notes:
+            continue
+        for names in _note_names(notes):
+            group = {p for p in (_resolve_name(n, resolver._exact, resolver.titles) for n in names)
+                     if p is not None and p != t}
+            if group:
+                requires.setdefault(t, []).append(group)
+
+    steps: Dict[Tuple[str, str], List[str]] = {}
+    for t, key in step_of.items():
+        steps.setdefault(key, []).append(t)
+    graph = PrereqGraph(requires, steps)
+    graph.catalog = catalog
+    return graph
+
+
+_GRAPHS = CatalogCache("prereq_graph")
+
+
+def graph_for(catalog) -> PrereqGraph:
+    """
+    The shared PrereqGraph of a loaded catalog (built on first use).
+    """
+    g = _GRAPHS.get(catalog)
+    if g is None:
+        g = _GRAPHS[catalog] = build_prereq_graph(catalog)
+    return g
+
@@ -0,0 +1,448 @@
+"""
+Incremental replanning: apply a small input change to an existing greedy plan.
+
+fill_core_slots is a fixed sequence of steps per grade (English, Math, Science,
+Spanish, the grade's preferred cores, electives), and each step returns the
+first of an ordered candidate list that is not excluded. A grade therefore only
+needs replanning if one of its steps changed (a new math or science track step,
+a new Spanish level, goal, ...) or if a course that entered or left the exclude
+set sits at or before one of its picks. Math, science, Spanish and the electives
+also skip courses the prerequisite graph rules out, so a grade whose prerequisite
+coverage changed is rerun as well. Every other grade keeps its row as is, and the result
+is the same plan a full rerun of plan_student would produce.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from ag_audit import AgCounter, row_units
+from catalog_parser import CatalogCache
+from course_resolver import resolver_for
+from elective_picker import fill_electives
+from language_pathway import detect_spanish_next_level
+from main import plan_student, read_settings
+from math_pathway import MATH_TRACK, chain_candidates, math_steps
+from pathway_tables import step_candidates
+from prerequisites import graph_for
+from rules_pusd import preferred_titles
+from science_pathway import science_step
+from skeleton_builder import build_empty_plan
+from validator import validate_plan_offered_by_grade, validate_plan_prerequisites
+
+
+GRADES = [9, 10, 11, 12]
+SLOTS_PER_YEAR = 6
+
+# Which courses a step must skip: none, the courses already planned, or those plus completed ones.
+_NO_EXCLUDE, _USED, _USED_COMPLETED = 0, 1, 2
+
+
+def _titles(entry) -> Sequence[str]:
+    if entry is None:
+        return ()
+    return entry if isinstance(entry, (list, tuple)) else (entry,)
+
+
+@dataclass
+class _Step:
+    name: str
+    options: List[Any]          # ordered candidates: titles, or (a, b) semester pairs
+    exclude: int
+    gated: bool = False         # also skips courses the prerequisite gate rules out (math, science, Spanish)
+
+    def pick(self, used: Set[str], completed: Set[str], gate=None) -> Any:
+        if self.exclude == _NO_EXCLUDE:
+            o = self.options[0] if self.options else None
+        else:
+            completed = completed if self.exclude == _USED_COMPLETED else ()
+            gate = gate if self.gated else ()
+            for o in self.options:
+                if isinstance(o, tuple):
+                    if not any(t in used or t in completed for t in o):
+                        return list(o)
+                elif o not in used and o not in completed and o not in gate:
+                    return o
+            return None
+        return list(o) if isinstance(o, tuple) else o
+
+    def position(self, picked) -> int:
+        if picked is None:
+            return len(self.options)
+        return self.options.index(tuple(picked) if isinstance(picked, list) else picked)
+
+
+@dataclass
+class _Year:
+    grade: int
+    steps: List[_Step]
+    picks: List[Any]                # one per step (None if the step found nothing)
+    electives: List[str]
+    courses: List[Any]              # the grade row
+    remaining: int                  # slots left to electives after the core steps
+    errors: List[str]               # validator errors of this row
+    ag: Tuple[int, ...]             # A-G units of this row (ag_audit)
+    core_titles: Set[str] = field(default_factory=set, repr=False)
+    _sensitive: Optional[Tuple[FrozenSet[str], FrozenSet[str]]] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.core_titles = {t for p in self.picks for t in _titles(p)}
+
+    def sensitive(self) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """
+        Per exclude rule (used only, used + completed): the candidates at or before each pick.
+        Changing whether any other course is excluded cannot change a core pick.
+        """
+        if self._sensitive is None:
+            self._sensitive = tuple(
+                frozenset(t for st, p in zip(self.steps, self.picks) if st.exclude == rule
+                          for o in st.options[:st.position(p) + 1] for t in _titles(o))
+                for rule in (_USED, _USED_COMPLETED))
+        return self._sensitive
+
+
+@dataclass
+class ReplanResult:
+    plan: dict
+    inputs: Dict[str, Any]
+    completed_courses: Set[str]
+    validation_errors: List[str]
+    changed_slots: List[Tuple[int, int]]    # (grade, slot index) whose course differs from the old plan
+    replanned_grades: List[int]             # grades whose steps were rerun; the rest were reused as is
+    full_replan: bool = False               # the old plan could not be replayed (e.g. optimizer plans)
+    ag: Optional[AgCounter] = None          # A-G units of the new plan and completed courses
+
+
+def apply_delta(inputs: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    New inputs: delta keys replace old ones; "add_completed_courses" /
+    "remove_completed_courses" edit the completed list in place of replacing it.
+    """
+    out = dict(inputs)
+    for k, v in delta.items():
+        if k not in ("add_completed_courses", "remove_completed_courses"):
+            out[k] = v
+    completed = list(out.get("completed_courses", []))
+    removed = set(delta.get("remove_completed_courses", []))
+    if removed:
+        completed = [c for c in completed if c not in removed]
+    for c in delta.get("add_completed_courses", []):
+        if c not in completed:
+            completed.append(c)
+    out["completed_courses"] = completed
+    return out
+
+
+def _flips(candidates, old_state, new_state) -> Dict[str, bool]:
+    """
+    Courses among candidates excluded in one run but not the other -> excluded in the new run.
+    A state is the tuple of sets whose union is that run's exclude set.
+    """
+    out = {}
+    for t in candidates:
+        now = before = False
+        for s in new_state:
+            if t in s:
+                now = True
+                break
+        for s in old_state:
+            if t in s:
+                before = True
+                break
+        if now != before:
+            out[t] = now
+    return out
+
+
+def _electives_affected(catalog, grade, old_electives, flips: Dict[str, bool]) -> bool:
+    # fill_electives takes the first non-excluded match of each keyword group, then the first
+    # offered titles: excluding a course it did not pick changes nothing, while a newly
+    # allowed course offered in this grade might now be picked.
+    for t, now in flips.items():
+        if now and t in old_electives:
+            return True
+        if not now and t in catalog and catalog[t].offered_in(grade):
+            return True
+    return False
+
+
+class Replanner:
+    """
+    Per-catalog replanning state: candidate lists and the step trace of recent plans
+    are kept and shared by every edit of every student.
+    """
+
+    def __init__(self, catalog, max_traces: int = 4096):
+        self.catalog = catalog
+        self.max_traces = max_traces
+        self._reset()
+
+    def _reset(self) -> None:
+        self.version = getattr(self.catalog, "version", "")
+        self.prereqs = graph_for(self.catalog)
+        self._steps: Dict[tuple, _Step] = {}
+        self._grade_steps: Dict[tuple, List[_Step]] = {}
+        self._traces: "OrderedDict[tuple, List[_Year]]" = OrderedDict()
+
+    def _sync(self) -> None:
+        # After a catalog_reload the candidate lists, the prerequisite graph and every
+        # trace (its rows, errors and A-G counts) may name courses that are gone.
+        if getattr(self.catalog, "version", "") != self.version:
+            self._reset()
+
+    # --- inputs ----------------------------------------------------------------
+
+    def resolve(self, completed_raw) -> Set[str]:
+        return resolver_for(self.catalog).resolve(completed_raw)
+
+    # --- steps -----------------------------------------------------------------
+
+    def _step(self, key, name, exclude, make, gated=False) -> _Step:
+        step = self._steps.get(key)
+        if step is None:
+            step = self._steps[key] = _Step(name, make(), exclude, gated)
+        return step
+
+    def _placement(self, settings):
+        track = MATH_TRACK.get(settings["starting_math"], MATH_TRACK["honors_geometry"])
+        return self.prereqs.placement("math", track[0])
+
+    def _offered(self, title, grade) -> bool:
+        return title in self.catalog and self.catalog[title].offered_in(grade)
+
+    def _preferred(self, g, name, key) -> _Step:
+        return self._step(("preferred", g, key), name, _USED,
+                          lambda: [t for t in preferred_titles(self.catalog)[key] if self._offered(t, g)])
+
+    def _pair(self, g, name, key) -> _Step:
+        return self._step(("pair", g, key), name, _USED,
+                          lambda: [tuple(p) for p in preferred_titles(self.catalog)[key]
+                                   if all(self._offered(t, g) for t in p)])
+
+    def steps_for(self, g: int, settings: Dict[str, Any], completed: Set[str]) -> List[_Step]:
+        """
+        fill_core_slots' core steps for grade g, in order. The same step definitions
+        give the identical list, so an unchanged grade is recognized by identity.
+        """
+        yi = GRADES.index(g)
+        level = detect_spanish_next_level(completed) if settings["prefer_spanish"] else None
+        key = (g, math_steps(self.catalog, settings["starting_math"])[yi],
+               science_step(settings["science_pathway"], yi), level)
+        steps = self._grade_steps.get(key)
+        if steps is None:
+            steps = self._grade_steps[key] = self._make_steps(*key)
+        return steps
+
+    def _make_steps(self, g: int, math_step: Optional[str], sci_step: str, level: Optional[str]) -> List[_Step]:
+        cat = self.catalog
+        steps = [self._step(("english", g), "English", _NO_EXCLUDE, lambda: chain_candidates(cat, g, [["english"]]))]
+        if math_step is not None:
+            steps.append(self._step(("math", g, math_step), "Math", _USED_COMPLETED,
+                                    lambda: step_candidates(cat, "math", math_step, g), gated=True))
+        if sci_step != "none":
+            steps.append(self._step(("science", g, sci_step), "Science", _USED_COMPLETED,
+                                    lambda: step_candidates(cat, "science", sci_step, g), gated=True))
+        if level:
+            steps.append(self._step(("spanish", g, level), "Spanish", _USED_COMPLETED,
+                                    lambda: step_candidates(cat, "spanish", level, g), gated=True))
+
+        if g == 9:
+            steps.append(self._pair(g, "Ethnic Studies / Health", "g9_ethnic_health_pair"))
+            steps.append(self._preferred(g, "PE Course 1", "g9_pe"))
+        elif g == 10:
+            steps.append(self._preferred(g, "World History", "g10_world"))
+            steps.append(self._step(("pe2", g), "PE Course 2", _NO_EXCLUDE,
+                                    lambda: [t for t in chain_candidates(cat, g, [["pe course 2"]])
+                                             if t.lower().startswith("pe course 2")]))
+        elif g == 11:
+            steps.append(self._preferred(g, "U.S. History", "g11_us"))
+        elif g == 12:
+            steps.append(self._pair(g, "Civics / Economics", "g12_civics_econ_pair"))
+        return steps
+
+    # --- replay ----------------------------------------------------------------
+
+    @staticmethod
+    def _place(picks: List[Any]) -> List[Any]:
+        # The same slot placement as fill_core_slots: each pick takes the next slot.
+        slots: List[Any] = [None] * SLOTS_PER_YEAR
+        idx = 0
+        for p in picks:
+            if p is not None and idx < SLOTS_PER_YEAR:
+                slots[idx] = p
+                idx += 1
+        return slots
+
+    def _year(self, g, steps, picks, electives, core) -> _Year:
+        courses = list(core)
+        rest = iter(electives)
+        for i in range(SLOTS_PER_YEAR):
+            if courses[i] is None:
+                courses[i] = next(rest, None)
+        return _Year(g, steps, picks, list(electives), courses, core.count(None),
+                     validate_plan_offered_by_grade({"plan": [{"grade": g, "courses": courses}]}, self.catalog),
+                     row_units(self.catalog, courses))
+
+    def _trace(self, plan: dict, settings, completed) -> Optional[List[_Year]]:
+        """
+        How each grade row of plan came about: from the replan that produced it, or else
+        by replaying the core steps against it (cheap: the candidate lists are cached).
+        None if the plan is not what fill_core_slots makes for these inputs.
+        """
+        key = self._trace_key(settings, completed)
+        trace = self._traces.get(key)
+        if trace is not None and all(y.courses == row["courses"] for y, row in zip(trace, plan["plan"])):
+            self._traces.move_to_end(key)
+            return trace
+
+        trace = []
+        used: Set[str] = set()
+        placed = self._placement(settings)
+        for row in plan["plan"]:
+            g = row["grade"]
+            steps = self.steps_for(g, settings, completed)
+            gate = self.prereqs.gate((), self.prereqs.cover(used | completed, placed))
+            picks = []
+            for st in steps:
+                picks.append(st.pick(used, completed, gate))
+                used.update(_titles(picks[-1]))
+            core = self._place(picks)
+            year = self._year(g, steps, picks, [row["courses"][i] for i in range(SLOTS_PER_YEAR) if core[i] is None],
+                              core)
+            if year.courses != list(row["courses"]):
+                return None
+            used.update(year.electives)
+            trace.append(year)
+        self._remember(key, trace)
+        return trace
+
+    @staticmethod
+    def _trace_key(settings, completed) -> tuple:
+        return (settings["goal"], settings["starting_math"], settings["science_pathway"],
+                settings["prefer_spanish"], frozenset(completed))
+
+    def _remember(self, key, trace: List[_Year]) -> None:
+        self._traces[key] = trace
+        self._traces.move_to_end(key)
+        while len(self._traces) > self.max_traces:
+            self._traces.popitem(last=False)
+
+    def _untouched(self, old: _Year, d_used, d_completed, used_old, old_c, used_new, new_c) -> bool:
+        """
+        True if no course whose exclusion differs between the runs can change a pick of this grade.
+        """
+        if not d_used and not d_completed:
+            return True
+        used_only, with_completed = old.sensitive()
+        if any(t in used_only for t in d_used):
+            return False
+        for t, now in _flips(d_used | d_completed, (used_old, old_c), (used_new, new_c)).items():
+            if t in with_completed or (now and t in old.electives) or (not now and self._offered(t, old.grade)):
+                return False
+        return True
+
+    def replan(self, plan: dict, inputs: Dict[str, Any], delta: Dict[str, Any]) -> ReplanResult:
+        """
+        plan: the greedy plan previously made for inputs. Returns the plan for
+        apply_delta(inputs, delta), rerunning only the grades the change can affect.
+        """
+        self._sync()
+        new_inputs = apply_delta(inputs, delta)
+        old_s, new_s = read_settings(inputs), read_settings(new_inputs)
+        old_c, new_c = self.resolve(old_s["completed_courses"]), self.resolve(new_s["completed_courses"])
+        if old_s["optimize"] or new_s["optimize"]:
+            return self._full(plan, new_inputs)
+        old_trace = self._trace(plan, old_s, old_c)
+        if old_trace is None:
+            return self._full(plan, new_inputs)
+
+        d_completed = old_c ^ new_c
+        same_electives = (old_s["goal"], old_s["prefer_spanish"]) == (new_s["goal"], new_s["prefer_spanish"])
+        used_old: Set[str] = set()
+        used_new: Set[str] = set()
+        trace: List[_Year] = []
+        replanned: List[int] = []
+        graph = self.prereqs
+        placed_old, placed_new = self._placement(old_s), self._placement(new_s)
+
+        for old in old_trace:
+            g = old.grade
+            steps = self.steps_for(g, new_s, new_c)
+            d_used = used_old ^ used_new
+            old_core = old.core_titles
+            covered = graph.cover(used_new | new_c, placed_new)
+            same_cover = graph.signature(covered) == graph.signature(graph.cover(used_old | old_c, placed_old))
+
+            if steps is old.steps and same_electives and same_cover and self._untouched(
+                    old, d_used, d_completed, used_old, old_c, used_new, new_c):
+                year = old
+            else:
+                # Rerun the grade's core steps: each is a short scan of a cached candidate list.
+                replanned.append(g)
+                picks = []
+                used = set(used_new)
+                gate = graph.gate((), covered)
+                for st in steps:
+                    picks.append(st.pick(used, new_c, gate))
+                    used.update(_titles(picks[-1]))
+                core = self._place(picks)
+
+                # The elective fill is the expensive step: keep it unless a course whose
+                # exclusion flipped could now be picked, or one it picked is now excluded.
+                new_core = used - used_new
+                flips = _flips(d_used | d_completed | old_core | new_core,
+                               (used_old, old_core, old_c), (used_new, new_core, new_c))
+                remaining = core.count(None)
+                if same_electives and same_cover and remaining == old.remaining and not _electives_affected(
+                        self.catalog, g, old.electives, flips):
+                    electives = old.electives
+                else:
+                    electives = fill_electives(self.catalog, g, remaining, new_s["goal"], new_s["prefer_spanish"],
+                                               graph.gate(used | new_c, covered))
+                if steps is old.steps and picks == old.picks and electives == old.electives:
+                    year = old
+                else:
+                    year = self._year(g, steps, picks, electives, core)
+
+            used_old |= old_core
+            used_old.update(old.electives)
+            used_new |= year.core_titles
+            used_new.update(year.electives)
+            trace.append(year)
+
+        new_plan = build_empty_plan(new_s["goal"])
+        errors: List[str] = []
+        ag = AgCounter(self.catalog)
+        ag.add_completed(new_c)
+        for row, y in zip(new_plan["plan"], trace):
+            row["courses"] = list(y.courses)
+            errors.extend(y.errors)
+            ag.add_units(y.ag)  # reused rows keep their counts
+        errors.extend(validate_plan_prerequisites(new_plan, self.catalog, new_c, new_s["starting_math"]))
+        self._remember(self._trace_key(new_s, new_c), trace)
+
+        changed = [(o.grade, i) for o, n in zip(old_trace, trace) if o is not n
+                   for i, (a, b) in enumerate(zip(o.courses, n.courses)) if a != b]
+        return ReplanResult(plan=new_plan, inputs=new_inputs, completed_courses=new_c,
+                            validation_errors=errors, changed_slots=changed, replanned_grades=replanned, ag=ag)
+
+    def _full(self, plan: dict, new_inputs: Dict[str, Any]) -> ReplanResult:
+        ag = AgCounter(self.catalog)
+        new_plan, completed, errors = plan_student(new_inputs, self.catalog, audit=ag)
+        changed = [(o["grade"], i) for o, n in zip(plan["plan"], new_plan["plan"])
+                   for i, (a, b) in enumerate(zip(o["courses"], n["courses"])) if a != b]
+        return ReplanResult(plan=new_plan, inputs=new_inputs, completed_courses=completed,
+                            validation_errors=errors, changed_slots=changed,
+                            replanned_grades=list(GRADES), full_replan=True, ag=ag)
+
+
+_REPLANNERS = CatalogCache("replanner")
+
+
+def replan(catalog, plan: dict, inputs: Dict[str, Any], delta: Dict[str, Any]) -> ReplanResult:
+    """
+    Convenience wrapper keeping one Replanner per loaded catalog.
+    """
+    r = _REPLANNERS.get(catalog)
+    if r is None or r.version != getattr(catalog, "version", ""):
+        r = _REPLANNERS[catalog] = Replanner(catalog)
+    return r.replan(plan, inputs, delta)
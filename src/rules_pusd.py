@@ -43,3 +43,25 @@ PREFERRED_TITLES = {
     "g11_us": ["U.S. History (P)", "AP U.S. History (HP)"],
     "g12_civics_econ_pair": [("Civics (P) (sem)", "Economics (P) (sem)"), ("Civics (P) (sem)", "AP Macroeconomics (HP) (sem)")],
 }
+
+
+
+def preferred_titles(catalog) -> Dict[str, list]:
+    """
+    The school-specific preferred titles attached to catalog (see catalog_registry),
+    else the PUSD defaults above.
+    """
+    return getattr(catalog, "preferred_titles", None) or PREFERRED_TITLES
+
+
+# Which PREFERRED_TITLES entry feeds each grade-specific CORE_SLOTS rule.
+PREFERRED_FOR_SLOT: Dict[Tuple[int, str], str] = {
+    (9, "Ethnic Studies / Health (semester pair)"): "g9_ethnic_health_pair",
+    (9, "PE Course 1"): "g9_pe",
+    (10, "World History"): "g10_world",
+    (11, "U.S. History"): "g11_us",
+    (12, "Civics / Economics (semester pair)"): "g12_civics_econ_pair",
+}
+
+# UC "a-g" subject requirements, in years (area letter -> minimum years).
+AG_REQUIRED_YEARS: Dict[str, int] = {"A": 2, "B": 4, "C": 3, "D": 2, "E": 2, "F": 1, "G": 1}
@@ -0,0 +1,171 @@
+"""
+What-if sweep: one student's plan under every combination of starting_math
+(MATH_TRACK keys), science_pathway (SCI_TRACK keys) and prefer_spanish.
+
+    python src/scenario_sweep.py data/inputs.json --workers 4 -o data/outputs/scenarios.json
+
+The catalog is loaded and the completed courses resolved once. The grid is
+walked in chains, one per starting_math, ordered so that consecutive scenarios
+differ in a single input; each scenario is a replanner delta from the previous
+one, so the cached candidate lists and every grade and elective fill the change
+cannot affect are reused (see replanner). Chains fan out over a process pool;
+where workers cannot be forked, a caller's catalog reaches them as a snapshot.
+A greedy chain takes milliseconds, so the pool only pays off for inputs with
+"optimize": true, where every scenario is a full optimizer search.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ag_audit import AgCounter
+from catalog_parser import AG_AREAS, load_catalog
+from catalog_snapshot import catalog_from_snapshot, open_snapshot, write_snapshot
+from inputs_loader import resolve_completed_courses
+from main import CATALOG_PATH, load_inputs, plan_student, read_settings
+from math_pathway import MATH_TRACK
+from replanner import replan
+from science_pathway import SCI_TRACK
+
+
+_CATALOG = None  # per-process catalog; inherited through fork or loaded by _init_worker
+
+
+@dataclass
+class Scenario:
+    starting_math: str
+    science_pathway: str
+    prefer_spanish: bool
+    plan: dict
+    validation_errors: List[str]
+    ag_years: Dict[str, float]      # A-G area -> years earned by the plan and completed courses (ag_audit)
+    ag_missing: Dict[str, float]    # areas below the UC minimum -> years still missing
+
+
+def scenario_chains(math_tracks: Sequence[str], science_pathways: Sequence[str],
+                    spanish: Sequence[bool]) -> List[List[Dict[str, Any]]]:
+    """
+    One chain per starting_math; within it prefer_spanish alternates direction per
+    science pathway, so each scenario changes one input of the one before.
+    """
+    chains = []
+    for m in math_tracks:
+        chain = []
+        for i, sci in enumerate(science_pathways):
+            for sp in (spanish if i % 2 == 0 else list(reversed(spanish))):
+                chain.append({"starting_math": m, "science_pathway": sci, "prefer_spanish": sp})
+        chains.append(chain)
+    return chains
+
+
+def _init_worker(catalog_path: str, snapshot: Optional[str] = None, version: str = "",
+                 preferred_titles: Optional[dict] = None) -> None:
+    global _CATALOG
+    if _CATALOG is not None:
+        return
+    if snapshot is None:
+        _CATALOG = load_catalog(catalog_path)
+        return
+    _CATALOG = catalog_from_snapshot(open_snapshot(snapshot))
+    _CATALOG.version = version
+    _CATALOG.preferred_titles = preferred_titles
+
+
+def _run_chain(item: Tuple[Dict[str, Any], List[Dict[str, Any]]]) -> List[Scenario]:
+    inputs, chain = item
+    out: List[Scenario] = []
+    plan, prev = None, None
+    for scenario in chain:
+        if plan is None:
+            prev = {**inputs, **scenario}
+            ag = AgCounter(_CATALOG)
+            plan, _, errors = plan_student(prev, _CATALOG, audit=ag)
+        else:
+            r = replan(_CATALOG, plan, prev, scenario)
+            prev, plan, errors, ag = r.inputs, r.plan, r.validation_errors, r.ag
+        out.append(Scenario(plan=plan, validation_errors=errors, ag_years=ag.years(), ag_missing=ag.missing(),
+                            **scenario))
+    return out
+
+
+def sweep(
+    inputs: Dict[str, Any],
+    catalog=None,
+    catalog_path: str = CATALOG_PATH,
+    workers: int = 1,
+    math_tracks: Optional[Sequence[str]] = None,
+    science_pathways: Optional[Sequence[str]] = None,
+    spanish: Sequence[bool] = (True, False),
+) -> List[Scenario]:
+    """
+    Every scenario of the grid for inputs (the data/inputs.json shape), in grid
+    order: starting_math, then science_pathway, then prefer_spanish. Each plan is
+    the one plan_student makes for inputs with those three keys replaced.
+    """
+    global _CATALOG
+    _CATALOG = catalog if catalog is not None else load_catalog(catalog_path)
+    math_tracks = list(math_tracks or MATH_TRACK)
+    science_pathways = list(science_pathways or SCI_TRACK)
+    spanish = list(spanish)
+
+    completed = resolve_completed_courses(_CATALOG, read_settings(inputs)["completed_courses"])
+    base = {**inputs, "completed_courses": sorted(str(c) for c in completed)}
+    items = [(base, chain) for chain in scenario_chains(math_tracks, science_pathways, spanish)]
+
+    if workers <= 1 or len(items) <= 1:
+        chains = [_run_chain(item) for item in items]
+    else:
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else None)
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+            initargs: Tuple[Any, ...] = (catalog_path,)
+            if catalog is not None and ctx.get_start_method() != "fork":
+                # The caller's catalog may differ from catalog_path (reloaded, school rules).
+                snap = write_snapshot(catalog, os.path.join(tmp, "catalog.snap"), catalog.version)
+                initargs = (catalog_path, snap, catalog.version, catalog.preferred_titles)
+            with ctx.Pool(min(workers, len(items)), initializer=_init_worker, initargs=initargs) as pool:
+                chains = pool.map(_run_chain, items, chunksize=1)
+
+    by_key = {(s.starting_math, s.science_pathway, s.prefer_spanish): s for chain in chains for s in chain}
+    return [by_key[(m, sci, sp)] for m in math_tracks for sci in science_pathways for sp in spanish]
+
+
+def format_table(scenarios: Sequence[Scenario]) -> str:
+    """
+    One line per scenario: inputs, validation error count, A-G years per area and the shortfall.
+    """
+    areas = list(AG_AREAS)
+    lines = [f"{'starting_math':<17}{'science':<15}{'spanish':<9}{'errors':>6}  "
+             + "".join(f"{a:>5}" for a in areas) + "  missing"]
+    for s in scenarios:
+        missing = ", ".join(f"{a} {n:g}" for a, n in s.ag_missing.items()) or "-"
+        lines.append(f"{s.starting_math:<17}{s.science_pathway:<15}{'yes' if s.prefer_spanish else 'no':<9}"
+                     f"{len(s.validation_errors):>6}  " + "".join(f"{s.ag_years.get(a, 0):>5g}" for a in areas)
+                     + f"  {missing}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Compare one student's plans across the scenario grid")
+    ap.add_argument("inputs", nargs="?", default="data/inputs.json")
+    ap.add_argument("--catalog", default=CATALOG_PATH)
+    ap.add_argument("--workers", type=int, default=1, help="processes for the scenario chains")
+    ap.add_argument("-o", "--out", help="optional JSON with every scenario's plan and errors")
+    args = ap.parse_args(argv)
+
+    scenarios = sweep(load_inputs(args.inputs), catalog_path=args.catalog, workers=args.workers)
+    print(format_table(scenarios))
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump([asdict(s) for s in scenarios], f, indent=2)
+        print("Saved:", args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from math_pathway import find_course_by_keywords
+from math_pathway import find_course_by_chain
 
 SCI_TRACK = {
     "standard_stem": ["biology", "chemistry", "physics", "ap_science"],
@@ -6,35 +6,31 @@ SCI_TRACK = {
     "delayed":       ["none", "biology", "chemistry", "physics"],
 }
 
-def pick_science_for_grade(catalog, grade, science_pathway, year_index, exclude):
-    track = SCI_TRACK.get(science_pathway, SCI_TRACK["standard_stem"])
-    desired = track[year_index]
+_AP_SCIENCE = [["ap", "bio"], ["ap", "chem"], ["ap", "physics"]]
 
-    if desired == "none":
-        return None
+# Fallback keyword chains per track step ("none" means no science that year).
+SCI_STEP_KEYWORDS = {
+    "biology": [["bio"], ["biology"]],
+    "chemistry": [["chem"], ["chemistry"]],
+    "physics": [["phys"], ["physics"]],
+    "earth": [["earth"], ["environment"]],
+    "ap_science": _AP_SCIENCE,
+    "optional": _AP_SCIENCE,
+}
 
-    if desired == "biology":
-        return (find_course_by_keywords(catalog, grade, ["bio"], exclude) or
-                find_course_by_keywords(catalog, grade, ["biology"], exclude))
 
-    if desired == "chemistry":
-        return (find_course_by_keywords(catalog, grade, ["chem"], exclude) or
-                find_course_by_keywords(catalog, grade, ["chemistry"], exclude))
+def science_step(science_pathway, year_index):
+    track = SCI_TRACK.get(science_pathway, SCI_TRACK["standard_stem"])
+    return track[year_index]
 
-    if desired == "physics":
-        return (find_course_by_keywords(catalog, grade, ["phys"], exclude) or
-                find_course_by_keywords(catalog, grade, ["physics"], exclude))
 
-    if desired == "earth":
-        return (find_course_by_keywords(catalog, grade, ["earth"], exclude) or
-                find_course_by_keywords(catalog, grade, ["environment"], exclude))
+def pick_science_for_grade(catalog, grade, science_pathway, year_index, exclude):
+    desired = science_step(science_pathway, year_index)
 
-    if desired == "ap_science":
-        return (find_course_by_keywords(catalog, grade, ["ap", "bio"], exclude) or
-                find_course_by_keywords(catalog, grade, ["ap", "chem"], exclude) or
-                find_course_by_keywords(catalog, grade, ["ap", "physics"], exclude))
+    if desired == "none":
+        return None
 
-    # optional
-    return (find_course_by_keywords(catalog, grade, ["ap", "bio"], exclude) or
-            find_course_by_keywords(catalog, grade, ["ap", "chem"], exclude) or
-            find_course_by_keywords(catalog, grade, ["ap", "physics"], exclude))
+    table = getattr(catalog, "pathways", None)
+    if table is not None:
+        return table.first(catalog, "science", desired, grade, exclude)
+    return find_course_by_chain(catalog, grade, SCI_STEP_KEYWORDS.get(desired, _AP_SCIENCE), exclude)
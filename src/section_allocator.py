@@ -0,0 +1,362 @@
+"""
+Cohort elective allocation under per-course seat capacities.
+
+fill_electives gives every student the same first-offered electives, so a cohort
+run piles hundreds of students into one course. allocate_electives instead fills
+the open elective slots of a whole cohort's plans at once, grade by grade:
+
+- every student ranks their candidates with elective_picker.rank_electives
+  (the fill_electives priority lists, then anything offered);
+- core courses take their seats first;
+- a min-cost flow assigns the remaining seats. Its objective is the total
+  preference rank, with ties broken toward the smaller sum of squared ranks,
+  so nobody gets a list of last choices while others get all first choices.
+
+Students with the same candidate list and the same number of open slots are
+merged into one flow node, so the network stays small for large cohorts. Each
+node's seats are then dealt round-robin. Students who fared worse in earlier
+grades are dealt first, and no student gets the same course twice.
+
+Slots the flow could not fill take any offered course that still has seats.
+Otherwise they stay None, and validation reports them.
+
+Capacities are seats per course and grade year, read from JSON
+({"Robotics (P)": 60, "AP Computer Science (HP)": {"11": 35, "12": 35}}) or a
+CSV with title,seats[,grade] columns. Courses not listed are unlimited unless
+default_seats is given.
+
+    python src/batch_planner.py cohort.jsonl --capacities data/capacities.json
+"""
+import csv
+import heapq
+import json
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from elective_picker import rank_electives
+from main import read_settings
+from math_pathway import MATH_TRACK
+from prerequisites import PrereqGate, graph_for
+
+
+GRADES = [9, 10, 11, 12]
+RANK_LIMIT = 24  # candidates per student and grade handed to the flow
+
+Capacities = Dict[str, Dict[Optional[int], int]]  # title -> grade (None = every grade) -> seats
+
+
+def load_capacities(path: str) -> Capacities:
+    caps: Capacities = {}
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                grade = row.get("grade") or None
+                caps.setdefault(row["title"].strip(), {})[int(grade) if grade else None] = int(row["seats"])
+        return caps
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    for title, seats in raw.items():
+        caps[title] = {int(g): int(n) for g, n in seats.items()} if isinstance(seats, dict) else {None: int(seats)}
+    return caps
+
+
+def seats_for(caps: Capacities, title: str, grade: int, default: Optional[int] = None) -> Optional[int]:
+    by_grade = caps.get(title)
+    if by_grade is None:
+        return default
+    return by_grade.get(grade, by_grade.get(None, default))
+
+
+# --- min-cost flow ---------------------------------------------------------------------
+
+
+class MinCostFlow:
+    """
+    Min-cost max-flow by the primal-dual method: Dijkstra over reduced costs finds
+    the next shortest augmenting distance, then a blocking flow (Dinic) over the
+    zero-reduced-cost edges saturates every augmenting path of that length at once.
+    Capacities and costs are non-negative integers.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.adj: List[List[int]] = [[] for _ in range(n)]
+        self.to: List[int] = []
+        self.cap: List[int] = []
+        self.cost: List[int] = []
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> int:
+        e = len(self.to)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.adj[u].append(e)
+        self.adj[v].append(e + 1)
+        return e
+
+    def flow(self, e: int) -> int:
+        return self.cap[e ^ 1]
+
+    def solve(self, s: int, t: int) -> Tuple[int, int]:
+        """
+        Pushes as much flow from s to t as possible at minimum cost; returns (flow, cost).
+        """
+        n, to, cap, cost, adj = self.n, self.to, self.cap, self.cost, self.adj
+        h = [0] * n  # potentials: reduced costs cost[e] + h[u] - h[v] stay >= 0
+        total_flow = total_cost = 0
+        while True:
+            dist = [None] * n
+            dist[s] = 0
+            heap = [(0, s)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                hu = h[u]
+                for e in adj[u]:
+                    if cap[e] > 0:
+                        v = to[e]
+                        nd = d + cost[e] + hu - h[v]
+                        if dist[v] is None or nd < dist[v]:
+                            dist[v] = nd
+                            heapq.heappush(heap, (nd, v))
+            if dist[t] is None:
+                return total_flow, total_cost
+            dt = dist[t]
+            for v in range(n):
+                h[v] += dt if dist[v] is None or dist[v] > dt else dist[v]
+            pushed = self._blocking_flow(s, t, h)
+            total_flow += pushed
+            total_cost += pushed * (h[t] - h[s])
+
+    def _blocking_flow(self, s: int, t: int, h: List[int]) -> int:
+        n, to, cap, cost, adj = self.n, self.to, self.cap, self.cost, self.adj
+        total = 0
+        while True:
+            level = [-1] * n
+            level[s] = 0
+            queue = deque([s])
+            while queue:
+                u = queue.popleft()
+                for e in adj[u]:
+                    v = to[e]
+                    if cap[e] > 0 and level[v] < 0 and cost[e] + h[u] - h[v] == 0:
+                        level[v] = level[u] + 1
+                        queue.append(v)
+            if level[t] < 0:
+                return total
+
+            nxt = [0] * n  # current-arc pointers
+            path: List[int] = []
+            u = s
+            while True:
+                if u == t:
+                    f = min(cap[e] for e in path)
+                    for e in path:
+                        cap[e] -= f
+                        cap[e ^ 1] += f
+                    total += f
+                    path.clear()
+                    u = s
+                    continue
+                arcs = adj[u]
+                while nxt[u] < len(arcs):
+                    e = arcs[nxt[u]]
+                    v = to[e]
+                    if cap[e] > 0 and level[v] == level[u] + 1 and cost[e] + h[u] - h[v] == 0:
+                        break
+                    nxt[u] += 1
+                else:
+                    if u == s:
+                        break
+                    level[u] = -1  # dead end for this round
+                    e = path.pop()
+                    u = to[e ^ 1]
+                    nxt[u] += 1
+                    continue
+                path.append(e)
+                u = v
+
+
+# --- allocation ------------------------------------------------------------------------
+
+
+def _slot_titles(slot) -> List[str]:
+    if slot is None:
+        return []
+    return list(slot) if isinstance(slot, list) else [slot]
+
+
+def _year(plan: Dict[str, Any], grade: int) -> Optional[Dict[str, Any]]:
+    for year in plan.get("plan", []):
+        if year["grade"] == grade:
+            return year
+    return None
+
+
+def _exclude(st: Dict[str, Any], grade: int, graph, placement) -> PrereqGate:
+    # everything already planned or completed, and what prerequisites rule out in grade
+    taken = set(str(c) for c in st.get("completed_courses", ()))
+    earlier = set(taken)
+    for y in st["plan"]["plan"]:
+        for slot in y["courses"]:
+            titles = _slot_titles(slot)
+            taken.update(titles)
+            if y["grade"] < grade:
+                earlier.update(titles)
+    return graph.gate(taken, graph.cover(earlier, placement(st.get("starting_math"))))
+
+
+def allocate_electives(
+    students: Sequence[Dict[str, Any]],
+    catalog,
+    capacities: Capacities,
+    default_seats: Optional[int] = None,
+    limit: int = RANK_LIMIT,
+) -> Dict[str, Any]:
+    """
+    Fills the None slots of every student's plan in place and returns a report.
+    students: {"plan": ..., "completed_courses": [...], "goal": ..., "prefer_spanish": ...,
+    "starting_math": ...} (a batch_planner result merged with its read_settings works).
+    Electives skip courses the student's prerequisites rule out (see prerequisites.py).
+    """
+    started = time.perf_counter()
+    graph = graph_for(catalog)
+    placements: Dict[Any, Dict[int, int]] = {}
+
+    def placement(starting_math):
+        hit = placements.get(starting_math)
+        if hit is None:
+            step = MATH_TRACK.get(starting_math, MATH_TRACK["honors_geometry"])[0]
+            hit = placements[starting_math] = graph.placement("math", step)
+        return hit
+
+    n_units = sum(1 for st in students for year in st["plan"].get("plan", []) for slot in year["courses"]
+                  if slot is None)
+    # cost of rank r: primary the rank, tie-break the squared rank (lexicographic)
+    k = max(1, n_units) * limit * limit + 1
+    rank_cost = [r * k + r * r for r in range(limit)]
+
+    dissatisfaction = [0] * len(students)
+    report: Dict[str, Any] = {"students": len(students), "slots": n_units, "allocated": 0, "fallback": 0,
+                              "unfilled": 0, "rank_histogram": [0] * limit, "over_capacity": [], "usage": {}}
+
+    for g in GRADES:
+        used: Dict[str, int] = {}
+        for st in students:
+            year = _year(st["plan"], g)
+            for slot in (year["courses"] if year else []):
+                for t in _slot_titles(slot):
+                    used[t] = used.get(t, 0) + 1
+
+        def free(title: str, g=g, used=used) -> Optional[int]:
+            seats = seats_for(capacities, title, g, default_seats)
+            return None if seats is None else seats - used.get(title, 0)
+
+        for title, n in used.items():
+            left = free(title)
+            if left is not None and left < 0:
+                report["over_capacity"].append({"title": title, "grade": g, "seats": left + n, "assigned": n})
+
+        # students with the same open slots and candidates share one flow node
+        groups: Dict[Tuple[int, Tuple[str, ...]], List[int]] = {}
+        for i, st in enumerate(students):
+            year = _year(st["plan"], g)
+            need = sum(1 for slot in year["courses"] if slot is None) if year else 0
+            if not need:
+                continue
+            cands = rank_electives(catalog, g, st.get("goal", "cs"), bool(st.get("prefer_spanish", True)),
+                                   _exclude(st, g, graph, placement), limit)
+            groups.setdefault((need, tuple(cands)), []).append(i)
+
+        assigned = _solve_grade(groups, free, rank_cost, n_units)
+
+        for (need, cands), members in groups.items():
+            # the worst served so far are dealt first; input order breaks ties
+            members = sorted(members, key=lambda i: (-dissatisfaction[i], i))
+            items = assigned[(need, cands)]
+            for pos, i in enumerate(members):
+                mine = items[pos::len(members)]
+                slots = _year(students[i]["plan"], g)["courses"]
+                for rank in mine:
+                    title = cands[rank]
+                    slots[slots.index(None)] = title
+                    used[title] = used.get(title, 0) + 1
+                    dissatisfaction[i] += rank
+                    report["rank_histogram"][rank] += 1
+                    report["allocated"] += 1
+
+        # leftovers: anything offered that still has seats
+        index = getattr(catalog, "index", None)
+        offered = list(index.iter_grade(g)) if index is not None else [t for t, c in catalog.items()
+                                                                      if c.offered_in(g)]
+        for i, st in enumerate(students):
+            year = _year(st["plan"], g)
+            if year is None or None not in year["courses"]:
+                continue
+            taken = _exclude(st, g, graph, placement)
+            for t in offered:
+                if None not in year["courses"]:
+                    break
+                left = free(t)
+                if t in taken or (left is not None and left <= 0):
+                    continue
+                year["courses"][year["courses"].index(None)] = t
+                taken.exclude.add(t)
+                used[t] = used.get(t, 0) + 1
+                dissatisfaction[i] += limit
+                report["fallback"] += 1
+            report["unfilled"] += year["courses"].count(None)
+
+        for title, n in used.items():
+            seats = seats_for(capacities, title, g, default_seats)
+            if seats is not None:
+                report["usage"].setdefault(title, {})[g] = [n, seats]
+
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def _solve_grade(groups, free, rank_cost: List[int], n_units: int) -> Dict[Tuple, List[int]]:
+    """
+    One grade's flow: source -> student group (open slots) -> course (one seat per
+    student) -> sink (free seats). Returns, per group, the ranks of the seats it got,
+    best first, each repeated once per student taking it.
+    """
+    courses: Dict[str, int] = {}
+    for _, cands in groups:
+        for t in cands:
+            courses.setdefault(t, len(courses))
+    keys = list(groups)
+    s, t_node = 0, 1 + len(keys) + len(courses)
+    net = MinCostFlow(t_node + 1)
+    group_edges: List[List[Tuple[int, int]]] = []
+    for gi, key in enumerate(keys):
+        need, cands = key
+        size = len(groups[key])
+        net.add_edge(s, 1 + gi, need * size, 0)
+        group_edges.append([(rank, net.add_edge(1 + gi, 1 + len(keys) + courses[title], size, rank_cost[rank]))
+                            for rank, title in enumerate(cands)])
+    for title, ci in courses.items():
+        left = free(title)
+        net.add_edge(1 + len(keys) + ci, t_node, n_units if left is None else max(0, left), 0)
+
+    net.solve(s, t_node)
+    return {key: [rank for rank, e in group_edges[gi] for _ in range(net.flow(e))] for gi, key in enumerate(keys)}
+
+
+def allocate_results(results: Sequence[Dict[str, Any]], records: Iterable[Dict[str, Any]], catalog,
+                     capacities: Capacities, default_seats: Optional[int] = None) -> Dict[str, Any]:
+    """
+    allocate_electives over batch_planner results (planned with "fill_electives": false),
+    paired with the input records they came from.
+    """
+    students = []
+    for result, record in zip(results, records):
+        if result.get("ok"):
+            settings = read_settings(record)
+            students.append({"plan": result["plan"], "completed_courses": result["completed_courses"],
+                             "goal": settings["goal"], "prefer_spanish": settings["prefer_spanish"],
+                             "starting_math": settings["starting_math"]})
+    return allocate_electives(students, catalog, capacities, default_seats)
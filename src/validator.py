@@ -1,5 +1,20 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
 from catalog_parser import Course
+from math_pathway import MATH_TRACK
+from prerequisites import Coverage, PrereqGraph, graph_for
+
+
+SLOTS_PER_YEAR = 6
+EMPTY_SLOT = -2     # course id of a None slot
+UNKNOWN_COURSE = -1  # course id of a title not in the catalog
+_PAIR = -3           # placeholder while semester pairs are flattened
+NO_GRADE = -1        # row_grade of a grade that is not an int: offered in nothing, as in Course.offered_in
+
+# _prerequisite_problems kinds
+_COVERED, _LATE, _MISSING = "covered", "late", "missing"
 
 
 def validate_plan_offered_by_grade(plan_json: Dict[str, Any], catalog: Dict[str, Course]) -> List[str]:
@@ -21,7 +36,239 @@ def validate_plan_offered_by_grade(plan_json: Dict[str, Any], catalog: Dict[str,
                 if t not in catalog:
                     errors.append(f"Grade {grade}: course not found in catalog: '{t}'")
                 else:
-                    if grade not in catalog[t].allowed_grades:
+                    if not catalog[t].offered_in(grade):
                         errors.append(f"Grade {grade}: course '{t}' not offered in grade {grade}")
 
     return errors
+
+
+def _math_placement(graph: PrereqGraph, starting_math: Optional[str], years: Sequence[Tuple[int, List[int]]]
+                    ) -> Coverage:
+    # What the student's math placement supplies: the first step of starting_math's
+    # track or, when that is not known, the step of the plan's first math course (a
+    # track may start after grade 9, see math_pathway.math_steps; none: no placement).
+    if starting_math is not None:
+        return graph.placement("math", MATH_TRACK.get(starting_math, MATH_TRACK["honors_geometry"])[0])
+    for g, nodes in years:
+        for n in nodes:
+            step = graph.step_of.get(n)
+            if step is not None and step[0] == "math":
+                return graph.placement(*step)
+    return {}
+
+
+def _prerequisite_problems(graph: PrereqGraph, years: Iterable[Tuple[int, List[int]]], covered: Coverage,
+                           placed: Coverage) -> Iterator[Tuple[int, int, str, int]]:
+    """
+    (grade, node, _COVERED, 0) for a course the completed courses or earlier grades
+    already cover; (grade, node, _LATE, prerequisite node) for one planned no later
+    than a prerequisite the plan itself schedules; (grade, node, _MISSING, group mask)
+    for a prerequisite group met by none of the completed courses, earlier grades
+    and math placement (placed). years: (grade, graph nodes) in grade order.
+    """
+    years = list(years)
+    first: Dict[int, int] = {}
+    for g, nodes in years:
+        for n in nodes:
+            first.setdefault(n, g)
+    bit, comp, closure = graph.bit, graph.comp, graph.closure
+    covered = dict(covered)
+    for g, nodes in years:
+        for n in nodes:
+            have = covered.get(comp[n], 0)
+            if have & bit[n]:
+                yield g, n, _COVERED, 0
+            for m in graph.requires[n]:
+                if not have & m:
+                    late = next((p for p in graph.members[comp[n]] if m & bit[p] and first.get(p, -1) >= g), None)
+                    if late is not None:
+                        yield g, n, _LATE, late
+                    elif not placed.get(comp[n], 0) & m:
+                        yield g, n, _MISSING, m
+        for n in nodes:
+            covered[comp[n]] = covered.get(comp[n], 0) | closure[n]
+
+
+def validate_plan_prerequisites(plan_json: Dict[str, Any], catalog, completed: Iterable = (),
+                                starting_math: Optional[str] = None) -> List[str]:
+    """
+    Prerequisite errors (see prerequisites.py): a course planned in the same or an
+    earlier grade than a prerequisite the plan schedules, one whose prerequisite neither
+    the completed courses, earlier grades nor the math placement meet, or one already
+    covered by the completed courses or earlier grades (a repeat, or a level below one
+    already taken). Without starting_math the placement is that of the plan's first
+    math course. Grade rows whose grade is not a grade number are left out (they fail
+    validate_plan_offered_by_grade).
+    """
+    graph = graph_for(catalog)
+    if not len(graph):
+        return []
+    years = []
+    graded = (y for y in plan_json.get("plan", []) if isinstance(y["grade"], int) and 0 <= y["grade"] < 16)
+    for year in sorted(graded, key=lambda y: y["grade"]):
+        nodes = [graph.node[t] for slot in year["courses"] if slot is not None
+                 for t in (slot if isinstance(slot, list) else [slot]) if t in graph.node]
+        years.append((year["grade"], nodes))
+    errors: List[str] = []
+    covered = graph.cover(str(c) for c in completed)
+    for g, n, kind, p in _prerequisite_problems(graph, years, covered, _math_placement(graph, starting_math, years)):
+        t = graph.titles[n]
+        if kind == _COVERED:
+            errors.append(f"Grade {g}: course '{t}' is already covered by completed or earlier courses")
+        elif kind == _LATE:
+            errors.append(f"Grade {g}: course '{t}' is planned no later than its prerequisite '{graph.titles[p]}'")
+        else:
+            names = " or ".join(f"'{x}'" for x in graph._titles(graph.comp[n], p))
+            errors.append(f"Grade {g}: course '{t}' is missing its prerequisite {names}")
+    return errors
+
+
+class PlanBatch:
+    """
+    Many plans flattened into integer arrays: one entry per course of every slot
+    (semester pairs give one entry per course) and one row per grade row.
+    """
+
+    def __init__(self, n_plans: int, course: np.ndarray, row: np.ndarray,
+                 row_plan: np.ndarray, row_grade: np.ndarray, row_len: np.ndarray, units: np.ndarray):
+        self.n_plans = n_plans
+        self.course = course        # int32, entry -> catalog row, UNKNOWN_COURSE or EMPTY_SLOT
+        self.row = row              # int32, entry -> grade row
+        self.units = units          # int8, entry -> half-years of credit (2; 1 per course of a semester pair)
+        self.row_plan = row_plan    # int32, grade row -> plan index
+        self.row_grade = row_grade  # int64, grade row -> grade
+        self.row_len = row_len      # int32, grade row -> number of slots
+
+
+def _course_ids(catalog) -> Tuple[Dict[Any, int], np.ndarray]:
+    # title -> catalog row (None -> EMPTY_SLOT), and the grade bitmask of each row
+    store = getattr(catalog, "store", None)
+    if store is not None:
+        titles, masks = store.titles, np.asarray(store.grade_masks, dtype=np.uint16)
+    else:
+        titles = list(catalog)
+        masks = np.fromiter((sum(1 << g for g in range(16) if catalog[t].offered_in(g)) for t in titles),
+                            dtype=np.uint16, count=len(titles))
+    ids: Dict[Any, int] = {t: i for i, t in enumerate(titles)}
+    ids[None] = EMPTY_SLOT
+    return ids, masks
+
+
+def encode_plans(plans: Sequence[Dict[str, Any]], ids: Dict[Any, int]) -> PlanBatch:
+    flat: List[Any] = []
+    row_plan: List[int] = []
+    row_grade: List[int] = []
+    row_len: List[int] = []
+    for p, plan_json in enumerate(plans):
+        for year in plan_json.get("plan", []):
+            slots = year["courses"]
+            flat.extend(slots)
+            row_plan.append(p)
+            g = year["grade"]
+            row_grade.append(g if isinstance(g, int) else NO_GRADE)  # "9" or 9.0 is no grade
+            row_len.append(len(slots))
+
+    get = ids.get
+    course = np.array([get(t, UNKNOWN_COURSE) if type(t) is not list else _PAIR for t in flat], dtype=np.int32)
+    row = np.repeat(np.arange(len(row_len), dtype=np.int32), row_len)
+    units = np.full(len(course), 2, dtype=np.int8)
+
+    # Semester pairs: one entry per course, all on the pair's grade row.
+    pairs = np.flatnonzero(course == _PAIR)
+    if len(pairs):
+        pair_slots = [flat[i] for i in pairs.tolist()]
+        members = [t for slot in pair_slots for t in slot]
+        sizes = np.fromiter(map(len, pair_slots), dtype=np.int64, count=len(pair_slots))
+        keep = course != _PAIR
+        course = np.concatenate([course[keep], np.array([get(t, UNKNOWN_COURSE) for t in members], dtype=np.int32)])
+        row = np.concatenate([row[keep], np.repeat(row[pairs], sizes)])
+        units = np.concatenate([units[keep], np.repeat((2 // np.maximum(sizes, 1)).astype(np.int8), sizes)])
+
+    return PlanBatch(
+        len(plans),
+        course,
+        row,
+        np.asarray(row_plan, dtype=np.int32),
+        np.asarray(row_grade, dtype=np.int64),
+        np.asarray(row_len, dtype=np.int32),
+        units,
+    )
+
+
+def failing_plans(batch: PlanBatch, grade_masks: np.ndarray) -> np.ndarray:
+    """
+    Sorted indices of the plans with at least one validation error.
+    """
+    grade = batch.row_grade[batch.row]
+    ok = (batch.course >= 0) & (grade >= 0) & (grade < 16)
+    offered = np.zeros(len(batch.course), dtype=bool)
+    offered[ok] = (grade_masks[batch.course[ok]].astype(np.int64) >> grade[ok]) & 1 == 1
+    bad_rows = np.concatenate([batch.row[~offered], np.flatnonzero(batch.row_len != SLOTS_PER_YEAR)])
+    return np.unique(batch.row_plan[bad_rows])
+
+
+def prerequisite_failing_plans(batch: PlanBatch, ids: Dict[Any, int], graph: PrereqGraph,
+                               completed: Optional[Sequence[Iterable]] = None,
+                               starting_math: Optional[Sequence[Optional[str]]] = None) -> List[int]:
+    """
+    Sorted indices of the plans with a prerequisite error. Only the entries of
+    courses in the graph on rows with a grade number are looked at, grouped per
+    plan in grade order.
+    """
+    if not len(graph):
+        return []
+    node_of = np.full(max(ids.values(), default=0) + 1, -1, dtype=np.int64)
+    for t, n in graph.node.items():
+        i = ids.get(t)
+        if i is not None and i >= 0:
+            node_of[i] = n
+    sel = np.flatnonzero(batch.course >= 0)
+    sel = sel[node_of[batch.course[sel]] >= 0]
+    grade = batch.row_grade[batch.row[sel]]
+    sel = sel[(grade >= 0) & (grade < 16)]
+    if not len(sel):
+        return []
+    rows = batch.row[sel]
+    sel = sel[np.lexsort((batch.row_grade[rows], batch.row_plan[rows]))]
+    rows = batch.row[sel]
+    plan_of = batch.row_plan[rows].tolist()
+    grade_of = batch.row_grade[rows].tolist()
+    node = node_of[batch.course[sel]].tolist()
+
+    failing: List[int] = []
+    start = 0
+    while start < len(node):
+        p = plan_of[start]
+        years: List[Tuple[int, List[int]]] = []
+        end = start
+        while end < len(node) and plan_of[end] == p:
+            if not years or years[-1][0] != grade_of[end]:
+                years.append((grade_of[end], []))
+            years[-1][1].append(node[end])
+            end += 1
+        covered = graph.cover(str(c) for c in completed[p]) if completed else {}
+        placed = _math_placement(graph, starting_math[p] if starting_math else None, years)
+        if next(_prerequisite_problems(graph, years, covered, placed), None) is not None:
+            failing.append(p)
+        start = end
+    return failing
+
+
+def validate_plans(plans: Sequence[Dict[str, Any]], catalog, completed: Optional[Sequence[Iterable]] = None,
+                   starting_math: Optional[Sequence[Optional[str]]] = None) -> List[List[str]]:
+    """
+    validate_plan_offered_by_grade plus validate_plan_prerequisites for many plans at
+    once, in input order; completed, starting_math: each plan's, if known.
+    Existence, offered-by-grade, empty-slot and slot-count checks run on the encoded
+    batch with NumPy; messages are only built for the plans that fail. plans may be
+    a plan_codec.PlanArray of the same catalog, which is already encoded.
+    """
+    ids, grade_masks = _course_ids(catalog)
+    batch = plans.to_batch() if hasattr(plans, "to_batch") else encode_plans(plans, ids)
+    errors: List[List[str]] = [[] for _ in range(len(plans))]
+    for i in failing_plans(batch, grade_masks).tolist():
+        errors[i] = validate_plan_offered_by_grade(plans[i], catalog)
+    for i in prerequisite_failing_plans(batch, ids, graph_for(catalog), completed, starting_math):
+        errors[i] = errors[i] + validate_plan_prerequisites(plans[i], catalog, completed[i] if completed else (),
+                                                            starting_math[i] if starting_math else None)
+    return errors
@@ -0,0 +1,36 @@
+import csv
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+DATA = os.path.join(ROOT, "data")
+CATALOG_CSV = os.path.join(DATA, "foothill_catalog.csv")
+
+
+def copy_catalog_csv(directory) -> str:
+    path = os.path.join(str(directory), "catalog.csv")
+    shutil.copy(CATALOG_CSV, path)
+    return path
+
+
+def edit_catalog_csv(path: str, edit) -> None:
+    """
+    Rewrites the catalog CSV at path with edit(rows) applied; rows are lists of cells.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    rows = edit(rows)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    from catalog_parser import load_catalog
+
+    return load_catalog(CATALOG_CSV, use_snapshot=False)
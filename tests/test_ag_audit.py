@@ -0,0 +1,86 @@
+"""
+The incremental A-G counters match a full rescan of the plan: as plan_student
+fills it (with or without a plan cache), as slots are edited afterwards, and
+for a whole cohort audited at once.
+"""
+import random
+import re
+
+import pytest
+
+from ag_audit import AgCounter, audit_plan, audit_plans
+from catalog_parser import AG_AREAS
+from main import plan_student
+from math_pathway import MATH_TRACK
+from plan_cache import PlanCache
+from plan_codec import PlanArray
+from science_pathway import SCI_TRACK
+
+
+def _rescan(plan, catalog, completed=()):
+    # area from the catalog's A-G column text; a full year is 2 units, each half of a pair 1
+    units = [0] * len(AG_AREAS)
+
+    def credit(title, n):
+        m = re.search(r"Area ([A-G])", catalog[title].ag) if title in catalog else None
+        if m:
+            units[AG_AREAS.index(m.group(1))] += n
+
+    for t in completed:
+        credit(t, 2)
+    for year in plan["plan"]:
+        for slot in year["courses"]:
+            if isinstance(slot, list):
+                for t in slot:
+                    credit(t, 2 // len(slot))
+            elif slot is not None:
+                credit(slot, 2)
+    return units
+
+
+def _students(catalog, seed, n):
+    rng = random.Random(seed)
+    pool = list(catalog)[:80] + ["Spanish 1", "Spanish 2", "Algebra 2", "hon geometry"]
+    for _ in range(n):
+        yield {"goal": rng.choice(["cs", "cs", "other"]), "starting_math": rng.choice(list(MATH_TRACK)),
+               "science_pathway": rng.choice(list(SCI_TRACK)), "prefer_spanish": rng.random() < 0.5,
+               "optimize": rng.random() < 0.1, "completed_courses": rng.sample(pool, rng.randint(0, 4))}
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_counters_match_rescan(catalog, cached):
+    cache = PlanCache(512) if cached else None
+    for inputs in _students(catalog, 0, 3000 if not cached else 1000):
+        counter = AgCounter(catalog)
+        plan, completed, _ = plan_student(inputs, catalog, cache, audit=counter)
+        assert counter.units == _rescan(plan, catalog, completed), inputs
+    if cached:
+        assert cache.hits
+
+
+def test_edits_keep_counters_exact(catalog):
+    rng = random.Random(1)
+    titles = list(catalog)
+    for inputs in _students(catalog, 2, 50):
+        plan, completed, _ = plan_student(inputs, catalog)
+        counter = audit_plan(plan, catalog, completed)
+        for _ in range(20):
+            year = rng.choice(plan["plan"])
+            k = rng.randrange(len(year["courses"]))
+            new = rng.choice([None, rng.choice(titles), [rng.choice(titles), rng.choice(titles)], "Nope"])
+            counter.swap(year["courses"][k], new)
+            year["courses"][k] = new
+            assert counter.units == _rescan(plan, catalog, completed)
+        years = counter.years()
+        assert all(years[a] * 2 == n for a, n in zip(AG_AREAS, counter.units))
+
+
+def test_cohort_audit_matches_per_plan(catalog):
+    plans, completed = [], []
+    for inputs in _students(catalog, 3, 300):
+        plan, done, _ = plan_student(inputs, catalog)
+        plans.append(plan)
+        completed.append(sorted(done))
+    units = audit_plans(plans, catalog, completed)
+    assert units.tolist() == [_rescan(p, catalog, c) for p, c in zip(plans, completed)]
+    assert audit_plans(PlanArray.from_plans(plans, catalog), catalog, completed).tolist() == units.tolist()
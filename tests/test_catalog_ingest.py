@@ -0,0 +1,82 @@
+"""
+Parsing a catalog CSV in byte ranges and merging them gives the CourseStore
+build_store gives for the whole file, wherever the ranges are cut: inside a
+section, next to a header, around quoted newlines and repeated titles. The
+ingest writes snapshots load_catalog reads back as the same catalog.
+"""
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from catalog_ingest import ingest_catalogs, merge_parts, parse_range, scan_csv
+from catalog_parser import build_store, load_catalog, read_catalog_rows
+from catalog_snapshot import csv_digest, snapshot_path
+from conftest import copy_catalog_csv, edit_catalog_csv
+
+
+def _store_fields(store):
+    return (store.codes, store.titles, store.sections, store.ag, store.notes, store.section_ids.tolist(),
+            np.asarray(store.ag_area).tolist(), np.asarray(store.grade_masks).tolist())
+
+
+def _awkward(rows):
+    # quoted newlines and escaped quotes in notes, a title repeated in a later section, blank rows
+    courses = [i for i, row in enumerate(rows) if len(row) > 7 and row[0].strip().isdigit()]
+    for k, i in enumerate(courses[::9]):
+        rows[i][7] = f'line one, "quoted" {k}\nline two'
+    repeat = list(rows[courses[3]])
+    repeat[2:6] = ["", "", "", "12"]
+    rows.insert(courses[-1] + 1, repeat)
+    for i in courses[::25]:
+        rows.insert(i, [])
+    return rows
+
+
+@pytest.fixture(params=["plain", "awkward"])
+def csv_path(request, tmp_path):
+    path = copy_catalog_csv(tmp_path)
+    if request.param == "awkward":
+        edit_catalog_csv(path, _awkward)
+    return path
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 97, 1000, 4096, 1 << 22])
+def test_ranges_merge_to_build_store(csv_path, chunk_bytes):
+    digest, names, ranges = scan_csv(csv_path, chunk_bytes)
+    assert digest == csv_digest(csv_path)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert ranges[-1][1] == os.path.getsize(csv_path)
+    if chunk_bytes < 1000:
+        assert len(ranges) > 10
+
+    expected_names, rows = read_catalog_rows(csv_path)
+    assert names == expected_names
+    merged = merge_parts([parse_range(csv_path, names, a, b) for a, b in ranges])
+    assert _store_fields(merged) == _store_fields(build_store(names, rows))
+
+
+def test_awkward_csv_is_awkward(tmp_path):
+    path = copy_catalog_csv(tmp_path)
+    edit_catalog_csv(path, _awkward)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert any("\n" in cell for row in rows for cell in row)
+    titles = [row[1] for row in rows if len(row) > 7 and row[0].strip().isdigit()]
+    assert len(titles) > len(set(titles))
+
+
+def test_ingest_writes_current_snapshots(tmp_path):
+    paths = []
+    for name in ("a", "b"):
+        os.makedirs(tmp_path / name)
+        paths.append(copy_catalog_csv(tmp_path / name))
+    edit_catalog_csv(paths[1], _awkward)
+
+    written = ingest_catalogs(paths, workers=2, chunk_bytes=2048)
+    assert written == {p: snapshot_path(p) for p in paths}
+    for p in paths:
+        assert list(load_catalog(p).items()) == list(load_catalog(p, use_snapshot=False).items())
+    assert ingest_catalogs(paths, workers=1) == dict.fromkeys(paths)  # already current
+    assert ingest_catalogs(paths[:1], workers=1, force=True) == {paths[0]: snapshot_path(paths[0])}
@@ -0,0 +1,67 @@
+"""
+CatalogRegistry keeps the most recently used schools and drops the rest with
+what the per-catalog caches built from them; a catalog nobody holds is freed
+together with those caches.
+"""
+import gc
+import os
+import shutil
+import weakref
+
+from catalog_parser import catalog_cached, load_catalog
+from catalog_registry import CatalogRegistry, SchoolConfig
+from conftest import DATA
+from course_resolver import resolver_for
+from inputs_loader import resolve_completed_courses
+from prerequisites import graph_for
+
+
+def _registry(tmp_path, n, **kw):
+    schools = {}
+    for i in range(n):
+        path = str(tmp_path / f"school{i}.csv")
+        shutil.copy(os.path.join(DATA, "foothill_catalog.csv"), path)
+        schools[f"s{i}"] = SchoolConfig(f"s{i}", path)
+    return CatalogRegistry(schools, **kw)
+
+
+def test_lru_eviction_by_count(tmp_path):
+    reg = _registry(tmp_path, 4, max_schools=2)
+    s0 = reg.get("s0")
+    reg.get("s1")
+    assert reg.get("s0") is s0  # s0 is now the most recent
+    resolver_for(s0)
+    s2 = reg.get("s2")
+    graph_for(s2)
+    assert "s1" not in reg and "s0" in reg and "s2" in reg
+    reg.get("s3")
+    assert reg.stats()["resident"] == ["s2", "s3"]
+    assert (reg.hits, reg.misses, reg.evictions) == (1, 4, 2)
+    assert catalog_cached(s0) == []  # dropped along with the school
+    assert catalog_cached(s2)
+    assert reg.get("s0") is not s0  # reloaded from its CSV
+    assert resolve_completed_courses(reg.get("s0"), ["Spanish 1"]) == resolve_completed_courses(s0, ["Spanish 1"])
+
+
+def test_lru_eviction_by_bytes(tmp_path):
+    reg = _registry(tmp_path, 3)
+    reg.get("s0")
+    one = reg.resident_bytes()
+    reg.max_bytes = int(one * 2.5)
+    reg.get("s1")
+    reg.get("s2")
+    assert len(reg) == 2 and "s0" not in reg
+    assert reg.resident_bytes() <= reg.max_bytes
+    reg.max_bytes = 1
+    reg.get("s0")
+    assert reg.stats()["resident"] == ["s0"]  # the school just asked for stays, however large
+
+
+def test_caches_are_freed_with_the_catalog():
+    catalog = load_catalog(os.path.join(DATA, "foothill_catalog.csv"), use_snapshot=False)
+    resolver = weakref.ref(resolver_for(catalog))
+    graph = weakref.ref(graph_for(catalog))
+    ref = weakref.ref(catalog)
+    del catalog
+    gc.collect()
+    assert ref() is None and resolver() is None and graph() is None
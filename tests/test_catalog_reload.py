@@ -0,0 +1,102 @@
+"""
+A catalog hot-reloaded from an edited CSV is the catalog load_catalog parses
+from that CSV: same courses, index answers, pathway lists and plans, however
+many reloads it went through. The diff lists exactly what changed.
+"""
+import random
+
+import pytest
+
+from catalog_parser import load_catalog
+from catalog_reload import reload_catalog
+from conftest import copy_catalog_csv, edit_catalog_csv
+from main import plan_student
+from math_pathway import MATH_TRACK
+from science_pathway import SCI_TRACK
+
+GRADES = (9, 10, 11, 12)
+
+
+def _is_course(row):
+    return len(row) > 6 and row[0].strip().isdigit() and row[1].strip()
+
+
+def _random_edits(rng, serial):
+    """
+    An edit(rows) for edit_catalog_csv: renames, grade changes, note changes,
+    dropped and inserted courses, and now and then two courses swapped.
+    """
+    def edit(rows):
+        courses = [i for i, row in enumerate(rows) if _is_course(row)]
+        dropped = set()
+        for i in rng.sample(courses, 6):
+            row = rows[i]
+            r = rng.random()
+            if r < 0.25:
+                row[1] = row[1].strip() + f" v{serial}"
+            elif r < 0.6:
+                grades = rng.sample(GRADES, rng.randint(1, 4))
+                row[2:6] = [str(g) if g in grades else "" for g in GRADES]
+            elif r < 0.8:
+                row[7] = f"note {serial}"
+            else:
+                dropped.add(i)
+        if rng.random() < 0.3:
+            a, b = rng.sample(courses, 2)
+            rows[a], rows[b] = rows[b], rows[a]
+        out = [row for i, row in enumerate(rows) if i not in dropped]
+        for k in range(rng.randint(0, 3)):
+            template = out[rng.choice([i for i, row in enumerate(out) if _is_course(row)])]
+            grades = rng.sample(GRADES, rng.randint(1, 4))
+            new = [f"9{serial:02d}{k:03d}", f"Elective Lab {serial}-{k} (P)"]
+            new += [str(g) if g in grades else "" for g in GRADES] + template[6:]
+            out.insert(out.index(template) + 1, new)
+        return out
+    return edit
+
+
+def _assert_same(reloaded, fresh, rng):
+    assert list(reloaded.items()) == list(fresh.items())
+    assert reloaded.version == fresh.version
+    assert reloaded.pathways.lists == fresh.pathways.lists
+    words = sorted({w for t in fresh for w in t.lower().split()})
+    for _ in range(100):
+        keywords, g = rng.sample(words, rng.randint(1, 2)), rng.choice(GRADES)
+        assert list(reloaded.index.iter_all(g, keywords)) == list(fresh.index.iter_all(g, keywords))
+        assert list(reloaded.index.iter_any(g, keywords)) == list(fresh.index.iter_any(g, keywords))
+    for _ in range(10):
+        inputs = {"goal": rng.choice(["cs", "other"]), "starting_math": rng.choice(list(MATH_TRACK)),
+                  "science_pathway": rng.choice(list(SCI_TRACK)), "prefer_spanish": rng.random() < 0.5,
+                  "completed_courses": rng.sample(list(fresh), 2) + ["Spanish 1"]}
+        assert plan_student(inputs, reloaded) == plan_student(inputs, fresh)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_reload_matches_fresh_load(tmp_path, seed):
+    rng = random.Random(seed)
+    path = copy_catalog_csv(tmp_path)
+    catalog = load_catalog(path, use_snapshot=False)
+    plan_student({"completed_courses": ["Spanish 1"]}, catalog)  # warm the per-catalog caches
+    for serial in range(4):
+        before = dict(catalog)
+        edit_catalog_csv(path, _random_edits(rng, serial))
+        diff = reload_catalog(catalog, path)
+        fresh = load_catalog(path, use_snapshot=False)
+        _assert_same(catalog, fresh, rng)
+
+        by_code = {c.code: t for t, c in before.items()}
+        new_codes = {c.code: t for t, c in fresh.items()}
+        assert sorted(diff.inserted) == sorted(t for code, t in new_codes.items() if code not in by_code)
+        assert sorted(diff.removed) == sorted(t for code, t in by_code.items() if code not in new_codes)
+        changed = {(by_code[code], t) for code, t in new_codes.items()
+                   if code in by_code and before[by_code[code]] != fresh[t]}
+        assert set(diff.changed) == changed
+    assert len(catalog.reloads) == 4
+
+
+def test_reload_without_changes(tmp_path):
+    path = copy_catalog_csv(tmp_path)
+    catalog = load_catalog(path, use_snapshot=False)
+    version = catalog.version
+    diff = reload_catalog(catalog, path)
+    assert not diff and catalog.version == version
@@ -0,0 +1,67 @@
+"""
+A catalog loaded from its compiled snapshot is the catalog parsed from the CSV:
+same courses, index answers, pathway lists and plans. A snapshot of another
+CSV is never used.
+"""
+import os
+import random
+import shutil
+
+import pytest
+
+from catalog_parser import load_catalog
+from catalog_snapshot import catalog_from_snapshot, compile_catalog, csv_digest, open_snapshot, snapshot_path
+from conftest import DATA
+from main import plan_student
+from math_pathway import MATH_TRACK
+from science_pathway import SCI_TRACK
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / "catalog.csv")
+    shutil.copy(os.path.join(DATA, "foothill_catalog.csv"), path)
+    return path
+
+
+def _words(catalog, rng, n):
+    words = sorted({w for t in catalog for w in t.lower().replace("(", " ").replace(")", " ").split()})
+    return [rng.sample(words, rng.randint(1, 2)) for _ in range(n)]
+
+
+def test_snapshot_round_trip(catalog, csv_path):
+    compile_catalog(csv_path)
+    snap = open_snapshot(snapshot_path(csv_path), csv_digest(csv_path))
+    assert snap is not None
+    loaded = catalog_from_snapshot(snap)
+
+    assert list(loaded.items()) == list(catalog.items())
+    assert loaded.version == catalog.version
+    assert loaded.pathways.lists == catalog.pathways.lists
+    rng = random.Random(0)
+    for keywords in _words(catalog, rng, 200) + [["computer science"], ["spanish 3"], ["ct", "cte"]]:
+        g = rng.choice([9, 10, 11, 12])
+        assert list(loaded.index.iter_all(g, keywords)) == list(catalog.index.iter_all(g, keywords))
+        assert list(loaded.index.iter_any(g, keywords)) == list(catalog.index.iter_any(g, keywords))
+
+    for _ in range(30):
+        inputs = {"goal": rng.choice(["cs", "other"]), "starting_math": rng.choice(list(MATH_TRACK)),
+                  "science_pathway": rng.choice(list(SCI_TRACK)), "prefer_spanish": rng.random() < 0.5,
+                  "completed_courses": rng.sample(list(catalog), rng.randint(0, 3))}
+        assert plan_student(inputs, loaded) == plan_student(inputs, catalog)
+
+
+def test_load_catalog_uses_only_a_matching_snapshot(csv_path):
+    compile_catalog(csv_path)
+    assert load_catalog(csv_path).store.titles == load_catalog(csv_path, use_snapshot=False).store.titles
+    with open(csv_path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    renamed = next(i for i, line in enumerate(lines) if "Freshman English (P)" in line)
+    lines[renamed] = lines[renamed].replace("Freshman English (P)", "Freshman English 9 (P)")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+    assert open_snapshot(snapshot_path(csv_path), csv_digest(csv_path)) is None
+    fresh = load_catalog(csv_path)
+    assert "Freshman English 9 (P)" in fresh and "Freshman English (P)" not in fresh
+    assert fresh.version == csv_digest(csv_path)
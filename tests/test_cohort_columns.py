@@ -0,0 +1,95 @@
+"""
+A cohort written with CohortWriter reads back through CohortColumns as the
+results it was given, across chunks and appending writers; a failed student
+has no plan and no goal.
+"""
+import os
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from cohort_columns import FAILED, INVALID, NO_GOAL, OK, CohortColumns, CohortWriter
+from main import plan_student
+from math_pathway import MATH_TRACK
+from science_pathway import SCI_TRACK
+
+
+def _results(catalog, seed, n, start=0):
+    rng = random.Random(seed)
+    out = []
+    for i in range(start, start + n):
+        if rng.random() < 0.1:
+            out.append({"student_id": f"s{i}", "ok": False, "error": "ValueError: bad input"})
+            continue
+        inputs = {"goal": rng.choice(["cs", "other"]), "starting_math": rng.choice(list(MATH_TRACK)),
+                  "science_pathway": rng.choice(list(SCI_TRACK)), "prefer_spanish": rng.random() < 0.5,
+                  "completed_courses": ["Spanish 1"] if rng.random() < 0.3 else []}
+        plan, completed, errors = plan_student(inputs, catalog)
+        if rng.random() < 0.2:
+            plan["plan"][rng.randrange(4)]["courses"][rng.randrange(6)] = "Not A Course"
+            errors = errors + ["Not A Course is not offered"]
+        out.append({"student_id": f"s{i}", "ok": True, "plan": plan, "completed_courses": sorted(completed),
+                    "validation_errors": errors})
+    return out
+
+
+def _check(cols, results):
+    assert len(cols) == len(results)
+    assert cols.student_ids == [r["student_id"] for r in results]
+    status, goal, errors = cols.column("status"), cols.column("goal"), cols.column("errors")
+    seats, by_title = Counter(), Counter()
+    for row, r in enumerate(results):
+        if not r["ok"]:
+            assert cols.plan(row) is None
+            assert (status[row], goal[row]) == (FAILED, NO_GOAL)
+            continue
+        plan = cols.plan(row)
+        assert plan["goal"] == r["plan"]["goal"] == cols.goals[goal[row]]
+        assert plan["plan"] == r["plan"]["plan"]
+        assert (status[row], errors[row]) == (OK, len(r["validation_errors"]))
+        for y in r["plan"]["plan"]:
+            for slot in y["courses"]:
+                for t in slot if isinstance(slot, list) else [slot]:
+                    if t is not None:
+                        seats[(t, y["grade"])] += 1
+                        by_title[t] += 1
+    assert cols.course_counts() == dict(by_title)
+    assert cols.course_counts(11) == {t: n for (t, g), n in seats.items() if g == 11}
+    for title in ["Chemistry (P)", "AP Computer Science (HP)", "Not A Course"]:
+        expected = [row for row, r in enumerate(results) if r["ok"] and any(
+            title == t for y in r["plan"]["plan"] for s in y["courses"] for t in (s if isinstance(s, list) else [s]))]
+        assert cols.students_taking(title).tolist() == expected
+    invalid = cols.column("flags") & INVALID != 0
+    flagged = set(np.unique(cols.column("student")[invalid]).tolist())
+    assert flagged == {row for row, r in enumerate(results) if r["ok"] and r["validation_errors"]}
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 1 << 16])
+def test_round_trip(catalog, tmp_path, chunk_rows):
+    results = _results(catalog, 0, 150)
+    with CohortWriter(str(tmp_path), chunk_rows) as w:
+        for r in results:
+            w.add(r)
+    _check(CohortColumns(str(tmp_path)), results)
+
+
+def test_append(catalog, tmp_path):
+    first, second = _results(catalog, 1, 60), _results(catalog, 2, 40, start=60)
+    with CohortWriter(str(tmp_path), 50) as w:
+        for r in first:
+            w.add(r)
+    # a chunk written but never published (a run that died) is cut off by the next writer
+    with open(os.path.join(str(tmp_path), "course.bin"), "ab") as f:
+        f.write(b"\xff" * 12)
+    with CohortWriter(str(tmp_path), 50, append=True) as w:
+        for r in second:
+            w.add(r)
+    _check(CohortColumns(str(tmp_path)), first + second)
+
+    # a writer without append starts over
+    with CohortWriter(str(tmp_path)) as w:
+        for r in second:
+            w.add(r)
+    _check(CohortColumns(str(tmp_path)), second)
@@ -0,0 +1,78 @@
+"""
+Demand counted over cohort shards and merged (directly or through saved .npz
+partials) equals demand counted over the whole cohort in one pass, which equals
+a plain count of the plans' seats.
+"""
+import random
+from collections import Counter
+
+import pytest
+
+from course_demand import BREAKDOWNS, DemandCounter
+from main import plan_student, read_settings
+from math_pathway import MATH_TRACK
+from science_pathway import SCI_TRACK
+
+
+def _cohort(catalog, seed, n):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        settings = read_settings({"goal": rng.choice(["cs", "other"]), "starting_math": rng.choice(list(MATH_TRACK)),
+                                  "science_pathway": rng.choice(list(SCI_TRACK)),
+                                  "prefer_spanish": rng.random() < 0.5})
+        plan = plan_student(settings, catalog)[0]
+        if rng.random() < 0.1:
+            plan["plan"][rng.randrange(4)]["courses"][rng.randrange(6)] = rng.choice(["Not A Course", "Robotics X"])
+        out.append((plan, settings))
+    return out
+
+
+def _count(catalog, cohort):
+    c = DemandCounter(catalog)
+    for plan, settings in cohort:
+        c.add(plan, settings)
+    return c
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_merged_shards_match_one_pass(catalog, tmp_path, seed):
+    cohort = _cohort(catalog, seed, 300)
+    whole = _count(catalog, cohort)
+
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(cohort)), 3))
+    shards = [cohort[a:b] for a, b in zip([0] + cuts, cuts + [len(cohort)])]
+    merged = DemandCounter(catalog)
+    for k, shard in enumerate(shards):
+        part = _count(catalog, shard)
+        if k % 2:
+            part = DemandCounter.load(part.save(str(tmp_path / f"shard{k}.npz")))
+        merged.merge(part)
+
+    assert merged.plans == whole.plans == len(cohort)
+    assert merged.rows() == whole.rows()
+
+    seats = Counter()
+    for plan, settings in cohort:
+        for y in plan["plan"]:
+            for slot in y["courses"]:
+                for t in slot if isinstance(slot, list) else [slot]:
+                    if t is not None:
+                        seats[(t, y["grade"], None)] += 1
+                        # titles outside the catalog are only counted cohort-wide
+                        for b in BREAKDOWNS if t in catalog else ():
+                            seats[(t, y["grade"], (b, settings[b]))] += 1
+    for (t, g, by), n in seats.items():
+        b, v = by if by is not None else (None, None)
+        assert merged.demand(t, g, b, v) == n
+    assert merged.demand("Not A Course") == sum(n for (t, _, by), n in seats.items() if t == "Not A Course"
+                                                and by is None)
+
+
+def test_merge_rejects_other_catalogs(catalog):
+    other = DemandCounter(titles=list(catalog)[:-1])
+    with pytest.raises(ValueError):
+        DemandCounter(catalog).merge(other)
+    with pytest.raises(ValueError):
+        DemandCounter(catalog).merge(DemandCounter(catalog, breakdowns=("goal",)))
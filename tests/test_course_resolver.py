@@ -0,0 +1,61 @@
+"""
+Transcript strings resolve to the catalog titles a counselor would pick:
+numerals, honors/AP spellings, markers and spacing do not matter, exact titles
+resolve to themselves and unknown strings are kept as given.
+"""
+import random
+
+import pytest
+
+from course_resolver import CourseResolver, normalize_title
+from inputs_loader import resolve_cohort_completed_courses, resolve_completed_courses
+
+ALIASES = [
+    ("Spanish 1", "Spanish I (P)"),
+    ("Spanish 2", "Spanish II (P)"),
+    ("spanish  II", "Spanish II (P)"),
+    ("Spanish 2 (P)", "Spanish II (P)"),
+    ("Spanish 3", "Spanish III (P)"),
+    ("AP Spanish", "AP Spanish Literature and Culture (HP)"),  # the last title containing it
+    ("hon geometry", "Honors Geometry (P)"),
+    ("Honors Geometry", "Honors Geometry (P)"),
+    ("Algebra 2", "Algebra II (P)"),
+    ("French 2", "French II (P)"),
+    ("Korean 1", "Korean I (P)"),
+    ("Advanced Placement Computer Science", "AP Computer Science (HP)"),
+    ("a.p. calculus ab", "AP Calculus AB (HP)"),
+    ("Civics", "Civics (P) (sem)"),
+    ("Ethnic Studies", "Ethnic Studies (P)(sem)"),
+    ("Pre-Calculus", "Pre-Calculus (P)"),
+]
+
+
+@pytest.mark.parametrize("text, title", ALIASES)
+def test_aliases(catalog, text, title):
+    assert resolve_completed_courses(catalog, [text]) == {title}
+
+
+def test_titles_resolve_to_themselves(catalog):
+    resolver = CourseResolver(catalog)
+    assert all(resolver.lookup(t) == t for t in catalog)
+
+
+@pytest.mark.parametrize("text", ["Klingon 3", "AP Comp Sci", 42, ""])
+def test_unmatched_strings_are_kept(catalog, text):
+    assert resolve_completed_courses(catalog, [text]) == {text}
+
+
+def test_normalize_title():
+    assert normalize_title("Spanish 2 (P)") == normalize_title("spanish  II") == "spanish ii"
+    assert normalize_title("Hon. Geometry") == "honors geometry"
+    assert normalize_title("Advanced Placement Calculus AB (HP)") == "ap calculus ab"
+
+
+def test_cohort_resolution_matches_per_student(catalog):
+    rng = random.Random(0)
+    pool = [a for a, _ in ALIASES] + list(catalog)[:40] + ["Klingon 3"]
+    cohort = [rng.sample(pool, rng.randint(0, 5)) for _ in range(300)]
+    resolver = CourseResolver(catalog)
+    assert resolver.resolve_many(cohort) == [resolve_completed_courses(catalog, c) for c in cohort]
+    assert resolve_cohort_completed_courses(catalog, cohort) == resolver.resolve_many(cohort)
+    assert resolver.misses == len({str(s) for c in cohort for s in c})
@@ -0,0 +1,106 @@
+"""
+plan_student with a PlanCache gives the plans it gives without one: hits for
+inputs with the same fingerprint, misses for new ones, and a stale entry is
+recomputed after a hot reload touches its plan.
+"""
+import json
+import os
+import random
+
+import pytest
+
+from catalog_parser import load_catalog
+from catalog_reload import reload_catalog
+from conftest import copy_catalog_csv, edit_catalog_csv
+from main import plan_student
+from plan_cache import PlanCache
+from science_pathway import SCI_TRACK
+
+STARTS = ["geometry", "honors_geometry", "honors_algebra2"]
+COMPLETED = [[], ["Spanish 1"], ["Spanish I (P)"], ["Spanish 1", "French 2"], ["French II (P)", "Spanish I (P)"]]
+
+
+def _inputs(rng):
+    return {"goal": rng.choice(["cs", "other"]), "starting_math": rng.choice(STARTS),
+            "science_pathway": rng.choice(list(SCI_TRACK)), "prefer_spanish": rng.random() < 0.5,
+            "completed_courses": rng.choice(COMPLETED)}
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_cached_plans_match_uncached(catalog, seed):
+    rng = random.Random(seed)
+    cache = PlanCache(256)
+    seen = set()
+    for _ in range(80):
+        inputs = _inputs(rng)
+        hits = cache.hits
+        uncached = plan_student(inputs, catalog)
+        assert plan_student(inputs, catalog, cache) == uncached
+        key = json.dumps([inputs["goal"], inputs["starting_math"], inputs["science_pathway"],
+                          inputs["prefer_spanish"], sorted(uncached[1])])
+        # aliases and order of the completed courses do not matter, only what they resolve to
+        assert cache.hits == hits + (key in seen)
+        seen.add(key)
+    assert cache.misses == len(seen) == len(cache)
+
+
+def test_hits_are_copies(catalog):
+    cache = PlanCache()
+    plan = plan_student({}, catalog, cache)[0]
+    plan["plan"][0]["courses"][0] = "Nope"
+    assert plan_student({}, catalog, cache)[0] == plan_student({}, catalog)[0]
+    assert cache.hits == 1
+
+
+def test_disk_store_is_shared_and_tolerates_removed_files(catalog, tmp_path):
+    first = PlanCache(0, str(tmp_path))
+    expected = plan_student({"completed_courses": ["Spanish 1"]}, catalog, first)
+    second = PlanCache(16, str(tmp_path))
+    assert plan_student({"completed_courses": ["Spanish 1"]}, catalog, second) == expected
+    assert (second.hits, second.misses) == (1, 0)
+
+    (key,) = [name[:-5] for _, _, files in os.walk(tmp_path) for name in files]
+    os.remove(first._file(key))
+    assert first.get(key) is None and first.misses == 2
+    first.invalidate(key)  # already gone: nothing to do
+    assert second.get(key) is not None  # still in its memory LRU
+
+
+def _set_grades(title, grades):
+    def edit(rows):
+        for row in rows:
+            if row[1:2] and row[1].strip() == title:
+                row[2:6] = [str(g) if g in grades else "" for g in (9, 10, 11, 12)]
+        return rows
+    return edit
+
+
+def _drop(title):
+    return lambda rows: [row for row in rows if not (row[1:2] and row[1].strip() == title)]
+
+
+def test_stale_entries_are_replanned_after_reload(tmp_path):
+    path = copy_catalog_csv(tmp_path)
+    catalog = load_catalog(path, use_snapshot=False)
+    cache = PlanCache()
+    inputs = {"completed_courses": ["Spanish 1"]}
+    plan = plan_student(inputs, catalog, cache)[0]
+    titles = {t for y in plan["plan"] for s in y["courses"] for t in (s if isinstance(s, list) else [s])}
+
+    # removing a course the plan does not use keeps the entry
+    unused = next(t for t in catalog if t not in titles and t.startswith("AP "))
+    edit_catalog_csv(path, _drop(unused))
+    diff = reload_catalog(catalog, path)
+    assert diff.removed == [unused] and not diff.adds_candidates
+    assert plan_student(inputs, catalog, cache) == plan_student(inputs, catalog)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # taking away a grade a planned course is taken in makes it stale
+    edit_catalog_csv(path, _set_grades("Chemistry (P)", {11, 12}))
+    reload_catalog(catalog, path)
+    replanned = plan_student(inputs, catalog, cache)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert replanned == plan_student(inputs, catalog)
+    assert "Chemistry (P)" not in replanned[0]["plan"][1]["courses"]
+    assert plan_student(inputs, catalog, cache) == replanned
+    assert cache.hits == 2
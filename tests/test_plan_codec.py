@@ -0,0 +1,98 @@
+"""
+CourseSet behaves like a set of titles (gated ones like a PrereqGate over that
+set), and a PlanArray gives back the plans it was built from.
+"""
+import random
+
+import pytest
+
+from main import plan_student
+from math_pathway import MATH_TRACK
+from plan_codec import CourseSet, PlanArray, codec_for
+from prerequisites import PrereqGate, graph_for
+from science_pathway import SCI_TRACK
+
+OUTSIDE = ["Spanish 1", "Klingon 3", "Nope"]
+
+
+def _random_ops(rng, titles, codec, n):
+    cs, ref = CourseSet(codec), set()
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.4:
+            t = rng.choice(titles + OUTSIDE)
+            cs.add(t)
+            ref.add(t)
+        elif r < 0.6:
+            more = rng.sample(titles, rng.randint(0, 5)) + rng.sample(OUTSIDE, rng.randint(0, 1))
+            cs.update(more)
+            ref.update(more)
+        elif r < 0.8:
+            more = rng.sample(titles, rng.randint(0, 5))
+            other = CourseSet(codec, more)
+            cs = other | cs if rng.random() < 0.5 else cs | other
+            ref |= set(more)
+        else:
+            copy = cs.copy()
+            copy.add(rng.choice(titles))  # the copy is independent
+    return cs, ref
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_course_set_matches_set(catalog, seed):
+    rng = random.Random(seed)
+    titles = list(catalog)
+    codec = codec_for(catalog)
+    for _ in range(20):
+        cs, ref = _random_ops(rng, titles, codec, 60)
+        assert sorted(cs) == sorted(ref)
+        assert len(cs) == len(ref)
+        assert all((t in cs) == (t in ref) for t in titles + OUTSIDE)
+        assert set(cs | ref) == ref
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_gated_course_set_matches_prereq_gate(catalog, seed):
+    rng = random.Random(seed)
+    titles = list(catalog)
+    codec, graph = codec_for(catalog), graph_for(catalog)
+    for _ in range(20):
+        cs, ref = _random_ops(rng, titles, codec, 20)
+        covered = graph.cover(rng.sample(titles, rng.randint(0, 15)))
+        gated, gate = graph.gate(cs, covered), PrereqGate(ref, graph, covered)
+        assert isinstance(gated, CourseSet)
+        assert all((t in gated) == (t in gate) for t in titles + OUTSIDE)
+        ids = sorted(rng.sample(range(len(titles)), 40))
+        free = [i for i in ids if titles[i] not in gate]
+        assert gated.first_free(ids) == (free[0] if free else None)
+        # a gate of a gate keeps the outer blocked courses
+        covered2 = graph.cover(rng.sample(titles, rng.randint(0, 15)))
+        twice, gate2 = gated.gated(graph, covered2), PrereqGate(gate, graph, covered2)
+        assert all((t in twice) == (t in gate2) for t in titles)
+
+
+def test_plan_array_round_trip(catalog):
+    rng = random.Random(0)
+    titles = list(catalog)
+    plans = []
+    for _ in range(200):
+        plan = plan_student({"goal": rng.choice(["cs", "other"]), "starting_math": rng.choice(list(MATH_TRACK)),
+                             "science_pathway": rng.choice(list(SCI_TRACK)),
+                             "prefer_spanish": rng.random() < 0.5}, catalog)[0]
+        year = rng.choice(plan["plan"])
+        year["courses"][rng.randrange(6)] = rng.choice([None, "Not A Course", [rng.choice(titles), None],
+                                                        [rng.choice(titles), rng.choice(titles)]])
+        plan["rationale"], plan["next_steps"] = [], []
+        plans.append(plan)
+    array = PlanArray.from_plans(plans, catalog)
+    assert len(array) == len(plans)
+    assert array.to_plans() == plans
+    assert array.nbytes == len(plans) * (4 * 6 * 4 + 2)
+    extra = PlanArray(codec_for(catalog))
+    for p in plans[:20]:
+        extra.append(p)
+    assert [extra[i] for i in range(20)] == plans[:20]
+
+    bad = dict(plans[0], plan=plans[0]["plan"][:3])
+    with pytest.raises(ValueError):
+        array.append(bad)
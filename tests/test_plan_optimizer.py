@@ -0,0 +1,78 @@
+"""
+optimize_plan returns valid plans (offered, prerequisites met, nothing repeated
+or already completed), proves them optimal given time, and within a tight
+budget still returns a whole plan about on time. iter_plans yields distinct
+valid plans best first, starting with the optimum.
+"""
+import itertools
+import random
+
+import pytest
+
+from inputs_loader import resolve_completed_courses
+from math_pathway import MATH_TRACK
+from plan_optimizer import iter_plans, optimize_plan, top_plans
+from science_pathway import SCI_TRACK
+from validator import validate_plan_offered_by_grade, validate_plan_prerequisites
+
+
+def _cases(catalog, seed, n):
+    rng = random.Random(seed)
+    pool = list(catalog)[:80]
+    for _ in range(n):
+        yield (rng.choice(["cs", "other"]), rng.choice(list(MATH_TRACK)), rng.choice(list(SCI_TRACK)),
+               resolve_completed_courses(catalog, rng.sample(pool, rng.randint(0, 3))), rng.random() < 0.5)
+
+
+def _titles(plan):
+    return [t for y in plan["plan"] for slot in y["courses"] if slot is not None
+            for t in (slot if isinstance(slot, list) else [slot])]
+
+
+def _assert_valid(plan, catalog, completed, starting_math):
+    assert validate_plan_offered_by_grade(plan, catalog) == []
+    assert validate_plan_prerequisites(plan, catalog, completed, starting_math) == []
+    titles = _titles(plan)
+    assert len(titles) == len(set(titles))
+    assert not set(titles) & set(completed)
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_optimized_plans_are_valid_and_optimal(catalog, seed):
+    for goal, starting_math, science, completed, spanish in _cases(catalog, seed, 20):
+        result = optimize_plan(catalog, goal, starting_math, science, completed, spanish, time_budget_ms=2000)
+        assert result.optimal
+        _assert_valid(result.plan, catalog, completed, starting_math)
+
+
+def test_time_budget(catalog):
+    optimize_plan(catalog, "cs", "geometry", "standard_stem", set())  # per-catalog tables, outside the clock
+    optimize_plan(catalog, "other", "geometry", "standard_stem", set())
+    for goal, starting_math, science, completed, spanish in _cases(catalog, 7, 30):
+        quick = optimize_plan(catalog, goal, starting_math, science, completed, spanish, time_budget_ms=0)
+        # past the budget the search only finishes its first plan
+        assert quick.elapsed_ms < 250
+        assert all(len(y["courses"]) == 6 for y in quick.plan["plan"])
+        _assert_valid(quick.plan, catalog, completed, starting_math)
+        best = optimize_plan(catalog, goal, starting_math, science, completed, spanish, time_budget_ms=2000)
+        assert best.score >= quick.score - 1e-9
+        assert best.nodes >= quick.nodes
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_iter_plans_best_first(catalog, seed):
+    for goal, starting_math, science, completed, spanish in _cases(catalog, 100 + seed, 8):
+        ranked = list(itertools.islice(iter_plans(catalog, goal, starting_math, science, completed, spanish), 8))
+        assert [r.rank for r in ranked] == list(range(1, len(ranked) + 1))
+        scores = [r.score for r in ranked]
+        assert scores == sorted(scores, reverse=True)
+        best = optimize_plan(catalog, goal, starting_math, science, completed, spanish, time_budget_ms=2000)
+        assert abs(scores[0] - best.score) < 1e-9
+
+        signatures = [tuple(frozenset(_titles({"plan": [y]})) for y in r.plan["plan"]) for r in ranked]
+        assert len(set(signatures)) == len(signatures)
+        for r in ranked:
+            _assert_valid(r.plan, catalog, completed, starting_math)
+        # a shorter walk is a prefix of a longer one
+        short = top_plans(catalog, goal, starting_math, science, completed, k=3, prefer_spanish=spanish)
+        assert [r.plan for r in short] == [r.plan for r in ranked[:3]]
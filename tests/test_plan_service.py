@@ -0,0 +1,79 @@
+"""
+PlanService answers badly shaped bodies with 400, not a server error, and a
+reload leaves the loop free to answer other requests.
+"""
+import asyncio
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+import plan_service
+from catalog_reload import reload_catalog
+from conftest import DATA
+from main import plan_student
+from plan_service import HttpError, PlanService
+
+BAD_PLAN = [{"completed_courses": 5}, {"completed_courses": ["Spanish 1", 3]}, {"goal": ["cs"]},
+            {"starting_math": {}}]
+BAD_VALIDATE = [{"plan": {"plan": 3}}, {"plan": [1]}, {"plan": {"plan": [{"grade": 9}]}},
+                {"plan": {"plan": [{"courses": []}]}}, {"plan": {"plan": [{"grade": 9, "courses": [{}]}]}},
+                {"plan": {"plan": []}, "completed_courses": "Spanish 1"}, {"plans": {"plan": []}},
+                {"plans": [{"plan": []}], "completed_courses": [[], []]}, {"plans": [{"plan": []}],
+                                                                             "starting_math": [5]}, {}]
+
+
+def _dispatch(service, path, payload):
+    async def go():
+        return await service.dispatch("POST", path, json.dumps(payload).encode())
+    return asyncio.run(go())
+
+
+@pytest.fixture
+def service(catalog):
+    s = PlanService(catalog, workers=2, use_threads=True)
+    s.start()
+    yield s
+    s.close()
+
+
+@pytest.mark.parametrize("path, body", [("/plan", b) for b in BAD_PLAN] + [("/validate", b) for b in BAD_VALIDATE])
+def test_badly_shaped_body_is_400(service, path, body):
+    with pytest.raises(HttpError) as e:
+        _dispatch(service, path, body)
+    assert e.value.status == 400
+    assert service.counters["errors"] == 0
+
+
+def test_well_shaped_bodies_still_answer(service, catalog):
+    inputs = {"starting_math": "geometry", "completed_courses": ["Spanish 1"]}
+    result = _dispatch(service, "/plan", inputs)
+    assert result["ok"]
+    plan = plan_student(inputs, catalog)[0]
+    assert _dispatch(service, "/validate", {"plan": plan, "completed_courses": ["Spanish I (P)"],
+                                            "starting_math": "geometry"}) == {"validation_errors": []}
+    assert _dispatch(service, "/validate", {"plans": [plan, plan], "completed_courses": [["Spanish I (P)"], []],
+                                            "starting_math": ["geometry", None]})["validation_errors"][0] == []
+
+
+def test_reload_runs_off_the_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.csv")
+    shutil.copy(os.path.join(DATA, "foothill_catalog.csv"), path)
+    threads = []
+
+    def spy(catalog, csv_path):
+        threads.append(threading.current_thread())
+        return reload_catalog(catalog, csv_path)
+
+    monkeypatch.setattr(plan_service, "reload_catalog", spy)
+    service = PlanService(catalog_path=path, use_threads=True)
+    service.start()
+    try:
+        summary = asyncio.run(service.reload())
+    finally:
+        service.close()
+    assert threads and threads[0] is not threading.main_thread()
+    assert service.counters["reloads"] == 1
+    assert isinstance(summary, dict)
@@ -0,0 +1,87 @@
+"""
+replan and the scenario sweep built on it must give exactly what plan_student
+gives for the same inputs.
+"""
+import json
+import multiprocessing as mp
+import os
+import random
+
+import pytest
+
+from conftest import DATA
+from main import plan_student
+from math_pathway import MATH_TRACK
+from replanner import replan
+from scenario_sweep import sweep
+from science_pathway import SCI_TRACK
+
+# transcript strings the resolver has to work on, beside exact catalog titles
+TRANSCRIPT = ["Spanish 1", "Spanish 2", "Spanish 3", "Spanish 4", "AP Spanish", "hon geometry", "Algebra 2",
+              "French 2", "Korean 1"]
+
+
+def _random_inputs(rng, pool):
+    return {"goal": rng.choice(["cs", "cs", "other"]),
+            "starting_math": rng.choice(list(MATH_TRACK) + ["bogus"]),
+            "science_pathway": rng.choice(list(SCI_TRACK)),
+            "prefer_spanish": rng.random() < 0.6,
+            "completed_courses": rng.sample(pool, rng.randint(0, 4))}
+
+
+def _random_delta(rng, inputs, pool):
+    r = rng.random()
+    if r < 0.3:
+        return {"add_completed_courses": [rng.choice(pool)]}
+    if r < 0.45 and inputs["completed_courses"]:
+        return {"remove_completed_courses": [rng.choice(inputs["completed_courses"])]}
+    if r < 0.6:
+        return {"science_pathway": rng.choice(list(SCI_TRACK))}
+    if r < 0.75:
+        return {"starting_math": rng.choice(list(MATH_TRACK))}
+    if r < 0.85:
+        return {"prefer_spanish": not inputs.get("prefer_spanish")}
+    return {"goal": rng.choice(["cs", "other"])}
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_replan_matches_plan_student(catalog, seed):
+    rng = random.Random(seed)
+    pool = list(catalog)[:80] + TRANSCRIPT
+    for _ in range(20):
+        inputs = _random_inputs(rng, pool)
+        plan = plan_student(inputs, catalog)[0]
+        for _ in range(5):
+            delta = _random_delta(rng, inputs, pool)
+            res = replan(catalog, plan, inputs, delta)
+            ref_plan, _, ref_errors = plan_student(res.inputs, catalog)
+            assert res.plan == ref_plan, (inputs, delta)
+            assert sorted(res.validation_errors) == sorted(ref_errors), (inputs, delta)
+            inputs, plan = res.inputs, res.plan
+
+
+def test_sweep_matches_plan_student(catalog):
+    with open(os.path.join(DATA, "inputs.json"), "r", encoding="utf-8") as f:
+        inputs = json.load(f)
+    scenarios = list(sweep(inputs, catalog=catalog))
+    assert scenarios
+    for s in scenarios:
+        plan, _, errors = plan_student({**inputs, "starting_math": s.starting_math,
+                                        "science_pathway": s.science_pathway,
+                                        "prefer_spanish": s.prefer_spanish}, catalog)
+        assert s.plan["plan"] == plan["plan"], (s.starting_math, s.science_pathway, s.prefer_spanish)
+        assert sorted(s.validation_errors) == sorted(errors)
+
+
+def test_spawned_sweep_uses_the_callers_catalog(catalog, monkeypatch):
+    with open(os.path.join(DATA, "inputs.json"), "r", encoding="utf-8") as f:
+        inputs = {**json.load(f), "optimize": True}
+    expected = sweep(inputs, catalog=catalog, math_tracks=["geometry", "honors_algebra2"],
+                     science_pathways=["standard_stem"])
+    spawn = mp.get_context("spawn")
+    monkeypatch.setattr(mp, "get_all_start_methods", lambda: ["spawn"])
+    monkeypatch.setattr(mp, "get_context", lambda method=None: spawn)
+    # workers that fell back to catalog_path would fail to load it
+    scenarios = sweep(inputs, catalog=catalog, catalog_path=os.path.join(DATA, "missing.csv"), workers=2,
+                      math_tracks=["geometry", "honors_algebra2"], science_pathways=["standard_stem"])
+    assert [(s.plan, s.validation_errors) for s in scenarios] == [(s.plan, s.validation_errors) for s in expected]
@@ -0,0 +1,89 @@
+"""
+allocate_electives under scarce seats: no course it fills goes over capacity,
+every open slot is accounted for, and what it places is offered, new to the
+student and allowed by their prerequisites.
+"""
+import copy
+import random
+
+import pytest
+
+from main import plan_student, read_settings
+from section_allocator import GRADES, allocate_electives, seats_for
+from validator import validate_plan_prerequisites
+
+STARTS = ["geometry", "honors_geometry", "honors_algebra2", "honors_precalc"]
+
+
+def _cohort(catalog, seed, n):
+    rng = random.Random(seed)
+    students = []
+    for _ in range(n):
+        record = {"goal": rng.choice(["cs", "cs", "other"]), "starting_math": rng.choice(STARTS),
+                  "prefer_spanish": rng.random() < 0.5, "fill_electives": False, "completed_courses": []}
+        settings = read_settings(record)
+        students.append({"plan": plan_student(record, catalog)[0], "completed_courses": [],
+                         "goal": record["goal"], "prefer_spanish": settings["prefer_spanish"],
+                         "starting_math": settings["starting_math"]})
+    return students
+
+
+def _titles(slot):
+    if slot is None:
+        return []
+    return list(slot) if isinstance(slot, list) else [slot]
+
+
+@pytest.mark.parametrize("seed, default_seats", [(0, 8), (1, 20), (2, None)])
+def test_allocation_respects_capacities(catalog, seed, default_seats):
+    students = _cohort(catalog, seed, 120)
+    before = copy.deepcopy(students)
+    # a few popular electives get tight seats, one of them per grade
+    caps = {"Computer Science Principles (P) (PLTW)": {None: 5}, "AP Computer Science (HP)": {11: 3, 12: 4},
+            "Publications/Yearbook (P)": {None: 2}}
+    report = allocate_electives(students, catalog, caps, default_seats=default_seats)
+
+    # seats: a course the allocator adds to stays within its seats; one the core
+    # plans already overfill is reported and gets no electives on top
+    over = {(o["title"], o["grade"]): o["assigned"] for o in report["over_capacity"]}
+    full = 0
+    for g in GRADES:
+        used = {}
+        for st in students:
+            for y in st["plan"]["plan"]:
+                if y["grade"] == g:
+                    for slot in y["courses"]:
+                        for t in _titles(slot):
+                            used[t] = used.get(t, 0) + 1
+        for t, n in used.items():
+            seats = seats_for(caps, t, g, default_seats)
+            if seats is None:
+                continue
+            assert report["usage"][t][g] == [n, seats]
+            if (t, g) in over:
+                assert n == over[(t, g)]
+            else:
+                assert n <= seats, (t, g, n, seats)
+                full += n == seats
+    assert full  # the seats do bind somewhere
+
+    # every open slot is allocated, a fallback or left unfilled
+    remaining = sum(y["courses"].count(None) for st in students for y in st["plan"]["plan"])
+    assert report["unfilled"] == remaining
+    assert report["allocated"] + report["fallback"] + report["unfilled"] == report["slots"]
+    assert sum(report["rank_histogram"]) == report["allocated"]
+
+    for old, st in zip(before, students):
+        placed = []
+        for y_old, y in zip(old["plan"]["plan"], st["plan"]["plan"]):
+            for a, b in zip(y_old["courses"], y["courses"]):
+                if a is None and b is not None:
+                    placed.append((y["grade"], b))
+                else:
+                    assert a == b  # only open slots change
+        titles = [t for y in st["plan"]["plan"] for slot in y["courses"] for t in _titles(slot)]
+        errors = validate_plan_prerequisites(st["plan"], catalog, st["completed_courses"], st["starting_math"])
+        for g, t in placed:
+            assert catalog[t].offered_in(g)
+            assert titles.count(t) == 1, t
+            assert not any(e.startswith(f"Grade {g}: course '{t}'") for e in errors), errors
@@ -0,0 +1,86 @@
+"""
+validate_plans must report exactly what the per-plan validators report, plan by
+plan, however broken the plans are.
+"""
+import copy
+import random
+
+import pytest
+
+from main import plan_student
+from math_pathway import MATH_TRACK
+from plan_codec import PlanArray
+from science_pathway import SCI_TRACK
+from validator import validate_plan_offered_by_grade, validate_plan_prerequisites, validate_plans
+
+
+def _reference(plans, catalog, completed, starting_math):
+    return [validate_plan_offered_by_grade(p, catalog) + validate_plan_prerequisites(p, catalog, c, s)
+            for p, c, s in zip(plans, completed, starting_math)]
+
+
+def _break(rng, plan, titles):
+    # a few random edits: unknown, empty, swapped or paired slots, dropped slots, odd grades
+    for _ in range(rng.randint(0, 3)):
+        year = rng.choice(plan["plan"])
+        if not year["courses"]:
+            continue
+        k = rng.randrange(len(year["courses"]))
+        r = rng.random()
+        if r < 0.15:
+            year["courses"][k] = None
+        elif r < 0.3:
+            year["courses"][k] = "Nope"
+        elif r < 0.5:
+            year["courses"][k] = rng.choice(titles)
+        elif r < 0.6:
+            year["courses"][k] = [rng.choice(titles), rng.choice(titles)]
+        elif r < 0.7:
+            year["courses"][k] = [rng.choice(titles), None]
+        elif r < 0.8:
+            year["courses"].pop()
+        elif r < 0.9:
+            year["grade"] = rng.choice([8, 13, -1, 20])
+        else:
+            year["grade"] = rng.choice([str(year["grade"]), float(year["grade"]), None])
+
+
+def _cohort(catalog, seed, n):
+    rng = random.Random(seed)
+    titles = list(catalog)
+    plans, completed, starting_math = [], [], []
+    for _ in range(n):
+        sm = rng.choice(list(MATH_TRACK))
+        comp = rng.sample(titles, rng.randint(0, 3))
+        plans.append(plan_student({"starting_math": sm, "science_pathway": rng.choice(list(SCI_TRACK)),
+                                   "prefer_spanish": rng.random() < 0.5, "completed_courses": comp}, catalog)[0])
+        completed.append(comp)
+        starting_math.append(rng.choice([sm, None]))
+    return rng, plans, completed, starting_math
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_validate_plans_matches_per_plan_validators(catalog, seed):
+    rng, plans, completed, starting_math = _cohort(catalog, seed, 400)
+    titles = list(catalog)
+    plans = [copy.deepcopy(p) for p in plans]
+    for p in plans:
+        _break(rng, p, titles)
+    assert validate_plans(plans, catalog, completed, starting_math) == _reference(plans, catalog, completed,
+                                                                                 starting_math)
+
+
+def test_validate_plans_non_int_grade_fails(catalog):
+    _, plans, completed, starting_math = _cohort(catalog, 0, 1)
+    plan = copy.deepcopy(plans[0])
+    plan["plan"][1]["grade"] = "10"
+    ref = _reference([plan], catalog, completed, starting_math)
+    assert ref[0]
+    assert validate_plans([plan], catalog, completed, starting_math) == ref
+
+
+def test_validate_plans_accepts_plan_array(catalog):
+    _, plans, completed, starting_math = _cohort(catalog, 1, 100)
+    array = PlanArray.from_plans(plans, catalog)
+    assert validate_plans(array, catalog, completed, starting_math) == validate_plans(plans, catalog, completed,
+                                                                                      starting_math)